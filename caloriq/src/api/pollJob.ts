@@ -0,0 +1,26 @@
+import axios from "axios";
+
+const API_BASE_URL = "http://localhost:8000"; // Update if different in production
+
+/**
+    * Polls a background plan generation job until it finishes.
+    * @param jobId The job id returned by /user/meals, /user/workouts or /user/weekly-survey.
+    * @param token The user's authentication token.
+    * @param intervalMs How long to wait between polls.
+    * @returns A promise that resolves to the job result, or rejects if the job failed.
+*/
+export const pollJob = async (jobId: string, token: string, intervalMs: number = 1500): Promise<any> => {
+    while (true) {
+        const response = await axios.get(`${API_BASE_URL}/user/jobs/${jobId}`, {
+        headers: { Authorization: `Bearer ${token}` },
+    });
+        const job = response.data;
+        if (job.status === "done") {
+            return job.result;
+        }
+        if (job.status === "failed") {
+            throw new Error(job.error || "Job failed");
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+};
@@ -3,8 +3,10 @@
 import React, { useContext, useState, useEffect, useRef, FormEvent } from "react";
 import Image from "next/image";
 import AuthContext from "./context/AuthContext";
+import { PlanContext } from "./context/PlanContext";
 import axios from "axios";
 import { useRouter } from "next/navigation";
+import { pollJob } from "../api/pollJob";
 
 // define a chat message interface
 interface ChatMessage {
@@ -12,6 +14,13 @@ interface ChatMessage {
     text: string;
 }
 
+// outcome of one plan in the weekly-survey job: {"meal_plan": {"status": "done", "plan": {...}}, ...}
+interface PlanOutcome {
+    status: "done" | "failed";
+    plan?: any;
+    error?: string;
+}
+
 interface FeedbackData {
     workout: {
         liked: string[];
@@ -30,6 +39,9 @@ const HomePage: React.FC = () => {
     // create authentication variable by getting return value from custom context AuthContext
     const auth = useContext(AuthContext);
 
+    // meal and workout plan context, updated with the plans the weekly survey regenerates
+    const { setMealPlan, setWorkoutPlan } = useContext(PlanContext)!;
+
     // initialize router for redirecting or routing user to different pages
     const router = useRouter();
 
@@ -65,6 +77,9 @@ const HomePage: React.FC = () => {
     // loading state for overlay
     const [loading, setLoading] = useState(false);
 
+    // per-plan results of the last survey submission, shown until dismissed
+    const [surveyResults, setSurveyResults] = useState<string[]>([]);
+
 
 
     // function to parse comma-separated input into an array of strings
@@ -118,16 +133,38 @@ const HomePage: React.FC = () => {
                 { headers: { Authorization: `Bearer ${auth?.user?.access_token}` } }
             );
 
-            // hide survey
-            setShowSurvey(false);
+            console.log("Survey submitted successfully:", response.data);
 
-            // set loading state to show overlay
-            setLoading(true);
+            // no new plan was asked for, nothing to wait for
+            const job = response.data.job;
+            if (!job) {
+                return;
+            }
 
-            console.log("Survey submitted successfully:", response.data);
+            // wait for the regenerated plans, each one succeeds or fails on its own
+            const outcomes: Record<string, PlanOutcome> = await pollJob(job.job_id, auth?.user?.access_token ?? "");
+            console.log(outcomes);
+
+            const results: string[] = [];
+            const meal = outcomes.meal_plan;
+            if (meal?.status === "done") {
+                setMealPlan(meal.plan);
+                results.push("Your new meal plan is ready.");
+            } else if (meal) {
+                results.push(`Your meal plan could not be regenerated: ${meal.error}`);
+            }
+            const workout = outcomes.workout_plan;
+            if (workout?.status === "done") {
+                setWorkoutPlan(workout.plan);
+                results.push("Your new workout plan is ready.");
+            } else if (workout) {
+                results.push(`Your workout plan could not be regenerated: ${workout.error}`);
+            }
+            setSurveyResults(results);
 
         } catch (error) {
             console.error('Failed to submit feedback:', error);
+            setSurveyResults(["Your new plans could not be generated, please try again later."]);
         } finally {
             setLoading(false);
         }
@@ -171,20 +208,68 @@ const HomePage: React.FC = () => {
         setChatLogs((prev) => [...prev, { sender: "user", text: userMessage }]);
         setChatMessage("");
     
+        // replace the text of the last (model) message in the chat log
+        const setModelText = (text: string) =>
+            setChatLogs((prev) => [...prev.slice(0, -1), { sender: "model", text }]);
+        let replyStarted = false;
+
         try {
-            const response = await axios.post(
-                "http://localhost:8000/chat",
-                { message: userMessage },
-                { headers: { Authorization: `Bearer ${auth?.user?.access_token}` } }
-            );
-            const assistantReply = response.data.reply;
-            setChatLogs((prev) => [...prev, { sender: "model", text: assistantReply }]);
+            // stream the reply so it shows up while it is being generated
+            const response = await fetch("http://localhost:8000/chat", {
+                method: "POST",
+                headers: {
+                    "Content-Type": "application/json",
+                    Authorization: `Bearer ${auth?.user?.access_token}`,
+                },
+                body: JSON.stringify({ message: userMessage, stream: true }),
+            });
+            if (!response.ok || !response.body) {
+                throw new Error(`Chat request failed: ${response.status}`);
+            }
+
+            // add an empty model message that fills in as pieces arrive
+            setChatLogs((prev) => [...prev, { sender: "model", text: "" }]);
+            replyStarted = true;
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            let assistantReply = "";
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // server-sent events are separated by a blank line
+                const events = buffer.split("\n\n");
+                buffer = events.pop() ?? "";
+                for (const event of events) {
+                    const eventType = event.match(/^event: (.*)$/m)?.[1];
+                    const data = event.match(/^data: (.*)$/m)?.[1];
+                    if (!data) continue;
+                    const payload = JSON.parse(data);
+
+                    if (eventType === "error") {
+                        throw new Error(JSON.stringify(payload.detail));
+                    } else if (eventType === "done") {
+                        assistantReply = payload.reply;
+                    } else {
+                        assistantReply += payload.delta;
+                    }
+                    setModelText(assistantReply);
+                }
+            }
         } catch (error) {
             console.error("Failed to fetch assistant reply:", error);
-            setChatLogs((prev) => [
-                ...prev,
-                { sender: "model", text: "Error retrieving response" },
-            ]);
+            if (replyStarted) {
+                setModelText("Error retrieving response");
+            } else {
+                setChatLogs((prev) => [
+                    ...prev,
+                    { sender: "model", text: "Error retrieving response" },
+                ]);
+            }
         }
     };
 
@@ -223,11 +308,22 @@ const HomePage: React.FC = () => {
 
 
     // function to create new chat (clear chat logs and reset home screen)
-    const handleNewChat = () => {
+    const handleNewChat = async () => {
         setChatLogs([]);
 
         // reset chatMessage
         setChatMessage("");
+
+        // the server keeps the conversation too, forget it so the next message starts over
+        if (auth?.user?.access_token) {
+            try {
+                await axios.delete("http://localhost:8000/chat", {
+                    headers: { Authorization: `Bearer ${auth.user.access_token}` },
+                });
+            } catch (error) {
+                console.error("Failed to reset chat:", error);
+            }
+        }
     };
 
 
@@ -585,6 +681,21 @@ const HomePage: React.FC = () => {
             )}
 
             {/* Loading Overlay */}
+            {/* Weekly survey results */}
+            {surveyResults.length > 0 && (
+                <div className="fixed bottom-4 right-4 bg-white border rounded-lg shadow-lg p-4 z-50 max-w-sm">
+                    {surveyResults.map((result, idx) => (
+                        <p key={idx} className="mb-2">{result}</p>
+                    ))}
+                    <button
+                        onClick={() => setSurveyResults([])}
+                        className="px-4 py-2 bg-blue-600 text-white rounded hover:bg-blue-700"
+                    >
+                        OK
+                    </button>
+                </div>
+            )}
+
             {loading && (
                 <div className="fixed inset-0 flex flex-col items-center justify-center bg-gray-800 bg-opacity-75 z-50">
                     <p className="text-white mb-4 text-lg">Loading Your Meal And Workout Plan</p>
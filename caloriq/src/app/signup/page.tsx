@@ -7,6 +7,7 @@ import axios from "axios";
 import { useRouter } from "next/navigation";
 import AuthContext from "../context/AuthContext";
 import { PlanContext } from "../context/PlanContext";
+import { pollJob } from "../../api/pollJob";
 
 
 const SignUpPage: React.FC = () => {
@@ -118,25 +119,33 @@ const SignUpPage: React.FC = () => {
             // set loading state to show overlay
             setLoading(true);
 
-            // fire both the meal and workout plan API requests in parallel
+            // queue both the meal and workout plan jobs in parallel
             const [meal_response, workout_response] = await Promise.all([
                 axios.post(
                     "http://localhost:8000/user/meals",
+                    {},
                     { headers: { Authorization: `Bearer ${auth.user?.access_token}` } }
                 ),
                 axios.post(
                     "http://localhost:8000/user/workouts",
+                    {},
                     { headers: { Authorization: `Bearer ${auth.user?.access_token}` } }
                 ),
             ]);
 
-            // log meal and workout responses to console
-            console.log(meal_response.data);
-            console.log(workout_response.data);
+            // wait for both jobs to finish generating
+            const [meal_result, workout_result] = await Promise.all([
+                pollJob(meal_response.data.job_id, auth.user?.access_token ?? ""),
+                pollJob(workout_response.data.job_id, auth.user?.access_token ?? ""),
+            ]);
+
+            // log meal and workout results to console
+            console.log(meal_result);
+            console.log(workout_result);
 
             // save meal and workout plans to PlanContext
-            setMealPlan(meal_response.data.meal_plan);
-            setWorkoutPlan(workout_response.data.excercise_plan);
+            setMealPlan(meal_result.meal_plan);
+            setWorkoutPlan(workout_result.excercise_plan);
 
             // redirect the user to the home page after responses are received
             router.push("/");
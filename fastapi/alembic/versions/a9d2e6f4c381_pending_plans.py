@@ -0,0 +1,38 @@
+"""pending plans
+
+Revision ID: a9d2e6f4c381
+Revises: f5c3d8a1b726
+Create Date: 2026-10-18 16:48:37.902215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d2e6f4c381'
+down_revision: Union[str, None] = 'f5c3d8a1b726'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('pendingplan',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('column', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('plan', sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True),
+    sa.Column('inputs_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_pendingplan_user_column', 'pendingplan', ['user_id', 'column'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pendingplan_user_column', table_name='pendingplan')
+    op.drop_table('pendingplan')
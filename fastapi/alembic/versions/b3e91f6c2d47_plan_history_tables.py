@@ -0,0 +1,139 @@
+"""plan history tables
+
+Revision ID: b3e91f6c2d47
+Revises: 7a6b40c2b10d
+Create Date: 2026-10-18 10:12:04.318842
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e91f6c2d47'
+down_revision: Union[str, None] = '7a6b40c2b10d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('mealplan',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('is_current', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_mealplan_user_current', 'mealplan', ['user_id', 'is_current', 'created_at'], unique=False)
+    op.create_index('ux_mealplan_user_current', 'mealplan', ['user_id'], unique=True,
+                    postgresql_where=sa.text('is_current'), sqlite_where=sa.text('is_current'))
+    op.create_table('mealplanentry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('day', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('meal', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('dish', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.ForeignKeyConstraint(['plan_id'], ['mealplan.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mealplanentry_plan_id'), 'mealplanentry', ['plan_id'], unique=False)
+    op.create_index('ix_mealplanentry_dish', 'mealplanentry', ['dish'], unique=False)
+    op.create_index('ix_mealplanentry_day_meal', 'mealplanentry', ['day', 'meal'], unique=False)
+    op.create_table('workoutplan',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('is_current', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_workoutplan_user_current', 'workoutplan', ['user_id', 'is_current', 'created_at'], unique=False)
+    op.create_index('ux_workoutplan_user_current', 'workoutplan', ['user_id'], unique=True,
+                    postgresql_where=sa.text('is_current'), sqlite_where=sa.text('is_current'))
+    op.create_table('workoutplanentry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), nullable=False),
+    sa.Column('day', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('exercise', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sets', sa.Integer(), nullable=True),
+    sa.Column('reps', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['plan_id'], ['workoutplan.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_workoutplanentry_plan_id'), 'workoutplanentry', ['plan_id'], unique=False)
+    op.create_index('ix_workoutplanentry_exercise_day', 'workoutplanentry', ['exercise', 'day'], unique=False)
+
+    backfill_plans()
+
+
+def backfill_plans() -> None:
+    """
+    Copy each user's existing meal_plan / workout_plan JSON into the new tables as their current plan
+    """
+    bind = op.get_bind()
+    user_columns = {column['name'] for column in sa.inspect(bind).get_columns('user')}
+    if not {'meal_plan', 'workout_plan'} <= user_columns:
+        return
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('meal_plan', sa.JSON), sa.column('workout_plan', sa.JSON))
+    plan_tables = {
+        'meal_plan': sa.table('mealplan', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                              sa.column('created_at', sa.DateTime), sa.column('is_current', sa.Boolean)),
+        'workout_plan': sa.table('workoutplan', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                                 sa.column('created_at', sa.DateTime), sa.column('is_current', sa.Boolean)),
+    }
+    meal_entry = sa.table('mealplanentry', sa.column('plan_id', sa.Integer), sa.column('day', sa.String),
+                          sa.column('position', sa.Integer), sa.column('meal', sa.String), sa.column('dish', sa.String))
+    workout_entry = sa.table('workoutplanentry', sa.column('plan_id', sa.Integer), sa.column('day', sa.String),
+                             sa.column('position', sa.Integer), sa.column('exercise', sa.String),
+                             sa.column('sets', sa.Integer), sa.column('reps', sa.Integer))
+    now = datetime.now(timezone.utc)
+
+    rows = bind.execute(sa.select(user.c.id, user.c.meal_plan, user.c.workout_plan)).all()
+    for user_id, meal_plan, workout_plan in rows:
+        for column, plan in (('meal_plan', meal_plan), ('workout_plan', workout_plan)):
+            if not isinstance(plan, dict) or not plan:
+                continue
+            plan_id = bind.execute(
+                plan_tables[column].insert().values(user_id=user_id, created_at=now, is_current=True)
+                .returning(plan_tables[column].c.id)
+            ).scalar_one()
+            if column == 'meal_plan':
+                entries = [
+                    {'plan_id': plan_id, 'day': day, 'position': position, 'meal': meal, 'dish': str(dish).strip()}
+                    for day, meals in plan.items() if isinstance(meals, dict)
+                    for position, (meal, dish) in enumerate(meals.items())
+                ]
+                table = meal_entry
+            else:
+                entries = [
+                    {'plan_id': plan_id, 'day': day, 'position': position, 'exercise': str(item.get('exercise', '')).strip(),
+                     'sets': item.get('sets'), 'reps': item.get('reps')}
+                    for day, exercises in plan.items() if isinstance(exercises, list)
+                    for position, item in enumerate(exercises) if isinstance(item, dict)
+                ]
+                table = workout_entry
+            if entries:
+                bind.execute(table.insert(), entries)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_workoutplanentry_exercise_day', table_name='workoutplanentry')
+    op.drop_index(op.f('ix_workoutplanentry_plan_id'), table_name='workoutplanentry')
+    op.drop_table('workoutplanentry')
+    op.drop_index('ux_workoutplan_user_current', table_name='workoutplan')
+    op.drop_index('ix_workoutplan_user_current', table_name='workoutplan')
+    op.drop_table('workoutplan')
+    op.drop_index('ix_mealplanentry_day_meal', table_name='mealplanentry')
+    op.drop_index('ix_mealplanentry_dish', table_name='mealplanentry')
+    op.drop_index(op.f('ix_mealplanentry_plan_id'), table_name='mealplanentry')
+    op.drop_table('mealplanentry')
+    op.drop_index('ux_mealplan_user_current', table_name='mealplan')
+    op.drop_index('ix_mealplan_user_current', table_name='mealplan')
+    op.drop_table('mealplan')
@@ -0,0 +1,40 @@
+"""cache entry table
+
+Revision ID: c7e4b1a9d250
+Revises: a9d2e6f4c381
+Create Date: 2026-10-18 18:12:40.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e4b1a9d250'
+down_revision: Union[str, None] = 'a9d2e6f4c381'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # databases that ran init_db (DB_INIT_ON_STARTUP) already have the table
+    if sa.inspect(op.get_bind()).has_table('cacheentry'):
+        return
+    op.create_table('cacheentry',
+    sa.Column('namespace', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('value', sa.JSON(), nullable=True),
+    sa.Column('expires_at', sa.Float(), nullable=False),
+    sa.Column('last_used_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('namespace', 'key')
+    )
+    op.create_index(op.f('ix_cacheentry_expires_at'), 'cacheentry', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_cacheentry_last_used_at'), 'cacheentry', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_cacheentry_last_used_at'), table_name='cacheentry')
+    op.drop_index(op.f('ix_cacheentry_expires_at'), table_name='cacheentry')
+    op.drop_table('cacheentry')
@@ -0,0 +1,107 @@
+"""jsonb preference columns
+
+Revision ID: d4a8c1e7f903
+Revises: b3e91f6c2d47
+Create Date: 2026-10-18 11:47:29.602115
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c1e7f903'
+down_revision: Union[str, None] = 'b3e91f6c2d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# json columns that become jsonb, and the CSV string columns that become jsonb lists
+JSON_COLUMNS = [
+    'gender', 'activity_level', 'fitness_goals', 'exercise_preferences',
+    'exercise_availability', 'meal_prep_availability', 'meal_plan', 'workout_plan',
+    'liked_meals', 'disliked_meals', 'liked_workouts', 'disliked_workouts',
+]
+SCALAR_COLUMNS = ['gender', 'activity_level', 'meal_plan', 'workout_plan']
+CSV_COLUMNS = ['diet_preference', 'allergies']
+# same list as database.INDEXED_LIST_COLUMNS
+GIN_COLUMNS = [
+    'fitness_goals', 'exercise_preferences', 'diet_preference', 'allergies',
+    'exercise_availability', 'meal_prep_availability',
+    'liked_meals', 'disliked_meals', 'liked_workouts', 'disliked_workouts',
+]
+
+
+def csv_to_jsonb(column: str) -> str:
+    return (
+        f"CASE WHEN {column} IS NULL OR btrim({column}) = '' THEN '[]'::jsonb "
+        f"ELSE to_jsonb(regexp_split_to_array(btrim({column}), '\\s*,\\s*')) END"
+    )
+
+
+def user_columns() -> dict:
+    return {column['name']: column['type'] for column in sa.inspect(op.get_bind()).get_columns('user')}
+
+
+def upgrade() -> None:
+    columns = user_columns()
+
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite stores JSON as text already, only the CSV values need rewriting as lists
+        user = sa.table('user', sa.column('id', sa.Integer), *[sa.column(c, sa.String) for c in CSV_COLUMNS if c in columns])
+        convert_rows(user, lambda value: json.dumps([item.strip() for item in value.split(',') if item.strip()])
+                     if value is not None and not value.startswith('[') else value)
+        return
+
+    for column in JSON_COLUMNS:
+        if column not in columns:
+            continue
+        if isinstance(columns[column], sa.JSON):
+            using = f'{column}::jsonb'
+        elif column in SCALAR_COLUMNS:
+            using = f'to_jsonb({column}::text)'
+        else:
+            using = csv_to_jsonb(column)  # lists created as strings by the first migration
+        op.alter_column('user', column, type_=postgresql.JSONB(), postgresql_using=using)
+    for column in CSV_COLUMNS:
+        if column in columns:
+            op.alter_column('user', column, type_=postgresql.JSONB(), postgresql_using=csv_to_jsonb(column))
+
+    for column in GIN_COLUMNS:
+        if column in columns:
+            op.create_index(f'ix_user_{column}_gin', 'user', [column], unique=False,
+                            postgresql_using='gin', postgresql_ops={column: 'jsonb_path_ops'})
+
+
+def convert_rows(user, convert) -> None:
+    bind = op.get_bind()
+    names = [column.name for column in user.columns if column.name != 'id']
+    if not names:
+        return
+    for row in bind.execute(sa.select(user)).mappings().all():
+        values = {name: convert(row[name]) for name in names}
+        if any(values[name] != row[name] for name in names):
+            bind.execute(user.update().where(user.c.id == row['id']).values(values))
+
+
+def downgrade() -> None:
+    columns = user_columns()
+
+    if op.get_bind().dialect.name != 'postgresql':
+        user = sa.table('user', sa.column('id', sa.Integer), *[sa.column(c, sa.String) for c in CSV_COLUMNS if c in columns])
+        convert_rows(user, lambda value: ','.join(json.loads(value)) if value and value.startswith('[') else value)
+        return
+
+    for column in GIN_COLUMNS:
+        if column in columns:
+            op.drop_index(f'ix_user_{column}_gin', table_name='user')
+    for column in CSV_COLUMNS:
+        if column in columns:
+            op.alter_column('user', column, type_=sa.String(),
+                            postgresql_using=f"replace(translate({column}::text, '[]\"', ''), ', ', ',')")
+    for column in JSON_COLUMNS:
+        if column in columns:
+            op.alter_column('user', column, type_=sa.JSON(), postgresql_using=f'{column}::json')
@@ -0,0 +1,51 @@
+"""plan content hash
+
+Revision ID: e2f7a9b4c618
+Revises: d4a8c1e7f903
+Create Date: 2026-10-18 13:05:51.774120
+
+"""
+import hashlib
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f7a9b4c618'
+down_revision: Union[str, None] = 'd4a8c1e7f903'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('mealplan', sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('workoutplan', sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+    # current plans get the hash of the copy on the user row (same as plan_store.plan_hash);
+    # a schema built from the init revision alone has no plan columns on the user row
+    bind = op.get_bind()
+    user_columns = {column['name'] for column in sa.inspect(bind).get_columns('user')}
+    if not {'meal_plan', 'workout_plan'} <= user_columns:
+        return
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('meal_plan', sa.JSON), sa.column('workout_plan', sa.JSON))
+    for table_name, column in (('mealplan', 'meal_plan'), ('workoutplan', 'workout_plan')):
+        plan_table = sa.table(table_name, sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                              sa.column('is_current', sa.Boolean), sa.column('content_hash', sa.String))
+        rows = bind.execute(
+            sa.select(plan_table.c.id, user.c[column])
+            .join(user, user.c.id == plan_table.c.user_id)
+            .where(plan_table.c.is_current == sa.true())
+        ).all()
+        for plan_id, plan in rows:
+            if plan is None:
+                continue
+            content_hash = hashlib.sha256(json.dumps(plan, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+            bind.execute(plan_table.update().where(plan_table.c.id == plan_id).values(content_hash=content_hash))
+
+
+def downgrade() -> None:
+    op.drop_column('workoutplan', 'content_hash')
+    op.drop_column('mealplan', 'content_hash')
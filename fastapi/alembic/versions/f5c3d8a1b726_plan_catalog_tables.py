@@ -0,0 +1,65 @@
+"""plan catalog tables
+
+Revision ID: f5c3d8a1b726
+Revises: e2f7a9b4c618
+Create Date: 2026-10-18 15:22:04.310582
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c3d8a1b726'
+down_revision: Union[str, None] = 'e2f7a9b4c618'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+JSONType = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+# same as the gin_index() calls on CatalogDish / CatalogExercise
+GIN_COLUMNS = [('catalogdish', 'tags'), ('catalogdish', 'allergens'), ('catalogexercise', 'tags')]
+
+
+def upgrade() -> None:
+    op.create_table('catalogdish',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('meal', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('tags', JSONType, nullable=True),
+    sa.Column('allergens', JSONType, nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_catalogdish_meal'), 'catalogdish', ['meal'], unique=False)
+    op.create_table('catalogexercise',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('focus', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('tags', JSONType, nullable=True),
+    sa.Column('sets', sa.Integer(), nullable=False),
+    sa.Column('reps', sa.Integer(), nullable=False),
+    sa.Column('minutes', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_catalogexercise_kind'), 'catalogexercise', ['kind'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        for table, column in GIN_COLUMNS:
+            op.create_index(f'ix_{table}_{column}_gin', table, [column], unique=False,
+                            postgresql_using='gin', postgresql_ops={column: 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        for table, column in GIN_COLUMNS:
+            op.drop_index(f'ix_{table}_{column}_gin', table_name=table)
+    op.drop_index(op.f('ix_catalogexercise_kind'), table_name='catalogexercise')
+    op.drop_table('catalogexercise')
+    op.drop_index(op.f('ix_catalogdish_meal'), table_name='catalogdish')
+    op.drop_table('catalogdish')
@@ -0,0 +1,281 @@
+"""
+TTL + LRU Cache With Pluggable Backends (in-memory or a database table)
+"""
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from sqlalchemy import delete as sa_delete, func, inspect, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from .database import CacheEntry
+from .engine import get_async_engine, get_async_database_url
+
+
+class CacheStats:
+    """
+    Hit / miss counters for one cache
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.errors = 0  # backend failures, counted as misses / skipped writes
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class MemoryBackend:
+    """
+    Per-process OrderedDict, least recently used entries are evicted first
+    """
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self.entries.get((namespace, key))
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self.entries[(namespace, key)]
+            return None
+        self.entries.move_to_end((namespace, key))
+        return copy.deepcopy(value)
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> int:
+        self.entries[(namespace, key)] = (time.time() + ttl, copy.deepcopy(value))
+        self.entries.move_to_end((namespace, key))
+        evicted = 0
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    async def delete(self, namespace: str, key: str):
+        self.entries.pop((namespace, key), None)
+
+
+# an entry's last_used_at is only rewritten on a hit when it is older than this (seconds),
+# so reads don't each become a write; LRU eviction only needs rough recency
+SQL_TOUCH_INTERVAL = 3600
+# how long to wait before checking again for a missing cacheentry table (seconds)
+SQL_TABLE_RECHECK = 60
+
+UPSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+class SQLBackend:
+    """
+    Rows in the cacheentry table, shared by every worker and kept across restarts.
+    Uses the app database by default, or its own database (e.g. a SQLite file) when given a url.
+    """
+    def __init__(self, url: Optional[str] = None, max_entries: int = 10000, touch_interval: float = SQL_TOUCH_INTERVAL):
+        self.url = url
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._engine = None
+        self._table_ready = False
+        self._table_missing_at = 0.0  # when the app database was last found without the table
+        self._table_lock: Optional[asyncio.Lock] = None
+
+    async def _session(self) -> AsyncSession:
+        if self._engine is None:
+            self._engine = create_async_engine(get_async_database_url(self.url)) if self.url else get_async_engine()
+        if not self._table_ready:
+            if self._table_lock is None:
+                self._table_lock = asyncio.Lock()
+            # one check at a time, the others wait for its result
+            async with self._table_lock:
+                if not self._table_ready:
+                    await self._check_table()
+        return AsyncSession(self._engine, expire_on_commit=False)
+
+    async def _check_table(self):
+        """
+        A separate cache database gets its table created here. The app database's table
+        comes from init_db or the Alembic migrations, so a missing one is an error.
+        """
+        if time.time() - self._table_missing_at < SQL_TABLE_RECHECK:
+            raise RuntimeError("cacheentry table is missing (run alembic upgrade head)")
+        async with self._engine.begin() as conn:
+            if self.url:
+                await conn.run_sync(lambda sync_conn: CacheEntry.__table__.create(sync_conn, checkfirst=True))
+            elif not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(CacheEntry.__tablename__)):
+                self._table_missing_at = time.time()
+                raise RuntimeError("cacheentry table is missing (run alembic upgrade head)")
+        self._table_ready = True
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        async with await self._session() as session:
+            entry = await session.get(CacheEntry, (namespace, key))
+            if entry is None:
+                return None
+            now = time.time()
+            if entry.expires_at <= now:
+                await session.delete(entry)
+                await session.commit()
+                return None
+            # bump recency for LRU eviction, at most once per touch_interval
+            if now - entry.last_used_at >= self.touch_interval:
+                entry.last_used_at = now
+                await session.commit()
+            return entry.value
+
+    async def _upsert(self, session: AsyncSession, namespace: str, key: str, value: Any, expires_at: float, now: float):
+        """
+        Insert or overwrite an entry in one statement, so workers storing the same key don't collide
+        """
+        values = {"value": value, "expires_at": expires_at, "last_used_at": now}
+        insert = UPSERTS.get(self._engine.dialect.name)
+        if insert is not None:
+            statement = insert(CacheEntry).values(namespace=namespace, key=key, **values)
+            await session.exec(statement.on_conflict_do_update(index_elements=["namespace", "key"], set_=values))
+            await session.commit()
+            return
+
+        # other databases: insert, and update the row if another worker inserted it first
+        try:
+            session.add(CacheEntry(namespace=namespace, key=key, **values))
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            await session.exec(update(CacheEntry).where(
+                CacheEntry.namespace == namespace, CacheEntry.key == key
+            ).values(**values))
+            await session.commit()
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> int:
+        now = time.time()
+        async with await self._session() as session:
+            await self._upsert(session, namespace, key, value, now + ttl, now)
+
+            # drop expired rows, then the least recently used ones over the limit
+            result = await session.exec(sa_delete(CacheEntry).where(
+                CacheEntry.namespace == namespace, CacheEntry.expires_at <= now
+            ))
+            evicted = result.rowcount or 0
+            count = (await session.exec(
+                select(func.count()).select_from(CacheEntry).where(CacheEntry.namespace == namespace)
+            )).one()
+            if count > self.max_entries:
+                oldest = select(CacheEntry.key).where(CacheEntry.namespace == namespace) \
+                    .order_by(CacheEntry.last_used_at).limit(count - self.max_entries)
+                result = await session.exec(sa_delete(CacheEntry).where(
+                    CacheEntry.namespace == namespace, CacheEntry.key.in_(oldest)
+                ))
+                evicted += result.rowcount or 0
+            await session.commit()
+            return evicted
+
+    async def delete(self, namespace: str, key: str):
+        async with await self._session() as session:
+            await session.exec(sa_delete(CacheEntry).where(CacheEntry.namespace == namespace, CacheEntry.key == key))
+            await session.commit()
+
+
+# how long the memory tier of a TieredBackend keeps a copy (seconds)
+TIERED_MEMORY_TTL = 3600
+
+
+class TieredBackend:
+    """
+    Bounded in-memory LRU in front of a persistent backend.
+    Reads fill the memory tier, writes go to both.
+    """
+    def __init__(self, memory: MemoryBackend, persistent):
+        self.memory = memory
+        self.persistent = persistent
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        value = await self.memory.get(namespace, key)
+        if value is not None:
+            return value
+        value = await self.persistent.get(namespace, key)
+        if value is not None:
+            await self.memory.set(namespace, key, value, TIERED_MEMORY_TTL)
+        return value
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float) -> int:
+        await self.memory.set(namespace, key, value, min(ttl, TIERED_MEMORY_TTL))
+        return await self.persistent.set(namespace, key, value, ttl)
+
+    async def delete(self, namespace: str, key: str):
+        await self.memory.delete(namespace, key)
+        await self.persistent.delete(namespace, key)
+
+
+def make_backend(name: str, max_entries: int, url: Optional[str] = None, memory_entries: int = 1000):
+    """
+    Build a backend from its config name: "memory", "sql" (app database),
+    "sqlite" (separate file at url) or "tiered" (memory in front of sql / sqlite)
+    """
+    if name == "tiered":
+        persistent = make_backend("sqlite" if url and url.startswith("sqlite") else "sql", max_entries, url)
+        return TieredBackend(MemoryBackend(max_entries=memory_entries), persistent)
+    if name == "memory":
+        return MemoryBackend(max_entries=max_entries)
+    if name == "sql":
+        return SQLBackend(url=url, max_entries=max_entries)
+    if name == "sqlite":
+        return SQLBackend(url=url or "sqlite:///cache.db", max_entries=max_entries)
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+class Cache:
+    """
+    Namespaced cache with a default ttl and hit / miss counters.
+    A backend error is logged and treated as a miss (or a skipped write),
+    a cache never fails the request it is used in.
+    """
+    def __init__(self, namespace: str, backend, ttl: float):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def _error(self, action: str, e: Exception):
+        self.stats.errors += 1
+        print(f"CACHE {self.namespace.upper()} {action} FAILED: {type(e).__name__}: {e}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await self.backend.get(self.namespace, key)
+        except Exception as e:
+            self._error("GET", e)
+            value = None
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            self.stats.evictions += await self.backend.set(self.namespace, key, value, ttl if ttl is not None else self.ttl)
+        except Exception as e:
+            self._error("SET", e)
+            return
+        self.stats.sets += 1
+
+    async def delete(self, key: str):
+        try:
+            await self.backend.delete(self.namespace, key)
+        except Exception as e:
+            self._error("DELETE", e)
@@ -0,0 +1,547 @@
+"""
+Catalog Plan Generator: meal and workout plans built from local dish / exercise tables, no LLM call
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional
+from dotenv import load_dotenv
+from sqlmodel import select
+from .database import CatalogDish, CatalogExercise, DayOfWeek
+from .engine import get_async_session
+from .lexicon import Matcher, extract_keywords, words
+from . import metrics
+
+
+load_dotenv()
+
+# "llm" (always ask the LLM), "catalog" (catalog only) or "hybrid" (catalog, LLM when the
+# catalog has nothing that fits the user's diet / allergies)
+PLAN_GENERATOR = os.getenv("PLAN_GENERATOR", "llm")
+# a workout day stops at WORKOUT_MAX_MINUTES, and before WORKOUT_MIN_MINUTES only if nothing else fits the day's limits
+WORKOUT_MAX_MINUTES = float(os.getenv("WORKOUT_MAX_MINUTES", "60"))
+WORKOUT_MIN_MINUTES = float(os.getenv("WORKOUT_MIN_MINUTES", "30"))
+WORKOUT_MAX_EXERCISES = int(os.getenv("WORKOUT_MAX_EXERCISES", "6"))
+
+DAYS = [day.value for day in DayOfWeek]
+MEALS = ["breakfast", "lunch", "dinner"]
+# used when the user hasn't picked any days to exercise
+DEFAULT_WORKOUT_DAYS = ["Monday", "Wednesday", "Friday"]
+# strength days work a different muscle group each time
+FOCUS_ROTATION = ["push", "legs", "pull", "core"]
+
+SEED_DIR = Path(__file__).resolve().parent.parent
+MEAL_SEED_FILE = SEED_DIR / "meal_plan 2.json"
+EXERCISE_SEED_FILE = SEED_DIR / "exercise_routine 2.json"
+
+# added to the seed files so every diet and exercise preference has something to pick from
+EXTRA_DISHES = {
+    "breakfast": [
+        "tofu scramble with peppers and spinach",
+        "chia pudding with coconut milk and mango",
+        "overnight oats with berries and oat milk",
+        "veggie omelette with mushrooms and peppers",
+        "cottage cheese with pineapple and walnuts",
+        "smoked salmon with avocado and cucumber",
+    ],
+    "lunch": [
+        "black bean and corn burrito bowl with rice",
+        "quinoa tabbouleh with chickpeas",
+        "lentil and vegetable stew",
+        "grilled chicken caesar salad",
+        "egg salad lettuce wraps",
+        "hummus and roasted vegetable plate",
+    ],
+    "dinner": [
+        "tofu and vegetable stir-fry with brown rice",
+        "chickpea curry with cauliflower rice",
+        "black bean tacos with avocado and salsa",
+        "stuffed bell peppers with lentils and rice",
+        "zucchini noodles with tomato and basil sauce",
+        "grilled chicken thighs with roasted vegetables",
+        "pan-seared salmon with asparagus",
+        "beef and broccoli with cauliflower rice",
+    ],
+}
+EXTRA_EXERCISES = [
+    # name, kind, focus, sets, reps, minutes, tags
+    ("20-minute jog", "cardio", "cardio", 1, 1, 20, ["high impact"]),
+    ("30-minute brisk walk", "cardio", "cardio", 1, 1, 30, ["low impact"]),
+    ("20-minute cycling", "cardio", "cardio", 1, 1, 20, ["low impact"]),
+    ("15-minute rowing", "cardio", "cardio", 1, 1, 15, ["low impact"]),
+    ("20-minute swim", "cardio", "cardio", 1, 1, 20, ["low impact"]),
+    ("10-minute jump rope", "cardio", "cardio", 1, 1, 10, ["high impact"]),
+    ("burpees", "hiit", "full body", 4, 10, 6, ["high impact", "high intensity"]),
+    ("mountain climbers", "hiit", "core", 4, 20, 5, ["high intensity"]),
+    ("jump squats", "hiit", "legs", 4, 12, 5, ["high impact", "high intensity"]),
+    ("high knees", "hiit", "full body", 4, 30, 4, ["high impact", "high intensity"]),
+    ("sprint intervals", "hiit", "cardio", 8, 1, 12, ["high impact", "high intensity"]),
+    ("kettlebell swings", "hiit", "full body", 4, 15, 6, ["high intensity"]),
+    ("yoga flow", "flexibility", "full body", 1, 1, 15, ["low impact"]),
+    ("hamstring stretch", "flexibility", "legs", 2, 30, 3, ["low impact"]),
+    ("hip flexor stretch", "flexibility", "legs", 2, 30, 3, ["low impact"]),
+    ("cat-cow", "flexibility", "core", 2, 10, 3, ["low impact"]),
+    ("foam rolling", "flexibility", "full body", 1, 1, 10, ["low impact"]),
+    ("child's pose", "flexibility", "core", 2, 30, 2, ["low impact"]),
+]
+
+# what a dish name has to contain to carry an allergen; "-" entries are look-alikes that don't
+ALLERGENS = {
+    "nuts": ["nut", "peanut", "peanuts", "almond", "almonds", "walnut", "walnuts", "cashew", "cashews", "pecan",
+             "pistachio", "hazelnut", "pesto", "peanut butter", "almond butter", "almond milk", "tree nuts"],
+    "dairy": ["milk", "cheese", "yogurt", "greek yogurt", "butter", "cream", "whey", "feta", "parmesan", "mozzarella",
+              "cottage cheese", "caesar", "pesto", "ghee", "lactose", "-|peanut butter|almond butter|coconut milk|oat milk|almond milk|soy milk"],
+    "eggs": ["egg", "eggs", "omelette", "omelet", "frittata", "mayonnaise", "mayo", "caesar", "-|eggplant"],
+    "gluten": ["wheat", "bread", "toast", "pasta", "noodles", "wrap", "wraps", "tortilla", "tortillas", "tacos", "granola",
+               "oats", "oatmeal", "couscous", "pancakes", "bagel", "flour", "barley", "rye", "seitan", "whole grain", "croutons",
+               "caesar", "tabbouleh", "burrito", "-|zucchini noodles|rice noodles|lettuce wraps"],
+    "fish": ["fish", "salmon", "tuna", "cod", "tilapia", "trout", "anchovy", "anchovies", "sardines", "caesar"],
+    "shellfish": ["shellfish", "shrimp", "prawns", "crab", "lobster", "clams", "mussels", "oysters", "scallops"],
+    "soy": ["soy", "soya", "tofu", "tempeh", "edamame", "miso", "soy sauce", "soy milk"],
+    "sesame": ["sesame", "tahini", "hummus"],
+}
+MEAT = {"chicken", "beef", "pork", "lamb", "turkey", "duck", "steak", "ham", "bacon", "sausage", "meat", "red meat",
+        "meatballs", "grilled chicken"}
+SEAFOOD = {"salmon", "tuna", "shrimp", "fish", "seafood"}
+STARCH = {"rice", "quinoa", "pasta", "bread", "oats", "potatoes", "sweet potatoes", "tortillas", "couscous", "bagels",
+          "cereal", "pancakes", "naan", "rice noodles", "fried rice", "beans", "lentils", "chickpeas", "corn",
+          "hummus", "bananas", "mango", "pineapple", "apples", "oranges", "grapes", "fruit", "desserts", "juice", "smoothies"}
+PROTEIN = MEAT | SEAFOOD | {"eggs", "tofu", "tempeh", "lentils", "chickpeas", "beans", "yogurt", "protein", "protein shake"}
+LIGHT = {"salad", "soup", "vegetables", "broccoli", "spinach", "asparagus", "zucchini", "cauliflower", "green beans",
+         "fish", "salmon", "tuna", "shrimp", "cucumber", "kale"}
+HEAVY = {"fried", "pancakes", "desserts", "cream", "pasta", "burgers", "pizza", "burritos", "heavy"}
+
+# diet_preference value -> tag a dish needs, or allergen it mustn't have
+DIET_TAGS = {"vegan": "vegan", "vegetarian": "vegetarian", "pescatarian": "pescatarian", "keto": "keto",
+             "carnivore": "meat"}
+DIET_ALLERGENS = {"gluten free": "gluten", "gluten-free": "gluten", "dairy free": "dairy", "dairy-free": "dairy"}
+
+# exercise preference / fitness goal -> kinds of exercise to favour
+PREFERENCE_KINDS = {
+    "Cardio": ["cardio"],
+    "Strength Training": ["strength"],
+    "Flexibility & Mobility": ["flexibility"],
+    "High-Intensity Interval Training (HIIT)": ["hiit"],
+}
+GOAL_KINDS = {
+    "Weight Loss": ["cardio", "hiit"],
+    "Gain Muscle": ["strength"],
+    "Increase Endurance": ["cardio"],
+    "Improve Flexibility": ["flexibility"],
+    "Sports Performance": ["hiit", "strength"],
+}
+GOAL_DISH_TAGS = {"Gain Muscle": "high protein", "Weight Loss": "light"}
+# most exercises of a kind in one day
+KIND_LIMITS = {"strength": 5, "cardio": 1, "hiit": 2, "flexibility": 2}
+# seed exercises are strength moves, their muscle group comes from the name
+FOCUS_TERMS = [
+    ("core", ["plank", "crunch", "sit-up", "dead bug"]),
+    ("pull", ["row", "pulldown", "pull-up", "curl"]),
+    ("legs", ["squat", "lunge", "glute", "deadlift", "step-up", "leg press", "calf"]),
+    ("push", ["push-up", "bench press", "fly", "shoulder press", "raise", "triceps", "dip"]),
+]
+SECONDS_PER_REP = 3
+REST_SECONDS = 60
+
+# points when choosing between catalog entries
+LIKE_POINTS = 2
+DISLIKE_POINTS = 5
+REPEAT_POINTS = 3
+# a seeded plan (fresh=True) adds up to this much to each entry, reshuffling near ties
+# without outweighing a like, a dislike or a repeat
+SEED_POINTS = 1.5
+
+
+class CatalogUnsatisfiable(Exception):
+    """
+    Raised when the catalog has nothing that satisfies the user's constraints
+    """
+
+
+def _value(item) -> str:
+    return str(getattr(item, "value", item))
+
+
+_allergen_matchers: Dict[str, Matcher] = {}
+
+
+def allergens_in(text: str) -> List[str]:
+    """
+    Allergens a dish name (or a user's allergy entry) refers to
+    """
+    if not _allergen_matchers:
+        for allergen, terms in ALLERGENS.items():
+            _allergen_matchers[allergen] = Matcher([allergen + "|" + "|".join(t for t in terms if not t.startswith("-"))]
+                                                   + [t for t in terms if t.startswith("-")])
+    text_words, _ = words(text)
+    return [allergen for allergen, matcher in _allergen_matchers.items()
+            if any(keyword == allergen for _, _, keyword in matcher.find(text_words))]
+
+
+def dish_row(name: str, meal: str) -> CatalogDish:
+    """
+    Tag a dish from its name: foods and attributes from the meal lexicon, then diets and goals
+    """
+    name = name.strip()
+    foods = [keyword.lower() for keyword in extract_keywords("liked_meal", name).keywords]
+    allergens = allergens_in(name)
+    found = set(foods)
+    tags = list(foods)
+    if not found & MEAT:
+        tags.append("pescatarian")
+        if not found & SEAFOOD:
+            tags.append("vegetarian")
+            if not {"dairy", "eggs"} & set(allergens) and "honey" not in name.lower():
+                tags.append("vegan")
+    else:
+        tags.append("meat")
+    if not found & STARCH and "honey" not in name.lower():
+        tags.append("keto")
+    if found & PROTEIN:
+        tags.append("high protein")
+    if found & LIGHT and not found & HEAVY:
+        tags.append("light")
+    return CatalogDish(name=name, meal=meal, tags=tags, allergens=allergens)
+
+
+def exercise_row(name: str, sets: int, reps: int, kind: str = "strength", focus: Optional[str] = None,
+                 minutes: Optional[float] = None, tags: Optional[List[str]] = None) -> CatalogExercise:
+    """
+    Tag an exercise from its name with the workout lexicon; strength moves get their muscle group and duration
+    """
+    name = name.strip()
+    if focus is None:
+        lowered = name.lower()
+        focus = next((group for group, terms in FOCUS_TERMS if any(term in lowered for term in terms)), "full body")
+    if minutes is None:
+        minutes = round(sets * (reps * SECONDS_PER_REP + REST_SECONDS) / 60, 1)
+    keywords = [keyword.lower() for keyword in extract_keywords("liked_workout", name).keywords]
+    all_tags = list(dict.fromkeys(keywords + (tags or []) + [kind, focus]))
+    return CatalogExercise(name=name, kind=kind, focus=focus, tags=all_tags, sets=sets, reps=reps, minutes=minutes)
+
+
+def seed_rows():
+    """
+    Catalog rows from the seed files and the extra entries above
+    """
+    dishes = {}
+    with open(MEAL_SEED_FILE) as f:
+        for meals in json.load(f).values():
+            for meal, name in meals.items():
+                dishes.setdefault(name.strip(), meal)
+    for meal, names in EXTRA_DISHES.items():
+        for name in names:
+            dishes.setdefault(name, meal)
+
+    exercises = {}
+    with open(EXERCISE_SEED_FILE) as f:
+        for items in json.load(f).values():
+            for item in items:
+                name = item["exercise"].strip()
+                if name not in exercises:
+                    exercises[name] = exercise_row(name, item["sets"], item["reps"])
+    for name, kind, focus, sets, reps, minutes, tags in EXTRA_EXERCISES:
+        exercises.setdefault(name, exercise_row(name, sets, reps, kind, focus, minutes, tags))
+
+    return [dish_row(name, meal) for name, meal in dishes.items()], list(exercises.values())
+
+
+async def seed_catalog(session) -> int:
+    """
+    Add the seed dishes / exercises that aren't in the tables yet, returns how many were added
+    """
+    dishes, exercises = seed_rows()
+    have_dishes = set((await session.exec(select(CatalogDish.name))).all())
+    have_exercises = set((await session.exec(select(CatalogExercise.name))).all())
+    new = [d for d in dishes if d.name not in have_dishes] + [e for e in exercises if e.name not in have_exercises]
+    session.add_all(new)
+    await session.commit()
+    return len(new)
+
+
+@dataclass(frozen=True)
+class Dish:
+    name: str
+    meal: str
+    tags: FrozenSet[str]
+    allergens: FrozenSet[str]
+    words: FrozenSet[str]
+
+
+@dataclass(frozen=True)
+class Exercise:
+    name: str
+    kind: str
+    focus: str
+    tags: FrozenSet[str]
+    sets: int
+    reps: int
+    minutes: float
+    words: FrozenSet[str]
+
+
+def _words(text: str, tags) -> FrozenSet[str]:
+    """
+    Stemmed words of a name and its tags, what liked / disliked keywords are matched against
+    """
+    result = set(words(text)[0])
+    for tag in tags:
+        result.update(words(tag)[0])
+    return frozenset(result)
+
+
+class Catalog:
+    """
+    The catalog tables in memory, with tag -> entries indexes for the hard constraints
+    """
+    def __init__(self, dishes: List[CatalogDish], exercises: List[CatalogExercise]):
+        self.dishes = sorted(
+            (Dish(d.name, d.meal, frozenset(d.tags or []), frozenset(d.allergens or []), _words(d.name, d.tags or []))
+             for d in dishes),
+            key=lambda dish: dish.name,
+        )
+        self.exercises = sorted(
+            (Exercise(e.name, e.kind, e.focus, frozenset(e.tags or []), e.sets, e.reps, e.minutes, _words(e.name, e.tags or []))
+             for e in exercises),
+            key=lambda exercise: exercise.name,
+        )
+        self.by_meal: Dict[str, set] = defaultdict(set)
+        self.by_tag: Dict[str, set] = defaultdict(set)
+        self.by_allergen: Dict[str, set] = defaultdict(set)
+        for dish in self.dishes:
+            self.by_meal[dish.meal].add(dish)
+            for tag in dish.tags:
+                self.by_tag[tag].add(dish)
+            for allergen in dish.allergens:
+                self.by_allergen[allergen].add(dish)
+
+
+_catalog: Optional[Catalog] = None
+_catalog_lock: Optional[asyncio.Lock] = None
+
+
+async def load_catalog(reload: bool = False) -> Catalog:
+    """
+    Read the catalog tables once per process (seeding them if they're empty)
+    """
+    global _catalog, _catalog_lock
+    if _catalog is not None and not reload:
+        return _catalog
+    if _catalog_lock is None:
+        _catalog_lock = asyncio.Lock()
+    async with _catalog_lock:
+        if _catalog is None or reload:
+            async with get_async_session() as session:
+                dishes = (await session.exec(select(CatalogDish))).all()
+                exercises = (await session.exec(select(CatalogExercise))).all()
+                if not dishes and not exercises:
+                    print(f"SEEDED CATALOG WITH {await seed_catalog(session)} ENTRIES")
+                    dishes = (await session.exec(select(CatalogDish))).all()
+                    exercises = (await session.exec(select(CatalogExercise))).all()
+            _catalog = Catalog(dishes, exercises)
+    return _catalog
+
+
+def _matches(keyword: str, entry_words: FrozenSet[str]) -> bool:
+    keyword_words = [word for word in words(keyword)[0] if not word.startswith("\0")]
+    return bool(keyword_words) and set(keyword_words) <= entry_words
+
+
+def _preference_points(entry_words: FrozenSet[str], liked: List[str], disliked: List[str]) -> int:
+    points = LIKE_POINTS * sum(_matches(keyword, entry_words) for keyword in liked)
+    return points - DISLIKE_POINTS * sum(_matches(keyword, entry_words) for keyword in disliked)
+
+
+def _seed_points(entries, seed: Optional[str]) -> dict:
+    """
+    Reproducible random points per entry for the seed (entries in catalog order), or none without one
+    """
+    if seed is None:
+        return {entry: 0 for entry in entries}
+    rng = random.Random(seed)
+    return {entry: rng.uniform(0, SEED_POINTS) for entry in entries}
+
+
+def generate_meal_plan(catalog: Catalog, inputs: dict, seed: Optional[str] = None) -> dict:
+    """
+    A breakfast, lunch and dinner for every day. Diet and allergies are hard constraints;
+    liked / disliked meals and fitness goals rank the dishes that are left, and a dish
+    loses points each time it's used so the week has variety. The same inputs and seed
+    always give the same plan; a different seed reshuffles dishes that score about the same.
+    """
+    allowed = set(catalog.dishes)
+    banned_words = set()
+    for diet in inputs.get("diet_preference") or []:
+        diet = diet.strip().lower()
+        if diet in DIET_TAGS:
+            allowed &= catalog.by_tag[DIET_TAGS[diet]]
+        elif diet in DIET_ALLERGENS:
+            allowed -= catalog.by_allergen[DIET_ALLERGENS[diet]]
+    for allergy in inputs.get("allergies") or []:
+        matched = allergens_in(allergy)
+        for allergen in matched:
+            allowed -= catalog.by_allergen[allergen]
+        if not matched:
+            # not a known allergen: leave out dishes that name it
+            banned_words.update(word for word in words(allergy)[0] if not word.startswith("\0"))
+    if banned_words:
+        allowed = {dish for dish in allowed if not banned_words & dish.words}
+
+    goal_tags = [GOAL_DISH_TAGS[_value(goal)] for goal in inputs.get("fitness_goals") or [] if _value(goal) in GOAL_DISH_TAGS]
+    liked, disliked = inputs.get("liked_meals") or [], inputs.get("disliked_meals") or []
+    jitter = _seed_points(catalog.dishes, seed)
+    points = {
+        dish: _preference_points(dish.words, liked, disliked) + sum(tag in dish.tags for tag in goal_tags) + jitter[dish]
+        for dish in allowed
+    }
+
+    plan = {}
+    uses = Counter()
+    for i, day in enumerate(DAYS):
+        plan[day] = {}
+        for meal in MEALS:
+            candidates = sorted(allowed & catalog.by_meal[meal], key=lambda dish: dish.name)
+            if not candidates:
+                raise CatalogUnsatisfiable(f"No {meal} in the catalog fits the diet preference and allergies")
+            yesterday = plan[DAYS[i - 1]][meal] if i else None
+            best = max(candidates, key=lambda dish: (
+                points[dish] - REPEAT_POINTS * uses[dish] - (REPEAT_POINTS if dish.name == yesterday else 0)
+            ))
+            uses[best] += 1
+            plan[day][meal] = best.name
+    return plan
+
+
+def generate_workout_plan(catalog: Catalog, inputs: dict, seed: Optional[str] = None) -> dict:
+    """
+    Exercises for each day the user is available, at most WORKOUT_MAX_MINUTES a day.
+    Exercise preferences and goals decide which kinds of exercise come first, strength
+    work rotates through muscle groups, and liked / disliked workouts rank the rest.
+    A different seed reshuffles exercises that score about the same.
+    """
+    available = {_value(day) for day in inputs.get("exercise_availability") or []}
+    days = [day for day in DAYS if day in available] or DEFAULT_WORKOUT_DAYS
+
+    kind_points = Counter()
+    for preference in inputs.get("exercise_preferences") or []:
+        for kind in PREFERENCE_KINDS.get(_value(preference), []):
+            kind_points[kind] += 3
+    for goal in inputs.get("fitness_goals") or []:
+        for kind in GOAL_KINDS.get(_value(goal), []):
+            kind_points[kind] += 2
+    if not kind_points:
+        kind_points.update({"strength": 2, "cardio": 1, "flexibility": 1})
+
+    liked, disliked = inputs.get("liked_workouts") or [], inputs.get("disliked_workouts") or []
+    jitter = _seed_points(catalog.exercises, seed)
+    base = {
+        exercise: kind_points[exercise.kind] + _preference_points(exercise.words, liked, disliked) + jitter[exercise]
+        for exercise in catalog.exercises
+    }
+
+    plan = {}
+    uses = Counter()
+    yesterday: set = set()
+    for i, day in enumerate(days):
+        focus = FOCUS_ROTATION[i % len(FOCUS_ROTATION)]
+        minutes = 0.0
+        chosen: List[Exercise] = []
+        kinds = Counter()
+        while len(chosen) < WORKOUT_MAX_EXERCISES:
+            fits = [
+                exercise for exercise in catalog.exercises
+                if exercise not in chosen
+                and minutes + exercise.minutes <= WORKOUT_MAX_MINUTES
+                and kinds[exercise.kind] < KIND_LIMITS.get(exercise.kind, 1)
+                and kind_points[exercise.kind] > 0
+            ]
+            if not fits:
+                break
+
+            def points(exercise: Exercise) -> float:
+                value = base[exercise] - uses[exercise] - (2 if exercise in yesterday else 0)
+                if exercise.kind == "strength":
+                    value += 3 if exercise.focus == focus else -1
+                # each extra exercise of a kind counts for less, so a day mixes kinds
+                return value - 2 * kinds[exercise.kind]
+
+            best = max(fits, key=points)
+            if chosen and points(best) <= 0 and minutes >= WORKOUT_MIN_MINUTES:
+                break
+            chosen.append(best)
+            kinds[best.kind] += 1
+            uses[best] += 1
+            minutes += best.minutes
+
+        if not chosen:
+            raise CatalogUnsatisfiable(f"No exercise in the catalog fits a {WORKOUT_MAX_MINUTES:.0f} minute workout")
+        plan[day] = [{"sets": e.sets, "reps": e.reps, "exercise": e.name} for e in chosen]
+        yesterday = set(chosen)
+    return plan
+
+
+GENERATORS = {"meal": generate_meal_plan, "workout": generate_workout_plan}
+
+
+class GeneratorStats:
+    def __init__(self):
+        self.catalog = 0  # plans built from the catalog
+        self.fallbacks = 0  # catalog couldn't satisfy the constraints, LLM used
+        self.latency = metrics.LatencyStats()
+
+    def to_dict(self) -> dict:
+        return {"catalog": self.catalog, "fallbacks": self.fallbacks, "latency": self.latency.to_dict()}
+
+
+generator_stats = GeneratorStats()
+metrics.register("plan_generator", generator_stats.to_dict)
+
+
+async def catalog_plan(kind: str, inputs: dict, seed: Optional[str] = None) -> Optional[dict]:
+    """
+    A plan from the catalog if PLAN_GENERATOR allows it; None means ask the LLM.
+    Pass a seed for a plan that differs from the unseeded one (see generate_meal_plan).
+    Raises CatalogUnsatisfiable in "catalog" mode when nothing fits the user.
+    """
+    if PLAN_GENERATOR == "llm":
+        return None
+    catalog = await load_catalog()
+    start = time.perf_counter()
+    try:
+        plan = GENERATORS[kind](catalog, inputs, seed)
+    except CatalogUnsatisfiable as e:
+        if PLAN_GENERATOR == "catalog":
+            raise
+        generator_stats.fallbacks += 1
+        print(f"CATALOG {kind.upper()} PLAN NOT POSSIBLE ({e}), ASKING THE LLM")
+        return None
+    generator_stats.latency.record(time.perf_counter() - start)
+    generator_stats.catalog += 1
+    return plan
+
+
+async def main(reset: bool):
+    from sqlmodel import delete
+    from .database import init_db
+
+    await asyncio.to_thread(init_db)
+    async with get_async_session() as session:
+        if reset:
+            await session.exec(delete(CatalogDish))
+            await session.exec(delete(CatalogExercise))
+        print(f"Added {await seed_catalog(session)} catalog entries")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Plan catalog tables")
+    parser.add_argument("command", choices=["seed"])
+    parser.add_argument("--reset", action="store_true", help="delete the catalog first")
+    args = parser.parse_args()
+    asyncio.run(main(args.reset))
@@ -0,0 +1,184 @@
+"""
+Per-User Chat Sessions With A Bounded Rolling Context Window
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+from dotenv import load_dotenv
+from .llm import chat_content, LLMError
+from . import metrics
+
+
+load_dotenv()
+
+# sessions kept in memory, idle time before a session is dropped (seconds)
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+CHAT_IDLE_TTL = float(os.getenv("CHAT_IDLE_TTL", "1800"))
+# the window sent to the LLM: at most this many recent turns (user + assistant pairs)
+# and this many (estimated) tokens of recent messages; older turns are folded into a summary
+CHAT_KEEP_TURNS = int(os.getenv("CHAT_KEEP_TURNS", "6"))
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "2000"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+# a longer message is cut to this many (estimated) tokens before it's sent
+CHAT_MESSAGE_MAX_TOKENS = int(os.getenv("CHAT_MESSAGE_MAX_TOKENS", "1000"))
+
+SYSTEM_PROMPT = (
+    "This conversation is part of a health app. You are a friendly assistant who offers support on exercise and nutrition topics. "
+    "Please refer users to the eating disorder hotline at 1-888-375-7767 if severe symptoms are detected."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token), good enough for budgeting
+    """
+    return len(text) // 4 + 1
+
+
+def clip_message(message: str) -> str:
+    """
+    The message cut to CHAT_MESSAGE_MAX_TOKENS, so one message can't blow the budget
+    """
+    max_chars = CHAT_MESSAGE_MAX_TOKENS * 4
+    return message if len(message) <= max_chars else message[:max_chars]
+
+
+class ChatSession:
+    """
+    One user's conversation: a running summary of older turns plus the recent messages
+    """
+    def __init__(self):
+        self.summary = ""
+        self.messages: List[Dict[str, Any]] = []
+        self.last_used = time.time()
+        self.lock = asyncio.Lock()
+        self.compacting = False
+
+    def context(self, message: str) -> List[Dict[str, Any]]:
+        """
+        Messages to send for a new user message: system prompt, summary, recent turns.
+        Turns that don't fit the window with the message are left out (compact() summarizes them).
+        """
+        context = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if self.summary:
+            context.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        recent = self.messages[len(self.overflow(message)):]
+        return context + recent + [{"role": "user", "content": message}]
+
+    def add_turn(self, message: str, reply: str):
+        self.messages.append({"role": "user", "content": message})
+        self.messages.append({"role": "assistant", "content": reply})
+
+    def overflow(self, message: str = "") -> List[Dict[str, Any]]:
+        """
+        The oldest turns that don't fit the window, with room for the next message if
+        one is given (left in place, compact() removes them)
+        """
+        start = 0
+        tokens = sum(estimate_tokens(m["content"]) for m in self.messages)
+        if message:
+            tokens += estimate_tokens(message)
+        while len(self.messages) - start > 2 and (
+            len(self.messages) - start > 2 * CHAT_KEEP_TURNS or tokens > CHAT_TOKEN_BUDGET
+        ):
+            tokens -= sum(estimate_tokens(m["content"]) for m in self.messages[start:start + 2])
+            start += 2
+        return self.messages[:start]
+
+
+async def summarize(summary: str, messages: List[Dict[str, Any]]) -> str:
+    """
+    Fold old turns into the running summary (falls back to truncation if the LLM fails)
+    """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    max_chars = CHAT_SUMMARY_MAX_TOKENS * 4
+    try:
+        new_summary = await chat_content([{
+            "role": "user",
+            "content": (
+                f"Summarize this conversation between a user and a health assistant in under "
+                f"{CHAT_SUMMARY_MAX_TOKENS * 3 // 4} words. Keep the user's goals, preferences and anything "
+                f"the assistant promised. Only return the summary.\n"
+                f"Earlier summary: {summary or 'none'}\n"
+                f"New messages:\n{transcript}"
+            ),
+        }])
+    except LLMError as e:
+        print(f"Error summarizing chat: {e}")
+        new_summary = f"{summary} {transcript}".strip()
+    # keep only the most recent part if the summary still runs long
+    return new_summary.strip()[-max_chars:]
+
+
+async def compact(session: ChatSession, message: str = ""):
+    """
+    Keep the session's window within CHAT_KEEP_TURNS / CHAT_TOKEN_BUDGET, leaving room
+    for the next message if one is given.
+    The lock isn't held while the LLM summarizes, so the next message isn't kept waiting:
+    the old turns are copied under the lock and only replaced by the summary afterwards.
+    """
+    async with session.lock:
+        if session.compacting:
+            return
+        old = session.overflow(message)
+        if not old:
+            return
+        summary = session.summary
+        session.compacting = True
+
+    try:
+        new_summary = await summarize(summary, old)
+    finally:
+        session.compacting = False
+
+    async with session.lock:
+        # drop the summary if the window moved meanwhile (the session was cleared or compacted)
+        if session.summary != summary or session.messages[:len(old)] != old:
+            return
+        del session.messages[:len(old)]
+        session.summary = new_summary
+
+
+class ChatSessionStore:
+    """
+    user id -> ChatSession, least recently used sessions are dropped first
+    and sessions idle longer than CHAT_IDLE_TTL are dropped on access
+    """
+    def __init__(self, max_sessions: int = CHAT_MAX_SESSIONS, idle_ttl: float = CHAT_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions: "OrderedDict[int, ChatSession]" = OrderedDict()
+        self.evictions = 0
+
+    def _evict(self):
+        now = time.time()
+        # oldest sessions are at the front, stop at the first one still active
+        while self.sessions:
+            user_id, session = next(iter(self.sessions.items()))
+            if len(self.sessions) <= self.max_sessions and now - session.last_used < self.idle_ttl:
+                break
+            del self.sessions[user_id]
+            self.evictions += 1
+
+    def get(self, user_id: int) -> ChatSession:
+        session = self.sessions.get(user_id)
+        if session is None or time.time() - session.last_used >= self.idle_ttl:
+            session = ChatSession()
+            self.sessions[user_id] = session
+        session.last_used = time.time()
+        self.sessions.move_to_end(user_id)
+        self._evict()
+        return session
+
+    def clear(self, user_id: int):
+        self.sessions.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.sessions), "evictions": self.evictions}
+
+
+# process-wide session store used by /chat
+chat_sessions = ChatSessionStore()
+metrics.register("chat_sessions", chat_sessions.stats)
@@ -1,13 +1,13 @@
-from sqlmodel import SQLModel, Field, create_engine, Session, Column, select, delete
-from sqlalchemy import JSON
+from sqlmodel import SQLModel, Field, Session, Column, select, delete
+from sqlalchemy import JSON, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred, undefer
 from enum import Enum
 from typing import Optional
-import requests
 import datetime
 import os
-# from .deps import get_engine
+from .engine import get_engine, get_session
 from dotenv import load_dotenv
-import os
 
 
 load_dotenv()
@@ -18,23 +18,33 @@ ALGORITHM = os.getenv("AUTH_ALGORITHM")
 SQL_ALCHEMY_DATABASE_URL = os.getenv("SQL_ALCHEMY_DATABASE_URL")
 
 
-def get_engine():
-    """
-    Get Engine To Database
-    """
-    return create_engine(SQL_ALCHEMY_DATABASE_URL, echo=True)
+# JSONB on Postgres (GIN-indexable, containment queries), plain JSON elsewhere (SQLite)
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+# list columns users are segmented by, each gets a GIN index on Postgres
+INDEXED_LIST_COLUMNS = (
+    "fitness_goals", "exercise_preferences", "diet_preference", "allergies",
+    "exercise_availability", "meal_prep_availability",
+    "liked_meals", "disliked_meals", "liked_workouts", "disliked_workouts",
+)
 
 
-def get_session():
+def gin_index(column: str, table: str = "user") -> Index:
     """
-    Get Connection and Create Session to Database
+    GIN index for @> (contains) queries on a JSONB list column, only created on Postgres
     """
-    engine = get_engine()
-    return Session(engine)
+    return Index(
+        f"ix_{table}_{column}_gin", column,
+        postgresql_using="gin", postgresql_ops={column: "jsonb_path_ops"},
+    ).ddl_if(dialect="postgresql")
 
 
-if os.path.exists("orm.db"):
-    os.remove("orm.db")
+# JSON columns that can get large (plans, liked / disliked lists): deferred on the User mapper,
+# so a query only loads them when user_load_options() names them
+HEAVY_USER_COLUMNS = {
+    name: Column(name, JSONType)
+    for name in ("meal_plan", "workout_plan", "liked_meals", "disliked_meals", "liked_workouts", "disliked_workouts")
+}
 
 
 class ActivityLevel(str, Enum):
@@ -83,34 +93,163 @@ class User(SQLModel, table=True):
     first_name: Optional[str] 
     last_name: Optional[str] 
     age: Optional[int]
-    gender: Optional[Gender] = Field(default=None, sa_column=Column(JSON))
+    gender: Optional[Gender] = Field(default=None, sa_column=Column(JSONType))
     height_cm: Optional[float]
     weight_kg: Optional[float]
     
-    activity_level: Optional[ActivityLevel] = Field(default=None, sa_column=Column(JSON))
-    fitness_goals: Optional[list[FitnessGoals]] = Field(default_factory=list, sa_column=Column(JSON))
-    exercise_preferences: Optional[list[ExercisePreferences]] = Field(default_factory=list, sa_column=Column(JSON))  # Updated field
-    diet_preference: Optional[str] = None  # CSV format like "Vegan,Keto"
-    allergies: Optional[str] = None  # CS2V format like "Nuts,Dairy"
-    exercise_availability: Optional[list[DayOfWeek]] = Field(default_factory=list, sa_column=Column(JSON))
-    meal_prep_availability: Optional[list[DayOfWeek]] = Field(default_factory=list, sa_column=Column(JSON))
+    activity_level: Optional[ActivityLevel] = Field(default=None, sa_column=Column(JSONType))
+    fitness_goals: Optional[list[FitnessGoals]] = Field(default_factory=list, sa_column=Column(JSONType))
+    exercise_preferences: Optional[list[ExercisePreferences]] = Field(default_factory=list, sa_column=Column(JSONType))  # Updated field
+    diet_preference: Optional[list[str]] = Field(default_factory=list, sa_column=Column(JSONType))  # ["Vegan", "Keto"]
+    allergies: Optional[list[str]] = Field(default_factory=list, sa_column=Column(JSONType))  # ["Nuts", "Dairy"]
+    exercise_availability: Optional[list[DayOfWeek]] = Field(default_factory=list, sa_column=Column(JSONType))
+    meal_prep_availability: Optional[list[DayOfWeek]] = Field(default_factory=list, sa_column=Column(JSONType))
 
     # columns for meal and workout plans
-    meal_plan: Optional[dict] = Field(default=None, sa_column=Column(JSON))
-    workout_plan: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    meal_plan: Optional[dict] = Field(default=None, sa_column=HEAVY_USER_COLUMNS["meal_plan"])
+    workout_plan: Optional[dict] = Field(default=None, sa_column=HEAVY_USER_COLUMNS["workout_plan"])
 
     # meal preferences
-    liked_meals: Optional[list[str]] = Field(default_factory=list, sa_column=Column(JSON))
-    disliked_meals: Optional[list[str]] = Field(default_factory=list, sa_column=Column(JSON))
+    liked_meals: Optional[list[str]] = Field(default_factory=list, sa_column=HEAVY_USER_COLUMNS["liked_meals"])
+    disliked_meals: Optional[list[str]] = Field(default_factory=list, sa_column=HEAVY_USER_COLUMNS["disliked_meals"])
     
     # workout preferences
-    liked_workouts: Optional[list[str]] = Field(default_factory=list, sa_column=Column(JSON))
-    disliked_workouts: Optional[list[str]] = Field(default_factory=list, sa_column=Column(JSON))
+    liked_workouts: Optional[list[str]] = Field(default_factory=list, sa_column=HEAVY_USER_COLUMNS["liked_workouts"])
+    disliked_workouts: Optional[list[str]] = Field(default_factory=list, sa_column=HEAVY_USER_COLUMNS["disliked_workouts"])
+
+    __table_args__ = tuple(gin_index(column) for column in INDEXED_LIST_COLUMNS)
+    # the heavy columns are deferred on every User query; reading one that wasn't loaded raises
+    # (async sessions can't lazy load), so a missing user_load_options() include shows up right away
+    __mapper_args__ = {
+        "properties": {name: deferred(column, raiseload=True) for name, column in HEAVY_USER_COLUMNS.items()}
+    }
+
+
+def user_load_options(*include: str) -> list:
+    """
+    Loader options that load the heavy JSON columns named in include (the rest stay deferred)
+    """
+    return [undefer(getattr(User, name)) for name in include]
 
 
-# Create all tables
-engine = get_engine()
-SQLModel.metadata.create_all(engine)
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# Plan history: one MealPlan / WorkoutPlan row per generated plan (is_current marks the
+# latest one, User.meal_plan / User.workout_plan keep a copy of it) with one entry row
+# per meal or exercise so plans can be queried without decoding JSON
+class MealPlan(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    created_at: datetime.datetime = Field(default_factory=utcnow)
+    is_current: bool = Field(default=True)
+    content_hash: Optional[str] = None  # sha256 of the plan json, used as its ETag
+
+    __table_args__ = (
+        Index("ix_mealplan_user_current", "user_id", "is_current", "created_at"),
+        # at most one current plan per user
+        Index("ux_mealplan_user_current", "user_id", unique=True, postgresql_where=text("is_current"), sqlite_where=text("is_current")),
+    )
+
+
+class MealPlanEntry(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    plan_id: int = Field(foreign_key="mealplan.id", index=True)
+    day: str  # "Monday"
+    position: int  # order of the meal within the day
+    meal: str  # "breakfast", "lunch", "dinner"
+    dish: str
+
+    __table_args__ = (
+        Index("ix_mealplanentry_dish", "dish"),
+        Index("ix_mealplanentry_day_meal", "day", "meal"),
+    )
+
+
+class WorkoutPlan(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    created_at: datetime.datetime = Field(default_factory=utcnow)
+    is_current: bool = Field(default=True)
+    content_hash: Optional[str] = None  # sha256 of the plan json, used as its ETag
+
+    __table_args__ = (
+        Index("ix_workoutplan_user_current", "user_id", "is_current", "created_at"),
+        # at most one current plan per user
+        Index("ux_workoutplan_user_current", "user_id", unique=True, postgresql_where=text("is_current"), sqlite_where=text("is_current")),
+    )
+
+
+class WorkoutPlanEntry(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    plan_id: int = Field(foreign_key="workoutplan.id", index=True)
+    day: str  # "Monday"
+    position: int  # order of the exercise within the day
+    exercise: str
+    sets: Optional[int] = None
+    reps: Optional[int] = None
+
+    __table_args__ = (Index("ix_workoutplanentry_exercise_day", "exercise", "day"),)
+
+
+class PendingPlan(SQLModel, table=True):
+    # a plan generated ahead of time (see pregen.py), promoted when the user asks for a new one
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    column: str  # "meal_plan" or "workout_plan"
+    plan: dict = Field(sa_column=Column(JSONType))
+    inputs_key: str  # plan_cache_key of the preferences it was generated from
+    created_at: datetime.datetime = Field(default_factory=utcnow)
+
+    __table_args__ = (Index("ix_pendingplan_user_column", "user_id", "column", unique=True),)
+
+
+class CatalogDish(SQLModel, table=True):
+    # dishes the catalog plan generator picks from (see catalog.py)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True)
+    meal: str = Field(index=True)  # "breakfast", "lunch", "dinner"
+    tags: list[str] = Field(default_factory=list, sa_column=Column(JSONType))  # ["chicken", "high protein", "vegetarian"]
+    allergens: list[str] = Field(default_factory=list, sa_column=Column(JSONType))  # ["nuts", "gluten"]
+
+    __table_args__ = (gin_index("tags", "catalogdish"), gin_index("allergens", "catalogdish"))
+
+
+class CatalogExercise(SQLModel, table=True):
+    # exercises the catalog plan generator picks from (see catalog.py)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True)
+    kind: str = Field(index=True)  # "strength", "cardio", "hiit", "flexibility"
+    focus: str  # "push", "pull", "legs", "core", "full body"
+    tags: list[str] = Field(default_factory=list, sa_column=Column(JSONType))  # ["dumbbells", "low impact"]
+    sets: int
+    reps: int
+    minutes: float  # time the exercise takes, rests included
+
+    __table_args__ = (gin_index("tags", "catalogexercise"),)
+
+
+class CacheEntry(SQLModel, table=True):
+    # rows for api.cache.SQLBackend (generated plans, extracted keywords, ...)
+    namespace: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    value: Optional[dict | list] = Field(default=None, sa_column=Column(JSON))
+    expires_at: float = Field(index=True)
+    last_used_at: float = Field(index=True)
+
+
+# Importing this module has no side effects. Tables are created by init_db(), which the app
+# runs on startup (DB_INIT_ON_STARTUP) and which can be run by hand; production schemas
+# are managed with Alembic:
+#   python -m api.database init [--reset] [--print-users]
+def init_db(reset: bool = False):
+    """
+    Create any missing tables. reset=True first deletes the local orm.db SQLite file.
+    """
+    if reset and os.path.exists("orm.db"):
+        os.remove("orm.db")
+    SQLModel.metadata.create_all(get_engine())
 
 
 # Example: usage with a session (we created a random user and tested)
@@ -149,7 +288,7 @@ def print_user_info():
     engine = get_engine()
     with Session(engine) as session:
         # Query all users
-        statement = select(User)
+        statement = select(User).options(*user_load_options(*HEAVY_USER_COLUMNS))
         users = session.exec(statement).all()
 
         # Check if any users exist
@@ -183,8 +322,21 @@ def print_user_info():
             print(f"Workout Plan: {user.workout_plan}")
             print("------------------------")
             
-# Call the function to print user information (for testing)
-print_user_info()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Database setup")
+    parser.add_argument("command", choices=["init"])
+    parser.add_argument("--reset", action="store_true", help="delete the local orm.db first")
+    parser.add_argument("--print-users", action="store_true", help="print every user afterwards (for testing)")
+    args = parser.parse_args()
+
+    init_db(reset=args.reset)
+    print("Tables created")
+    if args.print_users:
+        print_user_info()
 
 
 
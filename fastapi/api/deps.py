@@ -1,10 +1,18 @@
 from typing import Annotated
-from sqlalchemy.orm import Session
-from sqlmodel import Session, create_engine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
-from jose import jwt, JWTError
+# engine / session factories live in engine.py (no FastAPI imports), re-exported for the routes
+from .engine import (  # noqa: F401
+    engine_options,
+    get_engine,
+    get_async_database_url,
+    get_async_engine,
+    get_async_session,
+    get_session,
+)
+from .tokens import verify_token, InvalidToken
 from dotenv import load_dotenv
 import os
 
@@ -14,22 +22,6 @@ load_dotenv()
 # Grab SECRET_KEY and ALGORITHM from our .env folder
 SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
 ALGORITHM = os.getenv("AUTH_ALGORITHM")
-SQL_ALCHEMY_DATABASE_URL = os.getenv("SQL_ALCHEMY_DATABASE_URL")
-
-
-def get_engine():
-    """
-    Get Engine To Database
-    """
-    return create_engine(SQL_ALCHEMY_DATABASE_URL, echo=True)
-
-
-def get_session():
-    """
-    Get Connection and Create Session to Database
-    """
-    engine = get_engine()
-    return Session(engine)
 
 
 # Creates a database session
@@ -43,8 +35,14 @@ def get_db():
 
 db_dependency = Annotated[Session, Depends(get_db)]
 
-# bcrypt hashes and verifies passwords
-bcrpyt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+# Creates an async database session (does not block the event loop)
+async def get_async_db():
+    async with get_async_session() as db:
+        yield db
+
+
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
 
 # Defines bearer tokens, which clients send in their Authorization: Bearer <token> header
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl = 'auth/token')
@@ -55,13 +53,14 @@ oauth2_bearer_dependency = Annotated[str, Depends(oauth2_bearer)]
 # Returns users info (username, user_id)
 async def get_user(token: oauth2_bearer_dependency):
     try: 
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # verified claims are cached per token until its exp (see api.tokens)
+        payload = verify_token(token)
         username: str = payload.get('sub')
         user_id: int = payload.get('id')
         if username is None or user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Problem validating user')
         return {'username': username, 'id' : user_id}
-    except JWTError:
+    except InvalidToken:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Problem validating user')
     
 
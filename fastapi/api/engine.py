@@ -0,0 +1,103 @@
+"""
+Database Engines And Sessions (shared by the app, the CLI scripts and Alembic; no FastAPI imports)
+"""
+from sqlalchemy.engine import make_url
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from dotenv import load_dotenv
+import os
+
+
+load_dotenv()
+
+SQL_ALCHEMY_DATABASE_URL = os.getenv("SQL_ALCHEMY_DATABASE_URL")
+
+
+# Connection pool settings (all optional, read from .env)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 disables
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# one engine (and connection pool) per process, created on first use
+_engine = None
+
+
+def engine_options(url: str) -> dict:
+    """
+    Build create_engine keyword arguments for a database url
+    """
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    # in-memory sqlite ("sqlite://" or "sqlite:///:memory:") uses a single connection pool that has no size settings
+    parsed = make_url(url)
+    in_memory = parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+    if not in_memory:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def get_engine():
+    """
+    Get Engine To Database (shared by the whole process)
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_engine(SQL_ALCHEMY_DATABASE_URL, **engine_options(SQL_ALCHEMY_DATABASE_URL))
+    return _engine
+
+
+def get_async_database_url(url: str) -> str:
+    """
+    Swap the sync driver in a database url for its async driver
+    (psycopg2 -> asyncpg, pysqlite -> aiosqlite)
+    """
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+# async url can be set explicitly, otherwise it is derived from the sync url
+SQL_ALCHEMY_ASYNC_DATABASE_URL = os.getenv("SQL_ALCHEMY_ASYNC_DATABASE_URL") or (
+    get_async_database_url(SQL_ALCHEMY_DATABASE_URL) if SQL_ALCHEMY_DATABASE_URL else None
+)
+
+# one async engine per process for the async routes, created on first use
+_async_engine = None
+
+
+def get_async_engine():
+    """
+    Get Async Engine To Database (shared by the whole process)
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            SQL_ALCHEMY_ASYNC_DATABASE_URL, **engine_options(SQL_ALCHEMY_ASYNC_DATABASE_URL)
+        )
+    return _async_engine
+
+
+def get_async_session():
+    """
+    Create Async Session to Database
+    """
+    # objects stay loaded after commit so routes can read them without another query
+    return AsyncSession(get_async_engine(), expire_on_commit=False)
+
+
+def get_session():
+    """
+    Get Connection and Create Session to Database
+    """
+    engine = get_engine()
+    return Session(engine)
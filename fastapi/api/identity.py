@@ -0,0 +1,100 @@
+"""
+Authenticated User Principal With A Short-TTL Identity Cache
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Annotated, Optional
+from fastapi import Depends, HTTPException, status
+from sqlmodel import select
+from dotenv import load_dotenv
+from .database import User
+from .deps import get_async_session, get_user, oauth2_bearer_dependency
+from .tokens import token_digest
+from . import metrics
+
+
+load_dotenv()
+
+# how long a resolved identity is trusted (seconds) and how many are kept
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "30"))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "10000"))
+
+
+class IdentityCache:
+    """
+    (user id, token digest) -> principal, least recently used entries are evicted first.
+    invalidate(user_id) drops every token cached for that user.
+    """
+    def __init__(self, ttl: float = IDENTITY_CACHE_TTL, max_entries: int = IDENTITY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+        self.by_user: dict[int, set] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, digest: str) -> Optional[dict]:
+        entry = self.entries.get((user_id, digest))
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                self._remove((user_id, digest))
+            self.misses += 1
+            return None
+        self.entries.move_to_end((user_id, digest))
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user_id: int, digest: str, principal: dict):
+        self.entries[(user_id, digest)] = (time.time() + self.ttl, principal)
+        self.entries.move_to_end((user_id, digest))
+        self.by_user.setdefault(user_id, set()).add(digest)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def invalidate(self, user_id: int):
+        for digest in self.by_user.pop(user_id, set()):
+            self.entries.pop((user_id, digest), None)
+
+    def _remove(self, key: tuple):
+        self.entries.pop(key, None)
+        digests = self.by_user.get(key[0])
+        if digests is not None:
+            digests.discard(key[1])
+            if not digests:
+                del self.by_user[key[0]]
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+# process-wide identity cache, invalidate it when a route writes to a user
+identity_cache = IdentityCache()
+metrics.register("identity_cache", identity_cache.stats)
+
+
+async def get_principal(token: oauth2_bearer_dependency) -> dict:
+    """
+    Verify the bearer token and confirm the user still exists.
+    Returns {'username', 'id'}; the database is only hit on a cache miss, and only for those two columns.
+    """
+    claims = await get_user(token)
+    user_id = int(claims['id'])
+    digest = token_digest(token)
+
+    principal = identity_cache.get(user_id, digest)
+    if principal is not None:
+        return principal
+
+    async with get_async_session() as db:
+        row = (await db.exec(select(User.id, User.username).where(User.id == user_id))).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    principal = {'username': row.username, 'id': row.id}
+    identity_cache.set(user_id, digest, principal)
+    return principal
+
+
+# Injects the authenticated user's {'username', 'id'} into routes
+principal_dependency = Annotated[dict, Depends(get_principal)]
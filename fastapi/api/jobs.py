@@ -0,0 +1,213 @@
+"""
+In-Process Background Job Queue (plan generation off the request path)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# number of jobs that run at once, max queued jobs, finished jobs kept for polling
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "1000"))
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """
+    Raised when too many jobs are already waiting
+    """
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    user_id: int
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: JobStatus = JobStatus.PENDING
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (JobStatus.PENDING, JobStatus.RUNNING)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status.value,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+def job_key(kind: str, user_id: int, params: Dict[str, Any]) -> tuple:
+    """
+    Dedupe key: (kind, user, hash of the canonical JSON of the params), so a request
+    with different params (e.g. fresh=True) isn't merged into the job in flight
+    """
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return kind, user_id, hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+class JobQueue:
+    """
+    asyncio queue drained by a fixed number of worker tasks.
+    A job for the same (kind, user, params) that is still pending or running is
+    returned instead of enqueueing a duplicate. A user's jobs run one at a time,
+    in submit order, whatever their kind (they write the same user row): only the
+    oldest one is in the queue, the next one is queued when it finishes.
+    """
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_MAX, history: int = JOB_HISTORY):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.history = history
+        self.handlers: Dict[str, Handler] = {}
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.active: Dict[tuple, Job] = {}
+        # user_id -> the user's active jobs in submit order, the first one is queued or running
+        self.user_jobs: Dict[int, deque] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def register(self, kind: str, handler: Handler):
+        """
+        Register the coroutine that runs jobs of this kind: handler(user_id, **params)
+        """
+        self.handlers[kind] = handler
+
+    def _ensure_workers(self):
+        # workers start on first submit, on whichever loop is serving requests
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        # jobs queued on a previous loop will never run, don't let them block dedupe
+        for job in self.active.values():
+            job.status = JobStatus.FAILED
+            job.error = "Worker restarted"
+        self.active.clear()
+        self.user_jobs.clear()
+        self._queue = asyncio.Queue()
+        self._loop = loop
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, kind: str, user_id: int, **params) -> Job:
+        """
+        Enqueue a job, or return the user's job of this kind with the same params that is already in flight
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self._ensure_workers()
+
+        key = job_key(kind, user_id, params)
+        existing = self.active.get(key)
+        if existing is not None and existing.active:
+            return existing
+        if self.queued() >= self.max_queued:
+            raise QueueFull("Job queue is full")
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, user_id=user_id, params=params)
+        self.jobs[job.id] = job
+        self.active[key] = job
+        self._trim_history()
+        user_jobs = self.user_jobs.setdefault(user_id, deque())
+        user_jobs.append(job)
+        if len(user_jobs) == 1:
+            self._queue.put_nowait(job)
+        return job
+
+    def queued(self) -> int:
+        """
+        Jobs waiting to run (in the queue or behind another job of the same user)
+        """
+        waiting = sum(len(jobs) - 1 for jobs in self.user_jobs.values())
+        return self._queue.qsize() + waiting
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _trim_history(self):
+        # forget the oldest finished jobs once the history is full
+        while len(self.jobs) > self.history:
+            oldest_id = next((job_id for job_id, job in self.jobs.items() if not job.active), None)
+            if oldest_id is None:
+                break
+            del self.jobs[oldest_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await self.handlers[job.kind](job.user_id, **job.params)
+                job.status = JobStatus.DONE
+            except asyncio.CancelledError:
+                job.status = JobStatus.FAILED
+                job.error = "Cancelled"
+                raise
+            except Exception as e:
+                print(f"Job {job.id} ({job.kind}) failed: {e}")
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                key = job_key(job.kind, job.user_id, job.params)
+                if self.active.get(key) is job:
+                    del self.active[key]
+                self._next_for_user(job)
+                self._queue.task_done()
+
+    def _next_for_user(self, job: Job):
+        # queue the user's next job now that this one is done
+        user_jobs = self.user_jobs.get(job.user_id)
+        if not user_jobs or user_jobs[0] is not job:
+            return
+        user_jobs.popleft()
+        if user_jobs:
+            self._queue.put_nowait(user_jobs[0])
+        else:
+            del self.user_jobs[job.user_id]
+
+    async def stop(self):
+        """
+        Cancel the worker tasks (called on app shutdown)
+        """
+        for task in self._tasks:
+            task.cancel()
+        if self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+
+# process-wide queue used by the routers
+job_queue = JobQueue()
@@ -0,0 +1,51 @@
+"""
+Cache Of Extracted Keywords Keyed On The Normalized Feedback Text
+"""
+import hashlib
+import os
+import re
+import unicodedata
+from dotenv import load_dotenv
+from .cache import Cache, make_backend
+from . import metrics
+
+
+load_dotenv()
+
+# backend: "tiered" (memory in front of the app database, survives restarts),
+# "memory", "sql", "sqlite" (KEYWORD_CACHE_URL file) or "none"
+KEYWORD_CACHE_BACKEND = os.getenv("KEYWORD_CACHE_BACKEND", "tiered")
+KEYWORD_CACHE_URL = os.getenv("KEYWORD_CACHE_URL")
+KEYWORD_CACHE_TTL = float(os.getenv("KEYWORD_CACHE_TTL", str(90 * 24 * 3600)))  # seconds
+KEYWORD_CACHE_MAX_ENTRIES = int(os.getenv("KEYWORD_CACHE_MAX_ENTRIES", "50000"))
+KEYWORD_CACHE_MEMORY_ENTRIES = int(os.getenv("KEYWORD_CACHE_MEMORY_ENTRIES", "2000"))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Fold case, accents, punctuation and whitespace so that
+    "Loved the curry!" and "loved  the curry" are the same text
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.lower().replace("'", "").replace("’", "")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def keyword_cache_key(category: str, text: str) -> str:
+    """
+    sha256 of the feedback category and the normalized text
+    """
+    return hashlib.sha256(f"{category}:{normalize_text(text)}".encode()).hexdigest()
+
+
+# None when caching is turned off
+keyword_cache = None
+if KEYWORD_CACHE_BACKEND != "none":
+    keyword_cache = Cache(
+        "keywords",
+        make_backend(KEYWORD_CACHE_BACKEND, KEYWORD_CACHE_MAX_ENTRIES, KEYWORD_CACHE_URL, KEYWORD_CACHE_MEMORY_ENTRIES),
+        ttl=KEYWORD_CACHE_TTL,
+    )
+    metrics.register("keyword_cache", keyword_cache.stats.to_dict)
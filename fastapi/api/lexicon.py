@@ -0,0 +1,404 @@
+"""
+Local Keyword Extractor: lexicon matching on feedback text, no LLM call
+"""
+import os
+import re
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from . import metrics
+
+
+load_dotenv()
+
+# "local" (lexicon only), "llm" (always ask the LLM) or "hybrid" (lexicon, LLM when it isn't
+# confident); KEYWORD_EXTRACTOR sets the default, KEYWORD_EXTRACTOR_<CATEGORY> one feedback type
+KEYWORD_EXTRACTOR = os.getenv("KEYWORD_EXTRACTOR", "hybrid")
+KEYWORD_EXTRACTORS = {
+    category: os.getenv(f"KEYWORD_EXTRACTOR_{category.upper()}", KEYWORD_EXTRACTOR)
+    for category in ("liked_meal", "disliked_meal", "liked_workout", "disliked_workout")
+}
+# share of the text's content words the lexicon has to account for (hybrid mode)
+KEYWORD_LOCAL_MIN_CONFIDENCE = float(os.getenv("KEYWORD_LOCAL_MIN_CONFIDENCE", "0.6"))
+
+# "keyword|alias|alias": the keyword is what gets stored, any of the forms matches
+CUISINES = [
+    "American", "Brazilian", "Caribbean", "Chinese", "Ethiopian", "French", "Greek", "Indian",
+    "Indonesian", "Italian", "Japanese", "Korean", "Lebanese", "Mediterranean", "Mexican",
+    "Middle Eastern", "Moroccan", "Persian", "Peruvian", "Spanish", "Thai", "Turkish",
+    "Vietnamese", "Tex-Mex|tex mex", "Southern|soul food", "Cajun", "Filipino", "German",
+]
+FOODS = [
+    # proteins
+    "chicken", "beef", "pork", "lamb", "turkey", "duck", "steak", "ham", "bacon", "sausage",
+    "salmon", "tuna", "shrimp|prawns", "fish|cod|tilapia", "seafood|shellfish", "eggs|egg",
+    "tofu", "tempeh", "seitan", "beans|black beans|kidney beans", "lentils|dal|dhal", "chickpeas",
+    "edamame", "protein shake|protein shakes|shake", "protein",
+    # grains and starches
+    "rice|brown rice|white rice", "quinoa", "pasta|spaghetti|penne|noodles", "bread|toast", "oats|oatmeal|porridge",
+    "potatoes|potato|fries", "sweet potatoes|sweet potato", "tortillas|tortilla|wraps|wrap", "couscous",
+    "bagels|bagel", "cereal|granola", "pancakes|pancake|waffles", "naan", "rice noodles",
+    # vegetables and fruit
+    "vegetables|veggies|veg", "salad|salads", "broccoli", "spinach", "kale", "carrots", "peppers|bell peppers",
+    "mushrooms", "tomatoes", "onions", "garlic", "zucchini|zucchini noodles|zoodles", "cauliflower|cauliflower rice|mashed cauliflower", "cabbage", "asparagus",
+    "avocado", "cucumber", "eggplant|aubergine", "corn", "peas", "green beans",
+    "fruit|fruits", "berries|blueberries|strawberries|raspberries", "bananas|banana", "apples|apple",
+    "oranges|orange", "mango", "pineapple", "grapes", "smoothies|smoothie",
+    # dairy and fats
+    "cheese|cheddar|mozzarella|parmesan|feta", "yogurt|yoghurt|greek yogurt", "milk", "butter", "cream",
+    "nuts|almonds|walnuts|cashews|peanuts", "peanut butter", "seeds|chia seeds|flax seeds", "olive oil",
+    "hummus",
+    # dishes
+    "curry|curries", "stir fry|stir fried|stirfry", "soup|soups|stew|stews", "chili", "tacos|taco", "burritos|burrito",
+    "pizza", "burgers|burger", "sandwiches|sandwich", "sushi", "ramen", "pho", "lasagna", "risotto",
+    "omelette|omelet|frittata", "casserole", "bowls|grain bowls|buddha bowl", "kebabs|kebab", "falafel",
+    "fajitas", "enchiladas", "dumplings", "fried rice", "pad thai", "tikka masala", "biryani",
+    "meatballs", "roasted vegetables|roast vegetables|roasted veggies", "roast", "grilled chicken",
+    # other
+    "desserts|dessert|cake|cookies", "chocolate", "snacks|snack", "coffee", "tea", "juice",
+    "sauces|sauce|dressing", "spices|spice", "herbs", "dairy", "gluten", "meat", "red meat",
+    "processed food|processed foods|fast food|junk food", "leftovers",
+]
+MEAL_ATTRIBUTES = [
+    "easy|simple|straightforward", "quick|fast|quickly", "healthy|nutritious|wholesome", "tasty|delicious|flavorful|flavourful|tasted",
+    "spicy|hot|heat", "mild|bland", "sweet|sugary", "savory|savoury", "salty", "sour", "bitter", "creamy", "crispy|crunchy",
+    "fresh", "light", "heavy|rich|filling", "greasy|oily", "fried|deep fried", "grilled", "baked", "raw",
+    "difficult|hard|complicated|complex", "time consuming|too long|long prep|lengthy", "meal prep|meal prepping|batch cooking",
+    "cheap|affordable|budget", "expensive|pricey", "high protein|protein rich|protein packed", "low carb", "low fat",
+    "high fiber|fiber", "vegetarian|veggie", "vegan|plant based",
+    "repetitive|same meals|boring", "variety|varied", "kid friendly|family friendly",
+]
+EXERCISES = [
+    "running|run|jogging|jog", "sprints|sprinting|sprint", "walking|walk|walks|hiking|hike", "cycling|biking|bike|spin|spinning",
+    "swimming|swim|laps", "rowing|row|rows", "jump rope|skipping", "cardio|aerobic", "hiit|high intensity interval training|interval training|intervals",
+    "yoga", "pilates", "stretching|stretches|mobility|flexibility", "dancing|dance|zumba",
+    "weightlifting|weight lifting|lifting|weights|weight training|strength training|resistance training",
+    "powerlifting", "crossfit", "circuit training|circuits|circuit", "bodyweight exercises|bodyweight|calisthenics",
+    "squats|squat|back squat|front squat", "deadlifts|deadlift", "bench press|benching|bench", "overhead press|shoulder press|military press",
+    "lunges|lunge", "push-ups|push ups|pushups|push up", "pull-ups|pull ups|pullups|chin ups|chinups", "dips",
+    "planks|plank", "crunches|sit ups|situps", "burpees|burpee", "mountain climbers", "jumping jacks",
+    "box jumps|jumps|plyometrics|plyo", "bicep curls|bicep curl|curls|curl", "tricep extensions|triceps extension|tricep extension",
+    "bent over rows|barbell rows|dumbbell rows", "lat pulldowns|pulldowns", "leg press", "legs|leg day|leg workout", "arms|arm workouts|arm workout|arm day",
+    "core|abs|ab workout", "glutes|glute bridges|hip thrusts", "shoulders", "back|back workout|back day", "chest|chest day",
+    "upper body", "lower body", "full body", "boxing|kickboxing", "martial arts", "climbing|bouldering",
+    "tennis", "basketball", "soccer", "sports",
+]
+EQUIPMENT = [
+    "dumbbells|dumbbell|dumbells|dumbell|free weights", "kettlebells|kettlebell", "barbell|barbells",
+    "resistance bands|bands|band", "treadmill", "elliptical", "stationary bike|exercise bike|spin bike", "rowing machine|rower",
+    "machines|machine|cable machine|cables", "medicine ball", "stability ball|exercise ball", "foam roller|foam rolling",
+    "yoga mat|mat", "pull up bar", "gym", "home workouts|home workout|at home", "outdoor|outdoors|outside",
+    "pool", "track|outdoor track", "stairs|stair climber|stairmaster",
+]
+WORKOUT_ATTRIBUTES = [
+    "high intensity|intense|intensity", "low intensity|gentle|easygoing", "high impact", "low impact",
+    "challenging|challenge|tough", "difficult|hard|too hard|brutal", "easy|simple|manageable", "short|quick",
+    "long|too long|lengthy", "boring|monotonous|repetitive", "fun|enjoyable|engaging", "variety|varied|mixed",
+    "heavy weights|heavy", "light weights", "high reps", "low reps", "fast paced", "slow paced|slow",
+    "morning workouts|morning|mornings", "evening workouts|evening|evenings", "group classes|classes|class",
+    "joint stress|stress joints|joint pain|joints|knee pain|knees", "sore|soreness", "pain|hurt|hurts|painful|injury|injuries", "tiring|exhausting|exhausted",
+    "sweaty|sweat", "rest days|rest",
+]
+
+LEXICONS = {
+    "liked_meal": CUISINES + FOODS + MEAL_ATTRIBUTES,
+    "disliked_meal": CUISINES + FOODS + MEAL_ATTRIBUTES,
+    "liked_workout": EXERCISES + EQUIPMENT + WORKOUT_ATTRIBUTES,
+    "disliked_workout": EXERCISES + EQUIPMENT + WORKOUT_ATTRIBUTES,
+}
+# the polarity feedback of this type is written in (1 liked, -1 disliked)
+POLARITY = {"liked_meal": 1, "disliked_meal": -1, "liked_workout": 1, "disliked_workout": -1}
+
+NEGATORS = {"not", "no", "never", "without", "nothing", "none", "nor", "hardly", "barely", "neither"}
+# sentiment words that set the polarity of the keywords in their clause
+POSITIVE_CUES = {
+    "like", "love", "enjoy", "prefer", "appreciate", "adore", "want", "favorite", "favourite",
+    "good", "great", "nice", "amazing", "awesome", "excellent", "perfect", "wonderful", "fantastic",
+}
+NEGATIVE_CUES = {
+    "dislike", "hate", "detest", "loathe", "mind", "avoid", "disappoint",
+    "bad", "awful", "terrible", "horrible", "gross", "disgusting",
+}
+# phrases rewritten before matching
+IDIOMS = [
+    (r"\b(can ?no?t|can't|couldn't|couldnt) stand\b", "hate"),
+    (r"\b(don't|dont|didn't|didnt|do not|did not) mind\b", "like"),
+    (r"\bnot (a|much of a|the biggest) fan of\b", "dislike"),
+    (r"\b(a|big|huge) fan of\b", "like"),
+]
+CLAUSE_BREAKS = {".", ",", ";", "!", "?", "but", "although", "though", "however", "except", "whereas", "while", "yet"}
+# function words, dropped before matching
+STOPWORDS = set("""
+a an the i me my we our you your he she it its they them their this that these those there here
+and or so as of to in on at by for from with about into over after before during than then
+is am are was were be been being do does did have has had will would could should can may might must
+just really very quite pretty too also even still much more most less least lot lots bit some any all
+every each many few other another such own same only again always usually sometimes often ever
+because since when where why how what which who whom if else
+made make making cook cooking cooked prepare prepared eat eating ate try tried trying include included
+including get got give gave feel felt think thought find found seem seemed keep kept use used
+""".split())
+# domain words that can be part of a keyword ("fast food", "meal prep") but aren't one by themselves
+FILLER = {
+    "recipe", "meal", "food", "dish", "cuisine", "option", "choice", "plan", "workout", "exercise",
+    "routine", "session", "portion", "part", "one", "thing", "stuff", "way", "day", "week", "time",
+    "kind", "sort", "type",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?|[.,;!?]")
+_NOT = "\0not"
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix stripping, applied the same way to the lexicon and the text
+    ("curries" / "curry", "running" / "run", "baked" / "bake")
+    """
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("es") and (word[-3] in "xzo" or word[-4:-2] in ("sh", "ch")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]  # running -> run
+            break
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase words (accents folded, contractions kept together) and clause punctuation
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower().replace("’", "'")
+    for pattern, replacement in IDIOMS:
+        text = re.sub(pattern, replacement, text)
+    return _TOKEN_RE.findall(text)
+
+
+def _is_negator(token: str) -> bool:
+    return token in NEGATORS or token.endswith("n't") or token in ("dont", "didnt", "doesnt", "wasnt", "isnt", "cant", "wont", "arent", "werent")
+
+
+_FILLER_STEMS = {stem(word) for word in FILLER}
+_CUES = {**{stem(word): 1 for word in POSITIVE_CUES}, **{stem(word): -1 for word in NEGATIVE_CUES}}
+
+
+def words(text: str) -> Tuple[List[str], set]:
+    """
+    Stemmed words without stopwords (negations become a marker) and the word
+    positions where a new clause starts
+    """
+    result, breaks = [], set()
+    for token in tokenize(text):
+        if token in CLAUSE_BREAKS:
+            breaks.add(len(result))
+        elif _is_negator(token):
+            result.append(_NOT)
+        else:
+            token = token.replace("'", "")
+            if token not in STOPWORDS:
+                result.append(stem(token))
+    return result, breaks
+
+
+class Matcher:
+    """
+    Aho-Corasick automaton over stemmed word sequences: finds every lexicon phrase in
+    one pass over the text, then keeps the longest non-overlapping matches
+    """
+    def __init__(self, entries: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str]]] = [[]]  # (phrase length, keyword) ending at this state
+        for entry in entries:
+            keyword, *aliases = entry.split("|")
+            for form in [keyword, *aliases]:
+                phrase, _ = words(form)
+                if phrase:
+                    self._add(phrase, keyword)
+        self._link()
+
+    def _add(self, phrase: List[str], keyword: str):
+        state = 0
+        for word in phrase:
+            if word not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][word] = len(self.goto) - 1
+            state = self.goto[state][word]
+        # the first entry that claims a phrase keeps it
+        if all(length != len(phrase) for length, _ in self.out[state]):
+            self.out[state].append((len(phrase), keyword))
+
+    def _link(self):
+        # breadth-first, so a state's failure link is set before its children's
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0) if state else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+                queue.append(child)
+
+    def find(self, words: List[str]) -> List[Tuple[int, int, str]]:
+        """
+        (start, end, keyword) of the longest non-overlapping matches, in text order
+        """
+        matches = []
+        state = 0
+        for end, word in enumerate(words, start=1):
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            for length, keyword in self.out[state]:
+                matches.append((end - length, end, keyword))
+
+        chosen = []
+        taken = set()
+        for start, end, keyword in sorted(matches, key=lambda m: (m[0] - m[1], m[0])):
+            if not taken.intersection(range(start, end)):
+                chosen.append((start, end, keyword))
+                taken.update(range(start, end))
+        return sorted(chosen)
+
+
+_matchers: Dict[str, Matcher] = {}
+
+
+def matcher(category: str) -> Matcher:
+    # built on first use so importing the app stays cheap
+    if category not in _matchers:
+        _matchers[category] = Matcher(LEXICONS[category])
+    return _matchers[category]
+
+
+@dataclass
+class Extraction:
+    keywords: List[str] = field(default_factory=list)
+    confidence: float = 0.0
+
+
+def extract_keywords(category: str, text: str) -> Extraction:
+    """
+    Keywords for one feedback category, in the order they appear. Words are stemmed and
+    matched against the lexicon. Within a clause, a sentiment cue ("liked", "hated", "was
+    bad") sets the polarity of its keywords and a negation ("not", "didn't", "no") flips it;
+    keywords without a cue take the category's polarity. Only keywords with the category's
+    polarity are kept ("liked the curry but not the tofu" -> liked: curry).
+    confidence is the share of the text's content words that are part of a keyword.
+    """
+    text_words, breaks = words(text)
+    markers = {i for i, word in enumerate(text_words) if word == _NOT or word in _CUES}
+    # keywords can't span a negation or cue
+    matches = [m for m in matcher(category).find(text_words) if not markers.intersection(range(m[0], m[1]))]
+    starts = {start: (end, keyword) for start, end, keyword in matches}
+
+    default = POLARITY[category]
+    found: List[Tuple[int, str, int]] = []  # (position, keyword, polarity)
+    pending: List[Tuple[int, str, bool]] = []  # keywords waiting for a cue later in the clause
+    negated, cue = False, None
+
+    def end_clause():
+        for position, keyword, was_negated in pending:
+            found.append((position, keyword, -default if was_negated else default))
+        pending.clear()
+
+    i = 0
+    while i < len(text_words):
+        if i in breaks:
+            end_clause()
+            negated, cue = False, None
+        word = text_words[i]
+        if i in starts:
+            end, keyword = starts[i]
+            if cue is not None:
+                found.append((i, keyword, -cue if negated else cue))
+            else:
+                pending.append((i, keyword, negated))
+            i = end
+            continue
+        if word == _NOT:
+            negated = not negated
+        elif word in _CUES:
+            cue = -_CUES[word] if negated else _CUES[word]  # "didn't like" is a negative cue
+            negated = False
+            for position, keyword, was_negated in pending:
+                found.append((position, keyword, -cue if was_negated else cue))
+            pending.clear()
+        i += 1
+    end_clause()
+
+    keywords = []
+    for _, keyword, polarity in sorted(found):
+        if polarity == default and keyword not in keywords:
+            keywords.append(keyword)
+
+    matched = sum(1 for start, end, _ in matches for word in text_words[start:end] if word not in _FILLER_STEMS)
+    content = sum(1 for i, word in enumerate(text_words) if i not in markers and word not in _FILLER_STEMS and not word.isdigit())
+    return Extraction(keywords, round(matched / content, 3) if content and matched else 0.0)
+
+
+class ExtractorStats:
+    def __init__(self):
+        self.local = 0  # answered by the lexicon
+        self.fallbacks = 0  # lexicon not confident enough, sent to the LLM
+        self.llm = 0  # categories set to "llm"
+        self.latency = metrics.LatencyStats()
+
+    def to_dict(self) -> dict:
+        return {"local": self.local, "fallbacks": self.fallbacks, "llm": self.llm, "latency": self.latency.to_dict()}
+
+
+extractor_stats = ExtractorStats()
+metrics.register("keyword_extractor", extractor_stats.to_dict)
+
+
+def local_keywords(category: str, text: str) -> Optional[List[str]]:
+    """
+    Keywords from the lexicon if the category's extractor setting allows it and (in hybrid
+    mode) the extraction is confident enough; None means ask the LLM
+    """
+    mode = KEYWORD_EXTRACTORS.get(category, KEYWORD_EXTRACTOR)
+    if mode == "llm":
+        extractor_stats.llm += 1
+        return None
+
+    matcher(category)  # build outside the timing on first use
+    start = time.perf_counter()
+    extraction = extract_keywords(category, text)
+    extractor_stats.latency.record(time.perf_counter() - start)
+    if mode == "local" or extraction.confidence >= KEYWORD_LOCAL_MIN_CONFIDENCE:
+        extractor_stats.local += 1
+        return extraction.keywords
+    extractor_stats.fallbacks += 1
+    print(f"LOCAL KEYWORDS NOT CONFIDENT ({extraction.confidence}) FOR {category}, ASKING THE LLM")
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the local keyword extractor on some feedback text")
+    parser.add_argument("category", choices=list(LEXICONS))
+    parser.add_argument("text")
+    args = parser.parse_args()
+    result = extract_keywords(args.category, args.text)
+    print(f"{', '.join(result.keywords)}  (confidence {result.confidence})")
@@ -0,0 +1,174 @@
+"""
+Shared Async HTTP Client For LLM Calls (DeepSeek / OpenRouter)
+"""
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# get API key and url from .env file
+DEEPSEEK_KEY = os.getenv("DEEPSEEK_KEY")
+DEEPSEEK_URL = os.getenv("DEEPSEEK_URL")
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek/deepseek-chat:free")
+
+# timeouts (seconds), pool limits and how many LLM calls may be in flight at once
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+headers = {
+    'Authorization': f'Bearer {DEEPSEEK_KEY}',
+    'Content-Type': 'application/json'
+}
+
+
+class LLMError(Exception):
+    """
+    Raised when the LLM API can't be reached or returns an error.
+    status_code is set when the API answered with an error response.
+    """
+    def __init__(self, detail: Any, status_code: Optional[int] = None):
+        super().__init__(str(detail))
+        self.detail = detail
+        self.status_code = status_code
+
+
+# client and semaphore are created on first use and tied to the running event loop
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def http2_available() -> bool:
+    """
+    HTTP/2 needs the optional h2 package (httpx[http2])
+    """
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get the shared keep-alive client (one connection pool per process)
+    """
+    global _client, _semaphore, _loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _loop is not loop:
+        _client = httpx.AsyncClient(
+            headers=headers,
+            http2=http2_available(),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+        )
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _loop = loop
+    return _client
+
+
+async def close_client():
+    """
+    Close the shared client (called on app shutdown)
+    """
+    global _client, _semaphore, _loop
+    if _client is not None:
+        await _client.aclose()
+    _client, _semaphore, _loop = None, None, None
+
+
+async def chat_completion(messages: List[Dict[str, Any]], model: Optional[str] = None,
+                          timeout: Optional[float] = None, **options) -> Dict[str, Any]:
+    """
+    Send messages to the chat completions API and return the response json.
+    Extra keyword arguments are added to the request body.
+    """
+    client = get_client()
+    data = {"model": model or LLM_MODEL, "messages": messages, **options}
+
+    async with _semaphore:
+        try:
+            response = await client.post(
+                DEEPSEEK_URL, json=data,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+
+    try:
+        response_json = response.json()
+    except ValueError:
+        raise LLMError(response.text, status_code=response.status_code)
+
+    # if response is not valid or empty
+    if response.status_code != 200 or "error" in response_json:
+        raise LLMError(response_json.get("error", {}), status_code=response.status_code)
+
+    return response_json
+
+
+async def chat_content(messages: List[Dict[str, Any]], **kwargs) -> str:
+    """
+    Send messages to the chat completions API and return the assistant's reply text
+    """
+    response_json = await chat_completion(messages, **kwargs)
+    try:
+        return response_json['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError) as e:
+        raise LLMError(f"Unexpected response format: {response_json}") from e
+
+
+async def stream_chat_content(messages: List[Dict[str, Any]], model: Optional[str] = None,
+                              timeout: Optional[float] = None, **options) -> AsyncIterator[str]:
+    """
+    Send messages with stream=true and yield the assistant's reply text as it arrives
+    (parses the API's server-sent events)
+    """
+    client = get_client()
+    data = {"model": model or LLM_MODEL, "messages": messages, "stream": True, **options}
+
+    async with _semaphore:
+        try:
+            async with client.stream(
+                "POST", DEEPSEEK_URL, json=data,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode(errors="replace")
+                    try:
+                        parsed = json.loads(body)
+                        detail = parsed.get("error", body) if isinstance(parsed, dict) else body
+                    except ValueError:
+                        detail = body
+                    raise LLMError(detail, status_code=response.status_code)
+
+                async for line in response.aiter_lines():
+                    # skip blank lines and keep-alive comments (": OPENROUTER PROCESSING")
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(payload)
+                    except ValueError:
+                        continue
+                    if "error" in chunk:
+                        raise LLMError(chunk["error"], status_code=response.status_code)
+                    choices = chunk.get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
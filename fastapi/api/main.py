@@ -1,22 +1,61 @@
 """
 Main File For Running FastAPI
 """
-from fastapi import Depends, FastAPI, status, HTTPException, Request, Body
+from fastapi import Depends, FastAPI, status, HTTPException, Request, Body, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Annotated
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
+from typing import Annotated, Optional
 from sqlmodel import Session
 from dotenv import load_dotenv
+import asyncio
+import hmac
+import json
 import os
-import requests
 from typing import List, Dict, Any
-from .deps import get_db, get_user
+from .database import init_db
+from .deps import get_db, get_user, user_dependency
+from .llm import chat_content, stream_chat_content, close_client, LLMError
+from .providers import close_providers
+from .chat import chat_sessions, clip_message, compact
+from .jobs import job_queue
+from .pregen import pregen_loop, PREGEN_ENABLED
+from .passwords import hashing_pool
+from . import metrics
 from .routers import auth, user
 
 # load environment variables
 load_dotenv()
 
+# create missing tables when the app starts (set to false where Alembic manages the schema)
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "true").lower() == "true"
+# GET /metrics is only served when a token is set, and only to requests with "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup / shutdown hooks for the app
+    """
+    if DB_INIT_ON_STARTUP:
+        await asyncio.to_thread(init_db)
+    # off-peak pre-generation of next week's plans (see pregen.py)
+    pregen_task = asyncio.create_task(pregen_loop()) if PREGEN_ENABLED else None
+    yield
+    # stop background workers, the hashing pool and close pooled LLM connections
+    if pregen_task:
+        pregen_task.cancel()
+        await asyncio.gather(pregen_task, return_exceptions=True)
+    await job_queue.stop()
+    hashing_pool.shutdown()
+    await close_client()
+    await close_providers()
+
+
 # main app for FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Define your allowed origins
 origins = [
@@ -45,6 +84,20 @@ def health_check():
     """
     return 'Health check complete'
 
+@app.get("/metrics")
+def get_metrics(request: Request):
+    """
+    cache, queue and latency counters for every registered source (needs METRICS_TOKEN)
+    """
+    # off unless configured: answer as if the route didn't exist
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return metrics.snapshot()
+
 app.include_router(auth.router)
 app.include_router(user.router)
 
@@ -52,59 +105,82 @@ app.include_router(user.router)
 # app.include_router(auth_routes.router) # authentication routes
 # app.include_router(calorie_routes.router) # calorie tracker website regular routes
 
-DEEPSEEK_KEY = os.getenv("DEEPSEEK_KEY")
-DEEPSEEK_URL = os.getenv("DEEPSEEK_URL")
-
-headers = {
-    'Authorization': f'Bearer {DEEPSEEK_KEY}',
-    'Content-Type': 'application/json'
-}
-
-# global conversation history (for demo purposes; in production, maintain per-session or per-user history)
-conversation_history: List[Dict[str, Any]] = [
-    {
-        "role": "system",
-        "content": (
-            "This conversation is part of a health app. You are a friendly assistant who offers support on exercise and nutrition topics. "
-            "Please refer users to the eating disorder hotline at 1-888-375-7767 if severe symptoms are detected."
-        )
-    }
-]
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """
+    Format one server-sent event
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 
 @app.post("/chat", status_code=status.HTTP_200_OK)
-async def chat_endpoint(message: str = Body(..., embed=True)):
+async def chat_endpoint(user: user_dependency, background_tasks: BackgroundTasks,
+                        message: str = Body(..., embed=True), stream: bool = Body(False, embed=True)):
     """
-    Accepts a chat message from the front end, appends it to the conversation history,
-    sends the updated conversation to the DeepSeek API, then returns the assistant's reply.
+    Accepts a chat message from the front end, sends it to the DeepSeek API with the
+    user's recent conversation (and a summary of older turns), then returns the assistant's reply.
+    With stream=true the reply is relayed as server-sent events while it is generated:
+    data: {"delta": "..."} for each piece, then event: done with the full reply (or event: error).
     """
-    # append user's message.
-    conversation_history.append({"role": "user", "content": message})
-
-    # prepare data to send to DeepSeek API
-    data = {
-        "model": "deepseek/deepseek-chat:free",
-        "messages": conversation_history
-    }
-    
-    try:
-        # send request to DeepSeek API
-        response = requests.post(DEEPSEEK_URL, json=data, headers=headers)
-        
-        # convert response into json
-        response_json = response.json()
-        
-        # if response is not valid or empty
-        if response.status_code != 200 or "error" in response_json:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=response_json.get("error", {}))
-        
-        # get assistant's reply from response
-        assistant_reply = response_json['choices'][0]['message']['content']
-        
-        # append assistant's reply to conversation history
-        conversation_history.append({"role": "assistant", "content": assistant_reply})
-        
-        # return chatbot's reply to front end
-        return {"reply": assistant_reply}
-
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    session = chat_sessions.get(user['id'])
+    message = clip_message(message)
+
+    # summarize the turns that don't leave room for this message before it's sent
+    if session.overflow(message):
+        await compact(session, message)
+
+    if stream:
+        return StreamingResponse(
+            stream_chat_reply(session, message),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            # fold old turns into the summary once the stream has finished
+            background=BackgroundTask(compact, session),
+        )
+
+    async with session.lock:
+        try:
+            # send conversation window to DeepSeek API and get assistant's reply
+            assistant_reply = await chat_content(session.context(message))
+        except LLMError as e:
+            # API answered with an error vs. API could not be reached
+            if e.status_code is not None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.detail)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+        # append user's message and assistant's reply to the user's history
+        session.add_turn(message, assistant_reply)
+
+    # fold old turns into the summary after the reply has been sent
+    background_tasks.add_task(compact, session)
+
+    # return chatbot's reply to front end
+    return {"reply": assistant_reply}
+
+
+@app.delete("/chat", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_chat(user: user_dependency):
+    """
+    Forget the user's conversation and summary, so the next message starts a new chat
+    """
+    chat_sessions.clear(user['id'])
+
+
+async def stream_chat_reply(session, message: str):
+    """
+    Relay the streamed reply to the client and add the turn to the history once complete
+    """
+    async with session.lock:
+        parts = []
+        try:
+            async for delta in stream_chat_content(session.context(message)):
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+        except LLMError as e:
+            yield sse_event({"detail": e.detail if e.status_code is not None else str(e)}, event="error")
+            return
+
+        assistant_reply = "".join(parts)
+        session.add_turn(message, assistant_reply)
+
+    yield sse_event({"reply": assistant_reply}, event="done")
@@ -0,0 +1,56 @@
+"""
+Process-Wide Metrics Registry (served at GET /metrics when METRICS_TOKEN is set)
+"""
+from collections import deque
+from typing import Callable, Dict
+
+
+# name -> function returning a json-serializable snapshot
+_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, source: Callable[[], dict]):
+    """
+    Register a metrics source, e.g. register("plan_cache", plan_cache.stats.to_dict)
+    """
+    _sources[name] = source
+
+
+def snapshot() -> dict:
+    """
+    Collect the current value of every registered metrics source
+    """
+    return {name: source() for name, source in _sources.items()}
+
+
+class LatencyStats:
+    """
+    Count, mean and percentiles over the most recent samples (milliseconds)
+    """
+    def __init__(self, window: int = 1000):
+        self.samples: deque = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000
+        self.samples.append(ms)
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "max_ms": round(self.max, 2),
+        }
@@ -2,379 +2,458 @@
 Models For Calorie Tracker Website
 """
 from sqlmodel import SQLModel, Field, Relationship, String, Column, ForeignKey, UniqueConstraint, Session, select, delete, create_engine
-from typing import Optional
-from sqlalchemy.orm import attributes
+from typing import Optional, Union
+from sqlalchemy import bindparam, text, update
+from sqlalchemy.dialects.postgresql import JSONB
+import asyncio
 import os
 import re
-import ollama
-import requests
 import json
-from .database import User
+from .database import User, user_load_options
 from dotenv import load_dotenv
-from .deps import get_engine
+from .engine import get_async_session
+from .llm import LLMError
+from .providers import route_content
+from .keyword_cache import keyword_cache, keyword_cache_key
+from .lexicon import local_keywords
+from .plan_output import request_structured_plan
 
 
-engine = get_engine()
-
 load_dotenv()
 
-# get API key and url from .env file
-DEEPSEEK_KEY = os.getenv("DEEPSEEK_KEY")
-DEEPSEEK_URL = os.getenv("DEEPSEEK_URL")
+# "json": schema-checked JSON plans (see plan_output), "text": the underscore-separated format
+PLAN_FORMAT = os.getenv("PLAN_FORMAT", "json")
 
 
-headers = {
-    'Authorization': f'Bearer {DEEPSEEK_KEY}',
-    'Content-Type': 'application/json'
-}
+def _user_filter(User_Name: Union[str, int]):
+    """
+    Routers pass the user's id, scripts pass the username
+    """
+    if isinstance(User_Name, int):
+        return User.id == User_Name
+    return User.username == User_Name
 
 
-def extract_keywords_liked_meal(text: Optional[str], User_Name):
+async def _request_keywords(category: str, text: str, prompt: str) -> list[str]:
     """
-    Extract keywords from a text string using the DeepSeek model.
+    Ask the LLM for a comma-separated keyword list and split it.
+    The local lexicon extractor answers first when the category allows it (see lexicon.py).
+    Feedback that was already extracted (after normalizing case, punctuation
+    and whitespace) is answered from the keyword cache without a network call.
     """
-    if not text or not text.strip():
+    keywords = local_keywords(category, text)
+    if keywords is not None:
+        return keywords
+
+    key = keyword_cache_key(category, text) if keyword_cache else None
+    if key:
+        cached = await keyword_cache.get(key)
+        if cached is not None:
+            return cached
+
+    content = (await route_content("keywords", [{"role": "user", "content": prompt}])).strip()
+    keywords = [k.strip() for k in content.split(",") if k.strip()]
+
+    if key:
+        await keyword_cache.set(key, keywords)
+    return keywords
+
+
+# Postgres: append the keywords the user doesn't have yet in one statement (row locked,
+# list not sent to Python) and return the ones that were added, in their original order
+_APPEND_KEYWORDS_SQL = """
+WITH old AS (
+    SELECT id, COALESCE({column}, '[]'::jsonb) AS val FROM "user" WHERE {key} = :user FOR UPDATE
+), added AS (
+    SELECT COALESCE(jsonb_agg(k.value ORDER BY k.ord), '[]'::jsonb) AS val
+    FROM old, jsonb_array_elements(:keywords) WITH ORDINALITY AS k(value, ord)
+    WHERE NOT old.val @> jsonb_build_array(k.value)
+)
+UPDATE "user" SET {column} = old.val || added.val
+FROM old, added WHERE "user".id = old.id
+RETURNING added.val
+"""
+
+
+async def append_keywords(session, User_Name: Union[str, int], column: str, keywords: list[str]) -> list[str]:
+    """
+    Append keywords the user doesn't already have to one of their preference lists
+    (the caller commits). Returns the keywords that were added.
+    """
+    # drop empty strings and repeats within the new keywords
+    keywords = list(dict.fromkeys(k for k in keywords if k))
+    if not keywords or column not in KEYWORD_COLUMNS.values():
         return []
 
-    
-    data = {
-        "model": "deepseek/deepseek-chat:free",
-        "messages": [{
-            "role": "user",
-            "content": (
-                f"Extract the key words or phrases from the following text: '{text}'. "
-                f"Focus on specific foods that they liked and adjectives describing the food. "
-                f"Return the keywords as a comma-separated list, e.g., 'Indian, chicken, rice, easy'. "
-                f"Only return the list, no extra text."
-            )
-        }]
-    }
+    if session.bind.dialect.name == "postgresql":
+        key = "id" if isinstance(User_Name, int) else "username"
+        statement = (
+            text(_APPEND_KEYWORDS_SQL.format(column=column, key=key))
+            .bindparams(bindparam("keywords", type_=JSONB))
+            .columns(val=JSONB)
+        )
+        result = await session.execute(statement, {"user": User_Name, "keywords": keywords})
+        return result.scalar_one_or_none() or []
 
-    response = requests.post(DEEPSEEK_URL, json=data, headers=headers)
-    response.raise_for_status()
-    response_json = response.json()
-    # print(json.dumps(response_json, indent=4))
-        
-    content = response_json['choices'][0]['message']['content'].strip()
+    # SQLite: read just this column, merge here, write it back
+    row = (await session.exec(select(User.id, getattr(User, column)).where(_user_filter(User_Name)))).first()
+    if row is None:
+        return []
+    current = row[1] or []
+    new_keywords = [k for k in keywords if k not in current]
+    if new_keywords:
+        await session.execute(update(User).where(User.id == row[0]).values({column: current + new_keywords}))
+    return new_keywords
 
-    
-    
-    keywords = [k.strip() for k in content.split(",") if k.strip()]
-    
-    with Session(engine) as session:
-        with session.begin():
-            user = session.exec(select(User).where(User.username == User_Name)).first()
-            if not user:
-                return
-            
-            if user.liked_meals is None:
-                user.liked_meals = []
-            
-            # Filter out duplicates and empty strings
-            new_keywords = [k for k in keywords if k and k not in user.liked_meals]
-            
+
+async def _store_keywords(User_Name: Union[str, int], column: str, keywords: list[str]):
+    """
+    Append keywords the user doesn't already have to one of their preference lists
+    """
+    async with get_async_session() as session:
+        async with session.begin():
+            new_keywords = await append_keywords(session, User_Name, column, keywords)
             if not new_keywords:
                 print("No new keywords to add")
                 return []
-            
-            user.liked_meals.extend(new_keywords)
-            
-            attributes.flag_modified(user, "liked_meals")
-            
-            session.add(user)
             # No need to explicitly commit when using session.begin() context manager
-        
-        # Verify the changes were saved
-        with Session(engine) as verify_session:
-            updated_user = verify_session.get(User, user.id)
-                
+
+    return new_keywords
 
 
-def extract_keywords_disliked_meal(text: Optional[str], User_Name):
+async def extract_keywords_liked_meal(text: Optional[str], User_Name):
     """
     Extract keywords from a text string using the DeepSeek model.
     """
     if not text or not text.strip():
         return []
 
-    
-    data = {
-        "model": "deepseek/deepseek-chat:free",
-        "messages": [{
-            "role": "user",
-            "content": (
-                f"Extract the key words or phrases from the following text: '{text}'. "
-                f"Focus on specific foods that they disliked and adjectives describing the food. "
-                f"Return the keywords as a comma-separated list, e.g., 'Indian, chicken, rice, easy'. "
-                f"Only return the list, no extra text."
-            )
-        }]
-    }
-    
-    response = requests.post(DEEPSEEK_URL, json=data, headers=headers)
-    response.raise_for_status()
-    response_json = response.json()
-    
-    # print(json.dumps(response_json, indent=4))
-    
-    content = response_json['choices'][0]['message']['content'].strip()
-    
-    # Robust splitting that handles various comma formats
-    keywords = [k.strip() for k in content.split(",") if k.strip()]
-    
-    with Session(engine) as session:
-        with session.begin():
-            user = session.exec(select(User).where(User.username == User_Name)).first()
-            if not user:
-                return
-            
-            # Initialize if None
-            if user.disliked_meals is None:
-                user.disliked_meals = []
-            
-            # Filter out duplicates and empty strings
-            new_keywords = [k for k in keywords if k and k not in user.disliked_meals]
-            
-            if not new_keywords:
-                print("No new keywords to add")
-                return []
-            
-            user.disliked_meals.extend(new_keywords)
-            
-            attributes.flag_modified(user, "disliked_meals")
-            
-            session.add(user)
-        
-        with Session(engine) as verify_session:
-            updated_user = verify_session.get(User, user.id)
-            
-
-
-def extract_keywords_liked_workout(text: Optional[str], User_Name: str):
+    keywords = await _request_keywords(
+        "liked_meal", text,
+        f"Extract the key words or phrases from the following text: '{text}'. "
+        f"Focus on specific foods that they liked and adjectives describing the food. "
+        f"Return the keywords as a comma-separated list, e.g., 'Indian, chicken, rice, easy'. "
+        f"Only return the list, no extra text."
+    )
+    return await _store_keywords(User_Name, "liked_meals", keywords)
+
+
+async def extract_keywords_disliked_meal(text: Optional[str], User_Name):
+    """
+    Extract keywords from a text string using the DeepSeek model.
+    """
     if not text or not text.strip():
         return []
-    
-    data = {
-        "model": "deepseek/deepseek-chat:free",
-        "messages": [{
-            "role": "user",
-            "content": (
-                f"Extract the key words or phrases from this workout review: '{text}'\n"
-                f"Focus SPECIFICALLY on:\n"
-                f"1. Exercises/types of workouts they enjoyed (e.g., 'deadlifts', 'yoga', 'HIIT')\n"
-                f"2. Positive workout attributes (e.g., 'high intensity', 'low impact', 'challenging')\n"
-                f"3. Liked equipment/facilities (e.g., 'kettlebells', 'outdoor track')\n"
-                f"Return ONLY a comma-separated list like: 'deadlifts, high intensity, kettlebells, morning workouts'.\n"
-                f"Exclude any negative comments or neutral descriptions.\n"
-                f"Only return the list, no extra text."
-            )
-        }]
-    }
 
-    response = requests.post(DEEPSEEK_URL, json=data, headers=headers)
-    response.raise_for_status()
-    response_json = response.json()
-    content = response_json['choices'][0]['message']['content'].strip()
-    
-    keywords = [k.strip() for k in content.split(",") if k.strip()]
-    
-    with Session(engine) as session:
-        with session.begin():
-            user = session.exec(select(User).where(User.username == User_Name)).first()
-            if not user:
-                return
-            
-            #print(f"Found user: {user.username}")
-            #print(f"Current liked_workouts: {user.liked_workouts}")
-            
-            if user.liked_workouts is None:
-                user.liked_workouts = []
-            
-            new_keywords = [k for k in keywords if k and k not in user.liked_workouts]
-            
-            if not new_keywords:
-                print("No new keywords to add")
-                return []
-            
-            print(f"Adding new keywords: {new_keywords}")
-            user.liked_workouts.extend(new_keywords)
-            
-            attributes.flag_modified(user, "liked_workouts")
-            
-            session.add(user)
-        
-        with Session(engine) as verify_session:
-            updated_user = verify_session.get(User, user.id)
-            #print(f"Verified liked_workouts: {updated_user.liked_workouts}")
-            
-
-
-def extract_keywords_disliked_workout(text: Optional[str], User_Name: str):
+    keywords = await _request_keywords(
+        "disliked_meal", text,
+        f"Extract the key words or phrases from the following text: '{text}'. "
+        f"Focus on specific foods that they disliked and adjectives describing the food. "
+        f"Return the keywords as a comma-separated list, e.g., 'Indian, chicken, rice, easy'. "
+        f"Only return the list, no extra text."
+    )
+    return await _store_keywords(User_Name, "disliked_meals", keywords)
+
+
+async def extract_keywords_liked_workout(text: Optional[str], User_Name):
     if not text or not text.strip():
         return []
-    
-    data = {
-        "model": "deepseek/deepseek-chat:free",
-        "messages": [{
-            "role": "user",
-            "content": (
-                f"Extract the key words or phrases from this workout review: '{text}'\n"
-                f"Focus SPECIFICALLY on:\n"
-                f"1. Exercises/types of workouts they did not enjoy (e.g., 'deadlifts', 'yoga', 'HIIT')\n"
-                f"2. Negative workout attributes (e.g., 'high intensity', 'low impact', 'difficult')\n"
-                f"3. Disliked equipment/facilities (e.g., 'kettlebells', 'outdoor track')\n"
-                f"Return ONLY a comma-separated list like: 'deadlifts, high intensity, kettlebells, morning workouts'.\n"
-                f"Exclude any positive comments or neutral descriptions.\n"
-                f"Only return the list, no extra text."
-            )
-        }]
+
+    keywords = await _request_keywords(
+        "liked_workout", text,
+        f"Extract the key words or phrases from this workout review: '{text}'\n"
+        f"Focus SPECIFICALLY on:\n"
+        f"1. Exercises/types of workouts they enjoyed (e.g., 'deadlifts', 'yoga', 'HIIT')\n"
+        f"2. Positive workout attributes (e.g., 'high intensity', 'low impact', 'challenging')\n"
+        f"3. Liked equipment/facilities (e.g., 'kettlebells', 'outdoor track')\n"
+        f"Return ONLY a comma-separated list like: 'deadlifts, high intensity, kettlebells, morning workouts'.\n"
+        f"Exclude any negative comments or neutral descriptions.\n"
+        f"Only return the list, no extra text."
+    )
+    return await _store_keywords(User_Name, "liked_workouts", keywords)
+
+
+async def extract_keywords_disliked_workout(text: Optional[str], User_Name):
+    if not text or not text.strip():
+        return []
+
+    keywords = await _request_keywords(
+        "disliked_workout", text,
+        f"Extract the key words or phrases from this workout review: '{text}'\n"
+        f"Focus SPECIFICALLY on:\n"
+        f"1. Exercises/types of workouts they did not enjoy (e.g., 'deadlifts', 'yoga', 'HIIT')\n"
+        f"2. Negative workout attributes (e.g., 'high intensity', 'low impact', 'difficult')\n"
+        f"3. Disliked equipment/facilities (e.g., 'kettlebells', 'outdoor track')\n"
+        f"Return ONLY a comma-separated list like: 'deadlifts, high intensity, kettlebells, morning workouts'.\n"
+        f"Exclude any positive comments or neutral descriptions.\n"
+        f"Only return the list, no extra text."
+    )
+    return await _store_keywords(User_Name, "disliked_workouts", keywords)
+
+
+def meal_plan_inputs(user: User) -> dict:
+    """
+    The User fields the meal plan prompt is built from
+    """
+    return {
+        "age": user.age,
+        "gender": user.gender,
+        "weight_kg": user.weight_kg,
+        "height_cm": user.height_cm,
+        "activity_level": user.activity_level,
+        "fitness_goals": user.fitness_goals,
+        "diet_preference": user.diet_preference,
+        "liked_meals": user.liked_meals,
+        "disliked_meals": user.disliked_meals,
+        "allergies": user.allergies,
     }
 
-    response = requests.post(DEEPSEEK_URL, json=data, headers=headers)
-    response.raise_for_status()
-    response_json = response.json()
-    content = response_json['choices'][0]['message']['content'].strip()
 
-    keywords = [k.strip() for k in content.split(",") if k.strip()]
-    
-    with Session(engine) as session:
-        with session.begin():
-            user = session.exec(select(User).where(User.username == User_Name)).first()
-            if not user:
-                return
-            
-            if user.disliked_workouts is None:
-                user.disliked_workouts = []
-
-            new_keywords = [k for k in keywords if k and k not in user.disliked_workouts]
-            
-            if not new_keywords:
-                print("No new keywords to add")
-                return []
-            
-            user.disliked_workouts.extend(new_keywords)
-            attributes.flag_modified(user, "disliked_workouts")
-            session.add(user)
-        
-        with Session(engine) as verify_session:
-            updated_user = verify_session.get(User, user.id)
-            
-
-
-def create_meal_plan(user_id):
-    user_context = ''
-    engine = get_engine()
-    with Session(engine) as session:
-        # query the user by ID
-        statement = select(User).where(User.id == user_id)
-        user = session.exec(statement).first()
-
-        # print(f'---------- {user.username} ---------')
-        user_context = (
-            f"{user.age}-year-old {user.gender if user.gender else 'person'} "
-            f"weighing {user.weight_kg} kg and {user.height_cm} cm tall, "
-            f"with {user.activity_level if user.activity_level else 'unspecified'} activity level, "
-            f"aiming for {', '.join(goal for goal in user.fitness_goals)}, "
-            f"following a {user.diet_preference if user.diet_preference else 'flexible'} diet, "
-            f"liking foods such as {user.liked_meals if user.liked_meals else 'unspecified'}, "
-            f"disliking foods such as {user.disliked_meals if user.disliked_meals else 'unspecified'}, "
-            f"alergic to (DO NOT INCLUDE THESE FOODS) {user.allergies if user.allergies else 'no specific allergies'}, "
+def workout_plan_inputs(user: User) -> dict:
+    """
+    The User fields the exercise routine prompt is built from
+    """
+    return {
+        "age": user.age,
+        "gender": user.gender,
+        "weight_kg": user.weight_kg,
+        "height_cm": user.height_cm,
+        "activity_level": user.activity_level,
+        "fitness_goals": user.fitness_goals,
+        "exercise_preferences": user.exercise_preferences,
+        "liked_workouts": user.liked_workouts,
+        "disliked_workouts": user.disliked_workouts,
+        "exercise_availability": user.exercise_availability,
+    }
+
+
+async def load_user(user_id) -> User:
+    async with get_async_session() as session:
+        # query the user by ID, the stored plans aren't needed to build prompts
+        statement = select(User).where(_user_filter(user_id)).options(
+            *user_load_options("liked_meals", "disliked_meals", "liked_workouts", "disliked_workouts")
         )
+        return (await session.exec(statement)).first()
+
+
+# feedback category -> User column its keywords are stored in
+KEYWORD_COLUMNS = {
+    "liked_meal": "liked_meals",
+    "disliked_meal": "disliked_meals",
+    "liked_workout": "liked_workouts",
+    "disliked_workout": "disliked_workouts",
+}
+
+# what to pull out of each kind of feedback
+KEYWORD_FOCUS = {
+    "liked_meal": "specific foods they liked and adjectives describing the food (e.g., 'Indian, chicken, rice, easy')",
+    "disliked_meal": "specific foods they disliked and adjectives describing the food (e.g., 'Italian, pasta, difficult')",
+    "liked_workout": "exercises, positive workout attributes and equipment they enjoyed (e.g., 'deadlifts, high intensity, kettlebells')",
+    "disliked_workout": "exercises, negative workout attributes and equipment they did not enjoy (e.g., 'running, high impact, treadmill')",
+}
+
+
+def _parse_json_object(content: str) -> dict:
+    """
+    Parse a JSON object from an LLM reply, ignoring ```json fences or text around it
+    """
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        raise LLMError(f"Expected a JSON object, got: {content[:200]}")
+    try:
+        return json.loads(content[start:end + 1])
+    except ValueError as e:
+        raise LLMError(f"Invalid JSON in reply: {e}") from e
 
-        # print(f'TEST on {user.first_name}: {user.liked_meals}')
-        # print(user_context)
-
-        data = {
-            "model": "deepseek/deepseek-chat:free",
-            "messages": [{
-                "role": "user",
-                "content": (
-                    f"I am [{user_context}]. Help me create a 7-day meal plan with breakfast, lunch, and dinner. "
-                    f"The meals should be balanced, nutritious, and supportive of my goals, with flexibility in portion sizes "
-                    f"to avoid strict calorie restrictions. Prioritize whole foods and avoid unhealthy options like excessive "
-                    f"processed foods or sugary snacks. If muscle gain is a goal, emphasize protein-rich options. "
-                    f"Meal prep should take no more than 30 minutes for each meal. "
-                    f"Return the output in this format: day_breakfast_lunch_dinner. "
-                    f"For example: Monday_eggs with ham_grilled chicken with veggies_steak with rice. "
-                    f"Only return this parsed output, no extra text."
-                    )
-            }]
-        }
 
-        # print(f"DATA TIME!!!!!!!\n {data}")
-
-        # send the POST request to the DeepSeek API
-        try:
-            # print("Sending request to DeepSeek API...")
-            response = requests.post(DEEPSEEK_URL, json=data, headers=headers)
-            # print("Request sent.")
-            response_json = response.json()
-            # print("Response received.")
-            print(json.dumps(response_json, indent=4))
-            assistant_content = response_json['choices'][0]['message']['content']
-        except requests.exceptions.RequestException as e:
-            print(f"Error: {e}")
-            return None
-
-        return assistant_content
-
-
-def create_exercise_routine(user_id):
-    user_context = ''
-    engine = get_engine()
-    with Session(engine) as session:
-        statement = select(User).where(User.id == user_id)
-        user = session.exec(statement).first()
-
-        # print(f'---------- {user.username} ---------')
-        user_context = (
-            f"{user.age}-year-old {user.gender if user.gender else 'person'} "
-            f"weighing {user.weight_kg} kg and {user.height_cm} cm tall, "
-            f"with {user.activity_level if user.activity_level else 'unspecified'} activity level, "
-            f"aiming for {', '.join(goal for goal in user.fitness_goals)}, "
-            f"preferring {', '.join(str(pref) for pref in user.exercise_preferences)} exercises, "
-            f"liking exercises such as {', '.join(like for like in user.liked_workouts)}, "
-            f"disliking exercises such as {', '.join(dislike for dislike in user.disliked_workouts)}, "
-            f"and available to exercise {', '.join(str(day) for day in user.exercise_availability)}, "
+async def extract_keywords_batch(texts: dict[str, Optional[str]]) -> dict[str, list[str]]:
+    """
+    Extract keywords for several feedback categories ({"liked_meal": text, ...})
+    with a single LLM request. Texts the local extractor handles and cached texts are not sent.
+    """
+    keywords = {}
+    missing = {}
+    for category, text in texts.items():
+        if not text or not text.strip():
+            keywords[category] = []
+            continue
+        local = local_keywords(category, text)
+        if local is not None:
+            keywords[category] = local
+            continue
+        cached = await keyword_cache.get(keyword_cache_key(category, text)) if keyword_cache else None
+        if cached is not None:
+            keywords[category] = cached
+        else:
+            missing[category] = text
+
+    if missing:
+        prompt = (
+            "Extract the key words or phrases from each piece of workout / meal feedback below.\n"
+            + "".join(f"- {category}: focus on {KEYWORD_FOCUS[category]}. Text: '{text}'\n" for category, text in missing.items())
+            + "Return ONLY a JSON object with exactly these keys: "
+            + ", ".join(f'"{category}"' for category in missing)
+            + ". Each value is a list of short keyword strings. No extra text."
         )
+        content = await route_content("keywords", [{"role": "user", "content": prompt}], response_format={"type": "json_object"})
+        extracted = _parse_json_object(content)
+
+        for category, text in missing.items():
+            values = extracted.get(category) or []
+            if isinstance(values, str):
+                values = values.split(",")
+            keywords[category] = [str(k).strip() for k in values if str(k).strip()]
+            if keyword_cache:
+                await keyword_cache.set(keyword_cache_key(category, text), keywords[category])
+
+    return keywords
+
+
+async def create_meal_plan(user_id):
+    user = await load_user(user_id)
+    return await request_meal_plan(meal_plan_inputs(user))
+
+
+async def create_exercise_routine(user_id):
+    user = await load_user(user_id)
+    return await request_exercise_routine(workout_plan_inputs(user))
+
+
+def meal_plan_context(user: dict) -> str:
+    return (
+        f"{user['age']}-year-old {user['gender'] if user['gender'] else 'person'} "
+        f"weighing {user['weight_kg']} kg and {user['height_cm']} cm tall, "
+        f"with {user['activity_level'] if user['activity_level'] else 'unspecified'} activity level, "
+        f"aiming for {', '.join(goal for goal in user['fitness_goals'])}, "
+        f"following a {', '.join(user['diet_preference']) if user['diet_preference'] else 'flexible'} diet, "
+        f"liking foods such as {user['liked_meals'] if user['liked_meals'] else 'unspecified'}, "
+        f"disliking foods such as {user['disliked_meals'] if user['disliked_meals'] else 'unspecified'}, "
+        f"alergic to (DO NOT INCLUDE THESE FOODS) {', '.join(user['allergies']) if user['allergies'] else 'no specific allergies'}, "
+    )
+
+
+MEAL_PLAN_TEXT_FORMAT = (
+    "Return the output in this format: day_breakfast_lunch_dinner. "
+    "For example: Monday_eggs with ham_grilled chicken with veggies_steak with rice. "
+    "Only return this parsed output, no extra text."
+)
+MEAL_PLAN_JSON_FORMAT = (
+    "Return the output as a JSON object with one key for every day from Monday to Sunday, "
+    "each mapping to an object with \"breakfast\", \"lunch\" and \"dinner\" strings. "
+    "For example: {\"Monday\": {\"breakfast\": \"eggs with ham\", \"lunch\": \"grilled chicken with veggies\", "
+    "\"dinner\": \"steak with rice\"}, \"Tuesday\": ...}. "
+    "Only return the JSON object, no extra text."
+)
+
+
+def meal_plan_prompt(user: dict, output_format: str) -> str:
+    return (
+        f"I am [{meal_plan_context(user)}]. Help me create a 7-day meal plan with breakfast, lunch, and dinner. "
+        f"The meals should be balanced, nutritious, and supportive of my goals, with flexibility in portion sizes "
+        f"to avoid strict calorie restrictions. Prioritize whole foods and avoid unhealthy options like excessive "
+        f"processed foods or sugary snacks. If muscle gain is a goal, emphasize protein-rich options. "
+        f"Meal prep should take no more than 30 minutes for each meal. "
+        f"{output_format}"
+    )
+
+
+async def request_meal_plan(user: dict):
+    """
+    Ask the LLM for a meal plan built from meal_plan_inputs(), in the text format
+    """
+    messages = [{"role": "user", "content": meal_plan_prompt(user, MEAL_PLAN_TEXT_FORMAT)}]
 
-        # print(f'TEST extracted liked workouts of {user.first_name}: {user.liked_workouts}')
-        # print(user_context)
-
-        data = {
-            "model": "deepseek/deepseek-chat:free",
-            "messages": [{
-                "role": "user",
-                "content": (
-                    f"I am [{user_context}]. Help me create a exercise routine plan. "
-                    f"Only include workouts for days that I am available to exercise. "
-                    f"The exercises should be not super extreme and supportive of my goals. "
-                    f"The workout plan per day should last no more than one hour. "
-                    f"Return the output in this format: _day_NumberOfSets_NumberOfReps_workoutName... "
-                    f"For example: _Monday_3_12_bicep curl_3_10_triceps extension_4_15_wrist curl_Wednesday..."
-                    f"Notice that first we have a _, then the day (string), then a _ the Number of Sets, then a _ the Number of Reps, "
-                    f"and a _ and the exercise name, also notice that one day can have many exercises, "
-                    f"only return this parsed output, no extra text."
-                )
-            }]
-        }
-        
-        # print(f"DATA TIME!!!!!!!\n {data}")
-        
-        # send the POST request to the DeepSeek API
-        try:
-            # print("Sending request to DeepSeek API...")
-            response = requests.post(DEEPSEEK_URL, json=data, headers=headers)
-            # print("Request sent.")
-            response_json = response.json()
-            # print("Response received.")
-            print(json.dumps(response_json, indent=4))
-            assistant_content = response_json['choices'][0]['message']['content']
-        except requests.exceptions.RequestException as e:
-            print(f"Error: {e}")
-            return None        
-
-        return assistant_content
+    # send the request to the provider(s) routed for plans
+    try:
+        assistant_content = await route_content("plans", messages)
+        print(assistant_content)
+    except LLMError as e:
+        print(f"Error: {e}")
+        return None
+
+    return assistant_content
+
+
+async def request_meal_plan_dict(user: dict) -> dict:
+    """
+    Ask the LLM for a meal plan and return it parsed. PLAN_FORMAT=json (default) streams
+    schema-checked JSON, PLAN_FORMAT=text uses the underscore format and its parser.
+    Raises LLMError (MalformedPlan if the JSON never validated).
+    """
+    if PLAN_FORMAT == "json":
+        return await request_structured_plan("meal", meal_plan_prompt(user, MEAL_PLAN_JSON_FORMAT))
+    meal_plan_text = await request_meal_plan(user)
+    if meal_plan_text is None:
+        raise LLMError("Meal plan request failed")
+    return parse_meal_plan_to_dict(meal_plan_text)
+
+
+def exercise_routine_context(user: dict) -> str:
+    return (
+        f"{user['age']}-year-old {user['gender'] if user['gender'] else 'person'} "
+        f"weighing {user['weight_kg']} kg and {user['height_cm']} cm tall, "
+        f"with {user['activity_level'] if user['activity_level'] else 'unspecified'} activity level, "
+        f"aiming for {', '.join(goal for goal in user['fitness_goals'])}, "
+        f"preferring {', '.join(str(pref) for pref in user['exercise_preferences'])} exercises, "
+        f"liking exercises such as {', '.join(like for like in user['liked_workouts'])}, "
+        f"disliking exercises such as {', '.join(dislike for dislike in user['disliked_workouts'])}, "
+        f"and available to exercise {', '.join(str(day) for day in user['exercise_availability'])}, "
+    )
+
+
+EXERCISE_ROUTINE_TEXT_FORMAT = (
+    "Return the output in this format: _day_NumberOfSets_NumberOfReps_workoutName... "
+    "For example: _Monday_3_12_bicep curl_3_10_triceps extension_4_15_wrist curl_Wednesday..."
+    "Notice that first we have a _, then the day (string), then a _ the Number of Sets, then a _ the Number of Reps, "
+    "and a _ and the exercise name, also notice that one day can have many exercises, "
+    "only return this parsed output, no extra text."
+)
+EXERCISE_ROUTINE_JSON_FORMAT = (
+    "Return the output as a JSON object with one key for each day I exercise (Monday to Sunday), "
+    "each mapping to a list of exercises written as {\"sets\": number, \"reps\": number, \"exercise\": name}. "
+    "For example: {\"Monday\": [{\"sets\": 3, \"reps\": 12, \"exercise\": \"bicep curl\"}, "
+    "{\"sets\": 3, \"reps\": 10, \"exercise\": \"triceps extension\"}], \"Wednesday\": ...}. "
+    "Only return the JSON object, no extra text."
+)
+
+
+def exercise_routine_prompt(user: dict, output_format: str) -> str:
+    return (
+        f"I am [{exercise_routine_context(user)}]. Help me create a exercise routine plan. "
+        f"Only include workouts for days that I am available to exercise. "
+        f"The exercises should be not super extreme and supportive of my goals. "
+        f"The workout plan per day should last no more than one hour. "
+        f"{output_format}"
+    )
+
+
+async def request_exercise_routine(user: dict):
+    """
+    Ask the LLM for an exercise routine built from workout_plan_inputs(), in the text format
+    """
+    messages = [{"role": "user", "content": exercise_routine_prompt(user, EXERCISE_ROUTINE_TEXT_FORMAT)}]
+
+    # send the request to the provider(s) routed for plans
+    try:
+        assistant_content = await route_content("plans", messages)
+        print(assistant_content)
+    except LLMError as e:
+        print(f"Error: {e}")
+        return None
+
+    return assistant_content
+
+
+async def request_exercise_routine_dict(user: dict) -> dict:
+    """
+    Ask the LLM for an exercise routine and return it parsed (see request_meal_plan_dict)
+    """
+    if PLAN_FORMAT == "json":
+        return await request_structured_plan("workout", exercise_routine_prompt(user, EXERCISE_ROUTINE_JSON_FORMAT))
+    exercise_routine_text = await request_exercise_routine(user)
+    if exercise_routine_text is None:
+        raise LLMError("Exercise routine request failed")
+    return parse_exercise_routine_to_dict(exercise_routine_text)
 
 
 def parse_meal_plan_to_dict(meal_plan_text):
@@ -389,7 +468,7 @@ def parse_meal_plan_to_dict(meal_plan_text):
         parts = line.split('_')
         if len(parts) != 4:
             continue
-        day, breakfast, lunch, dinner = parts
+        day, breakfast, lunch, dinner = (part.strip() for part in parts)
         meal_plan_dict[day] = {
             "breakfast": breakfast,
             "lunch": lunch,
@@ -412,15 +491,16 @@ def parse_exercise_routine_to_dict(exercise_routine_text):
     i = 0
 
     while i < len(parts):
-        if parts[i] in days:
-            current_day = parts[i]
+        part = parts[i].strip()
+        if part in days:
+            current_day = part
             result[current_day] = []
             i += 1
         elif current_day:
             try:
                 sets = int(parts[i])
                 reps = int(parts[i+1])
-                exercise = parts[i+2]
+                exercise = parts[i+2].strip()
                 result[current_day].append({
                     "sets": sets,
                     "reps": reps,
@@ -446,29 +526,29 @@ def save_to_json(data_dict, filename):
         return f"Error saving to JSON: {str(e)}"
 
 
-if __name__ == "__main__":
+async def main():
     # Get the username
     User_Name = 'john_doe'
 
     ############ preferences keyword extraction testing #############
 
     liked_food_review = 'I really liked that you included Indian cuisine and that the recipes were very easy to make'
-    extract_keywords_liked_meal(liked_food_review, User_Name)
+    await extract_keywords_liked_meal(liked_food_review, User_Name)
     
     disliked_food_review = 'I disliked that you included Italian cuisine and that the recipes were very difficult to make'
-    extract_keywords_disliked_meal(disliked_food_review, User_Name)
+    await extract_keywords_disliked_meal(disliked_food_review, User_Name)
     
     liked_exercise_review = 'I really liked that you included arm workouts with dumbells'
-    extract_keywords_liked_workout(liked_exercise_review, User_Name)
+    await extract_keywords_liked_workout(liked_exercise_review, User_Name)
     
     disliked_exercise_review = "I disliked the cardio portion of the workout. I really don't like running because of the stress on my joints"
-    extract_keywords_disliked_workout(disliked_exercise_review, User_Name)
+    await extract_keywords_disliked_workout(disliked_exercise_review, User_Name)
     
     
     ############# CREATE PLANS #############
     # Meal Plan
     #print("Meal Plan:")
-    meal_plan_text = create_meal_plan(User_Name)
+    meal_plan_text = await create_meal_plan(User_Name)
     #print(meal_plan_text)
     meal_plan_dict = parse_meal_plan_to_dict(meal_plan_text)
     print("\nParsed Meal Plan:")
@@ -478,10 +558,14 @@ if __name__ == "__main__":
 
     # Exercise Routine
     #print("\nExercise Routine:")
-    exercise_routine_text = create_exercise_routine(User_Name)
+    exercise_routine_text = await create_exercise_routine(User_Name)
     # print(exercise_routine_text)
     exercise_routine_dict = parse_exercise_routine_to_dict(exercise_routine_text)
     print("\nParsed Exercise Routine:")
     print(json.dumps(exercise_routine_dict, indent=4))
     exercise_result = save_to_json(exercise_routine_dict, "exercise_routine.json")
     #print(exercise_result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,207 @@
+"""
+Password Hashing: configurable schemes / cost, rehash on login, and a
+bounded thread / process pool that keeps hashing off the event loop
+
+Calibrate the cost for this machine with:
+    python -m api.passwords --calibrate --target-ms 250
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from . import metrics
+
+
+load_dotenv()
+
+# "thread" (bcrypt releases the GIL) or "process"; pool size and how many
+# hash / verify calls may be running or waiting before new ones get a 503
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+SUPPORTED_SCHEMES = ("bcrypt", "argon2")
+
+# the first scheme hashes new passwords, the rest are only accepted for verify
+# and upgraded on the next login; same for hashes with a lower cost than below
+PASSWORD_SCHEMES = [scheme.strip() for scheme in os.getenv("PASSWORD_SCHEMES", "bcrypt").split(",") if scheme.strip()]
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv("PASSWORD_ARGON2_TIME_COST", "3"))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", "65536"))  # KiB
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv("PASSWORD_ARGON2_PARALLELISM", "4"))
+
+
+def make_context(schemes=None, bcrypt_rounds: int = PASSWORD_BCRYPT_ROUNDS,
+                 argon2_time_cost: int = PASSWORD_ARGON2_TIME_COST,
+                 argon2_memory_cost: int = PASSWORD_ARGON2_MEMORY_COST,
+                 argon2_parallelism: int = PASSWORD_ARGON2_PARALLELISM) -> CryptContext:
+    """
+    Build a CryptContext for the given schemes and cost parameters
+    """
+    schemes = list(schemes or PASSWORD_SCHEMES)
+    # stored hashes stay verifiable whichever scheme is the default
+    schemes += [scheme for scheme in SUPPORTED_SCHEMES if scheme not in schemes]
+    options = dict(bcrypt__rounds=bcrypt_rounds, bcrypt__min_rounds=bcrypt_rounds)
+    # passlib calls argon2's time cost "rounds"; changed memory cost also triggers a rehash
+    options.update(
+        argon2__rounds=argon2_time_cost,
+        argon2__min_rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+    return CryptContext(schemes=schemes, default=schemes[0], deprecated="auto", **options)
+
+
+# hashes and verifies passwords
+password_context = make_context()
+
+
+class HashingOverloaded(Exception):
+    """
+    Raised when too many hash / verify calls are already queued
+    """
+
+
+# module-level so they can be sent to a process pool
+def _hash(password: str) -> str:
+    return password_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return password_context.verify(password, hashed)
+
+
+def _verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    return password_context.verify_and_update(password, hashed)
+
+
+class HashingPool:
+    """
+    Runs hashing calls on a dedicated pool and sheds load past max_pending
+    """
+    def __init__(self, kind: str = PASSWORD_HASH_POOL, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.latency = {"hash": metrics.LatencyStats(), "verify": metrics.LatencyStats()}
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        # created on first use so importing this module doesn't start workers
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, name: str, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingOverloaded("Too many password hashing requests")
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.latency[name].record(time.perf_counter() - start)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "pool": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            **{f"{name}_latency": latency.to_dict() for name, latency in self.latency.items()},
+        }
+
+
+# process-wide hashing pool
+hashing_pool = HashingPool()
+metrics.register("password_hashing", hashing_pool.stats)
+
+
+async def hash_password(password: str) -> str:
+    return await hashing_pool.run("hash", _hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await hashing_pool.run("verify", _verify, password, hashed)
+
+
+async def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password; the second value is a new hash when the stored one uses
+    a deprecated scheme or outdated cost (None otherwise)
+    """
+    return await hashing_pool.run("verify", _verify_and_update, password, hashed)
+
+
+def time_hash(context: CryptContext, samples: int = 3) -> float:
+    """
+    Median time (milliseconds) to verify a password hashed with this context
+    """
+    hashed = context.hash("calibration-password")
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.verify("calibration-password", hashed)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate(scheme: str, target_ms: float) -> dict:
+    """
+    Find the lowest cost whose verify time reaches target_ms on this machine.
+    bcrypt tunes rounds, argon2 tunes time_cost at the configured memory cost.
+    """
+    if scheme == "bcrypt":
+        rounds = 4
+        while True:
+            elapsed = time_hash(make_context(["bcrypt"], bcrypt_rounds=rounds))
+            if elapsed >= target_ms or rounds >= 31:
+                return {"PASSWORD_BCRYPT_ROUNDS": rounds, "verify_ms": round(elapsed, 1)}
+            rounds += 1
+    if scheme == "argon2":
+        time_cost = 1
+        while True:
+            elapsed = time_hash(make_context(["argon2"], argon2_time_cost=time_cost))
+            if elapsed >= target_ms or time_cost >= 50:
+                return {
+                    "PASSWORD_ARGON2_TIME_COST": time_cost,
+                    "PASSWORD_ARGON2_MEMORY_COST": PASSWORD_ARGON2_MEMORY_COST,
+                    "verify_ms": round(elapsed, 1),
+                }
+            time_cost += 1
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password hashing cost calibration")
+    parser.add_argument("--calibrate", action="store_true", help="pick the cost for a target verify time")
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--scheme", choices=SUPPORTED_SCHEMES, default=PASSWORD_SCHEMES[0])
+    args = parser.parse_args()
+
+    if args.calibrate:
+        result = calibrate(args.scheme, args.target_ms)
+        print(f"# {args.scheme}: {result.pop('verify_ms')} ms per verify (target {args.target_ms} ms)")
+        for name, value in result.items():
+            print(f"{name}={value}")
+    else:
+        current = password_context.handler()
+        print(f"{current.name}: {time_hash(password_context):.1f} ms per verify")
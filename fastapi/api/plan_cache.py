@@ -0,0 +1,74 @@
+"""
+Cache Of Generated Plans Keyed On The Normalized Prompt Inputs
+"""
+import hashlib
+import json
+import os
+from enum import Enum
+from dotenv import load_dotenv
+from .cache import Cache, make_backend
+from . import metrics
+
+
+load_dotenv()
+
+# backend: "memory", "sql" (app database table), "sqlite" (PLAN_CACHE_URL file) or "none"
+PLAN_CACHE_BACKEND = os.getenv("PLAN_CACHE_BACKEND", "memory")
+PLAN_CACHE_URL = os.getenv("PLAN_CACHE_URL")
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1000"))
+
+# optional bucketing so near-identical profiles share a plan (0 disables)
+PLAN_CACHE_AGE_BUCKET = float(os.getenv("PLAN_CACHE_AGE_BUCKET", "0"))  # years
+PLAN_CACHE_WEIGHT_BUCKET = float(os.getenv("PLAN_CACHE_WEIGHT_BUCKET", "0"))  # kg
+PLAN_CACHE_HEIGHT_BUCKET = float(os.getenv("PLAN_CACHE_HEIGHT_BUCKET", "0"))  # cm
+
+BUCKETS = {
+    "age": PLAN_CACHE_AGE_BUCKET,
+    "weight_kg": PLAN_CACHE_WEIGHT_BUCKET,
+    "height_cm": PLAN_CACHE_HEIGHT_BUCKET,
+}
+
+
+def _normalize(value):
+    """
+    Canonical form of one prompt input: enums by value, strings trimmed and
+    lower-cased, lists de-duplicated and sorted (their order doesn't change the plan)
+    """
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (list, tuple, set)):
+        return sorted({_normalize(item) for item in value if item not in (None, "")}, key=str)
+    return value
+
+
+def _bucket(value, size: float):
+    if value is None or not size:
+        return value
+    return int(float(value) // size)
+
+
+def plan_cache_key(kind: str, inputs: dict) -> str:
+    """
+    sha256 of the plan kind and the canonical json of its prompt inputs
+    """
+    canonical = {}
+    for name, value in inputs.items():
+        if name in BUCKETS:
+            value = _bucket(value, BUCKETS[name])
+        canonical[name] = _normalize(value)
+    payload = json.dumps({"kind": kind, "inputs": canonical}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# None when caching is turned off
+plan_cache = None
+if PLAN_CACHE_BACKEND != "none":
+    plan_cache = Cache(
+        "plans",
+        make_backend(PLAN_CACHE_BACKEND, PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_URL),
+        ttl=PLAN_CACHE_TTL,
+    )
+    metrics.register("plan_cache", plan_cache.stats.to_dict)
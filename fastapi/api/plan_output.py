@@ -0,0 +1,367 @@
+"""
+Schema-Constrained JSON Plan Output: validated while it streams, repaired on failure
+"""
+import json
+import os
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from .database import DayOfWeek
+from .llm import LLMError
+from .providers import route_stream
+from . import metrics
+
+
+load_dotenv()
+
+# how many times a malformed plan is sent back to the LLM with a repair prompt
+PLAN_MAX_REPAIRS = int(os.getenv("PLAN_MAX_REPAIRS", "2"))
+# "json_schema" (constrained decoding where the provider supports it) or "json_object"
+PLAN_RESPONSE_FORMAT = os.getenv("PLAN_RESPONSE_FORMAT", "json_schema")
+# text allowed before the opening brace: a ```json fence and whitespace
+PLAN_MAX_PREAMBLE = 20
+_PREAMBLE_CHARS = set("`json \t\r\n")
+
+DAYS = [day.value for day in DayOfWeek]
+
+MEAL = {"type": "string", "minLength": 1}
+MEAL_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        day: {
+            "type": "object",
+            "properties": {"breakfast": MEAL, "lunch": MEAL, "dinner": MEAL},
+            "required": ["breakfast", "lunch", "dinner"],
+            "additionalProperties": False,
+        }
+        for day in DAYS
+    },
+    "required": DAYS,
+    "additionalProperties": False,
+}
+
+EXERCISE = {
+    "type": "object",
+    "properties": {
+        "sets": {"type": "integer", "minimum": 1},
+        "reps": {"type": "integer", "minimum": 1},
+        "exercise": {"type": "string", "minLength": 1},
+    },
+    "required": ["sets", "reps", "exercise"],
+    "additionalProperties": False,
+}
+WORKOUT_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {day: {"type": "array", "items": EXERCISE, "minItems": 1} for day in DAYS},
+    "minProperties": 1,
+    "additionalProperties": False,
+}
+
+PLAN_SCHEMAS = {"meal": MEAL_PLAN_SCHEMA, "workout": WORKOUT_PLAN_SCHEMA}
+
+_TYPES = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+_SCALAR_CHARS = set("-+.eE0123456789truefalsn")
+
+
+class MalformedPlan(LLMError):
+    """
+    Raised as soon as a streamed plan can no longer match its schema
+    """
+
+
+class _Frame:
+    def __init__(self, kind: str, schema: dict, path: str):
+        self.kind = kind  # "object" or "array"
+        self.schema = schema
+        self.path = path
+        self.state = "key_or_end" if kind == "object" else "value_or_end"
+        self.keys: set = set()
+        self.key: Optional[str] = None
+        self.items = 0
+
+    def child(self):
+        """
+        (schema, path) of the value being read in this container
+        """
+        if self.kind == "array":
+            return self.schema.get("items", {}), f"{self.path}[{self.items}]"
+        extra = self.schema.get("additionalProperties", {})
+        schema = self.schema.get("properties", {}).get(self.key, extra if isinstance(extra, dict) else {})
+        return schema, f"{self.path}.{self.key}"
+
+
+class PlanValidator:
+    """
+    Incremental JSON parser that checks the document against a (subset of) JSON Schema
+    while it arrives: feed() raises MalformedPlan at the first character that can't fit,
+    so a bad response can be abandoned mid-stream. Supports type, properties, required,
+    additionalProperties, items, minItems, minProperties, minLength and minimum.
+    """
+    def __init__(self, schema: dict, max_preamble: int = PLAN_MAX_PREAMBLE):
+        self.schema = schema
+        self.max_preamble = max_preamble
+        self.preamble = 0
+        self.done = False
+        self.stack: List[_Frame] = []
+        self.chars: List[str] = []  # the JSON document so far
+        self.string: Optional[List[str]] = None  # characters of the string being read
+        self.string_is_key = False
+        self.escape = False
+        self.scalar: Optional[List[str]] = None  # characters of the number / literal being read
+        self.scalar_schema: dict = {}
+        self.scalar_path = ""
+
+    def feed(self, chunk: str):
+        for char in chunk:
+            if self.done:
+                return
+            self._char(char)
+
+    def finish(self) -> Any:
+        """
+        The parsed document, once it is complete
+        """
+        if self.scalar is not None:
+            self._end_scalar()
+        if not self.done:
+            raise MalformedPlan("Response ended before the JSON object was complete")
+        return json.loads("".join(self.chars))
+
+    def _fail(self, path: str, message: str):
+        raise MalformedPlan(f"{path or '$'}: {message}")
+
+    def _char(self, char: str):
+        if not self.stack:
+            # skip a ```json fence until the opening brace, anything else isn't a JSON reply
+            if char == "{":
+                self.chars.append(char)
+                self._open("object", self.schema, "$")
+            else:
+                self.preamble += 1
+                if char not in _PREAMBLE_CHARS or self.preamble > self.max_preamble:
+                    self._fail("$", "response is not a JSON object")
+            return
+
+        self.chars.append(char)
+        if self.string is not None:
+            self._string_char(char)
+            return
+        if self.scalar is not None:
+            if char in _SCALAR_CHARS:
+                self.scalar.append(char)
+                return
+            self._end_scalar()
+        if char in " \t\r\n":
+            return
+
+        frame = self.stack[-1]
+        if frame.kind == "object":
+            if frame.state in ("key_or_end", "key") and char == '"':
+                self.string, self.string_is_key = [], True
+            elif frame.state in ("key_or_end", "comma_or_end") and char == "}":
+                self._close()
+            elif frame.state == "colon" and char == ":":
+                frame.state = "value"
+            elif frame.state == "comma_or_end" and char == ",":
+                frame.state = "key"
+            elif frame.state == "value":
+                self._start_value(char, *frame.child())
+            else:
+                self._fail(frame.path, f"unexpected {char!r}")
+        else:
+            if frame.state in ("value_or_end", "comma_or_end") and char == "]":
+                self._close()
+            elif frame.state == "comma_or_end" and char == ",":
+                frame.state = "value"
+            elif frame.state in ("value_or_end", "value"):
+                self._start_value(char, *frame.child())
+            else:
+                self._fail(frame.path, f"unexpected {char!r}")
+
+    def _start_value(self, char: str, schema: dict, path: str):
+        expected = schema.get("type")
+        if char == "{":
+            if expected not in (None, "object"):
+                self._fail(path, f"expected {expected}, got an object")
+            self._open("object", schema, path)
+        elif char == "[":
+            if expected not in (None, "array"):
+                self._fail(path, f"expected {expected}, got an array")
+            self._open("array", schema, path)
+        elif char == '"':
+            if expected not in (None, "string"):
+                self._fail(path, f"expected {expected}, got a string")
+            self.string, self.string_is_key = [], False
+            self.scalar_schema, self.scalar_path = schema, path
+        elif char in _SCALAR_CHARS:
+            self.scalar = [char]
+            self.scalar_schema, self.scalar_path = schema, path
+        else:
+            self._fail(path, f"unexpected {char!r}")
+
+    def _string_char(self, char: str):
+        if self.escape:
+            self.escape = False
+        elif char == "\\":
+            self.escape = True
+        elif char == '"':
+            raw, self.string = "".join(self.string), None
+            try:
+                value = json.loads(f'"{raw}"')
+            except ValueError:
+                self._fail(self.stack[-1].path, "invalid string")
+            if self.string_is_key:
+                self._key(value)
+            else:
+                self._check_scalar(value, self.scalar_schema, self.scalar_path)
+                self._value_done()
+            return
+        self.string.append(char)
+
+    def _end_scalar(self):
+        raw, self.scalar = "".join(self.scalar), None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            self._fail(self.scalar_path, f"invalid value {raw!r}")
+        self._check_scalar(value, self.scalar_schema, self.scalar_path)
+        self._value_done()
+
+    def _key(self, key: str):
+        frame = self.stack[-1]
+        if key in frame.keys:
+            self._fail(frame.path, f"duplicate key {key!r}")
+        if frame.schema.get("additionalProperties") is False and key not in frame.schema.get("properties", {}):
+            self._fail(frame.path, f"unexpected key {key!r}")
+        frame.keys.add(key)
+        frame.key = key
+        frame.state = "colon"
+
+    def _check_scalar(self, value: Any, schema: dict, path: str):
+        expected = schema.get("type")
+        if expected and not _TYPES.get(expected, lambda _: True)(value):
+            self._fail(path, f"expected {expected}, got {json.dumps(value)}")
+        if isinstance(value, str) and len(value.strip()) < schema.get("minLength", 0):
+            self._fail(path, "empty string")
+        if isinstance(value, (int, float)) and "minimum" in schema and value < schema["minimum"]:
+            self._fail(path, f"{value} is below {schema['minimum']}")
+
+    def _open(self, kind: str, schema: dict, path: str):
+        self.stack.append(_Frame(kind, schema, path))
+
+    def _close(self):
+        frame = self.stack.pop()
+        if frame.kind == "object":
+            missing = [key for key in frame.schema.get("required", []) if key not in frame.keys]
+            if missing:
+                self._fail(frame.path, f"missing {', '.join(missing)}")
+            if len(frame.keys) < frame.schema.get("minProperties", 0):
+                self._fail(frame.path, "is empty")
+        elif frame.items < frame.schema.get("minItems", 0):
+            self._fail(frame.path, "is empty")
+        self._value_done()
+
+    def _value_done(self):
+        if not self.stack:
+            self.done = True
+            return
+        frame = self.stack[-1]
+        frame.state = "comma_or_end"
+        if frame.kind == "array":
+            frame.items += 1
+
+
+def strip_strings(value: Any) -> Any:
+    """
+    Trim whitespace from every string in a parsed plan
+    """
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {key.strip(): strip_strings(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [strip_strings(item) for item in value]
+    return value
+
+
+def response_format(kind: str) -> dict:
+    if PLAN_RESPONSE_FORMAT == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": f"{kind}_plan", "schema": PLAN_SCHEMAS[kind]},
+        }
+    return {"type": "json_object"}
+
+
+class PlanOutputStats:
+    """
+    Per plan kind: requests, malformed responses, repair retries and plans that never validated
+    """
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def add(self, kind: str, name: str):
+        counts = self.counts.setdefault(kind, {"requests": 0, "malformed": 0, "retries": 0, "failed": 0})
+        counts[name] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            kind: {
+                **counts,
+                "malformed_rate": round(counts["malformed"] / counts["requests"], 4) if counts["requests"] else 0.0,
+                "retry_rate": round(counts["retries"] / counts["requests"], 4) if counts["requests"] else 0.0,
+            }
+            for kind, counts in self.counts.items()
+        }
+
+
+plan_output_stats = PlanOutputStats()
+metrics.register("plan_output", plan_output_stats.to_dict)
+
+
+def repair_prompt(error: MalformedPlan) -> str:
+    return (
+        f"That response was not valid: {error}. "
+        f"Reply again with the complete plan as a single JSON object in the requested format, with no extra text."
+    )
+
+
+async def request_structured_plan(kind: str, prompt: str) -> dict:
+    """
+    Stream a plan from the LLM as JSON, validating it as it arrives. A malformed response is
+    abandoned at the first error and sent back with a repair prompt (up to PLAN_MAX_REPAIRS times).
+    Raises MalformedPlan if no attempt validates, LLMError if the API call fails.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    plan_output_stats.add(kind, "requests")
+
+    for attempt in range(PLAN_MAX_REPAIRS + 1):
+        validator = PlanValidator(PLAN_SCHEMAS[kind])
+        received: List[str] = []
+        try:
+            # aclosing: leaving the loop early closes the stream, so the rest isn't generated
+            async with aclosing(route_stream("plans", messages, response_format=response_format(kind))) as stream:
+                async for delta in stream:
+                    received.append(delta)
+                    validator.feed(delta)
+                    # the object is complete, don't wait for (or pay for) whatever follows it
+                    if validator.done:
+                        break
+            return strip_strings(validator.finish())
+        except MalformedPlan as e:
+            plan_output_stats.add(kind, "malformed")
+            print(f"MALFORMED {kind.upper()} PLAN (attempt {attempt + 1}): {e}")
+            if attempt == PLAN_MAX_REPAIRS:
+                plan_output_stats.add(kind, "failed")
+                raise
+            plan_output_stats.add(kind, "retries")
+            messages = messages + [
+                {"role": "assistant", "content": "".join(received)},
+                {"role": "user", "content": repair_prompt(e)},
+            ]
@@ -0,0 +1,155 @@
+"""
+Normalized Plan Storage: plan history and per-meal / per-exercise rows
+"""
+import hashlib
+import json
+from typing import Optional
+from sqlalchemy import delete, update
+from sqlmodel import select
+from .database import MealPlan, MealPlanEntry, PendingPlan, User, WorkoutPlan, WorkoutPlanEntry
+
+
+# User column -> (plan table, entry table)
+PLAN_TABLES = {
+    "meal_plan": (MealPlan, MealPlanEntry),
+    "workout_plan": (WorkoutPlan, WorkoutPlanEntry),
+}
+
+
+def meal_plan_entries(plan: dict) -> list[dict]:
+    """
+    {"Monday": {"breakfast": "...", ...}, ...} -> one row per meal
+    """
+    return [
+        {"day": day, "position": position, "meal": meal, "dish": str(dish).strip()}
+        for day, meals in plan.items()
+        for position, (meal, dish) in enumerate(meals.items())
+    ]
+
+
+def workout_plan_entries(plan: dict) -> list[dict]:
+    """
+    {"Monday": [{"sets": 3, "reps": 12, "exercise": "..."}, ...], ...} -> one row per exercise
+    """
+    return [
+        {
+            "day": day,
+            "position": position,
+            "exercise": str(item.get("exercise", "")).strip(),
+            "sets": item.get("sets"),
+            "reps": item.get("reps"),
+        }
+        for day, exercises in plan.items()
+        for position, item in enumerate(exercises)
+    ]
+
+
+def meal_plan_dict(entries: list[MealPlanEntry]) -> dict:
+    plan = {}
+    for entry in entries:
+        plan.setdefault(entry.day, {})[entry.meal] = entry.dish
+    return plan
+
+
+def workout_plan_dict(entries: list[WorkoutPlanEntry]) -> dict:
+    plan = {}
+    for entry in entries:
+        plan.setdefault(entry.day, []).append({"sets": entry.sets, "reps": entry.reps, "exercise": entry.exercise})
+    return plan
+
+
+def plan_hash(plan: dict) -> str:
+    """
+    Content hash of a plan, the same plan always gets the same hash
+    """
+    return hashlib.sha256(json.dumps(plan, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+TO_ENTRIES = {"meal_plan": meal_plan_entries, "workout_plan": workout_plan_entries}
+TO_DICT = {"meal_plan": meal_plan_dict, "workout_plan": workout_plan_dict}
+
+
+async def add_plan_version(session, user_id: int, column: str, plan: dict):
+    """
+    Add a plan as the user's current one and keep the previous ones as history
+    (the caller commits, together with the User snapshot). A pre-generated plan for
+    the same column was meant to replace the old plan, so it is dropped.
+    """
+    plan_table, entry_table = PLAN_TABLES[column]
+    # concurrent saves for the same user wait for each other here instead of both
+    # marking a new current plan (the unique ux_*_user_current index would reject the second)
+    await session.execute(select(User.id).where(User.id == user_id).with_for_update())
+    await session.execute(delete(PendingPlan).where(PendingPlan.user_id == user_id, PendingPlan.column == column))
+    await session.execute(
+        update(plan_table)
+        .where(plan_table.user_id == user_id, plan_table.is_current == True)  # noqa: E712
+        .values(is_current=False)
+    )
+    version = plan_table(user_id=user_id, is_current=True, content_hash=plan_hash(plan))
+    session.add(version)
+    await session.flush()  # assigns version.id
+    session.add_all([entry_table(plan_id=version.id, **entry) for entry in TO_ENTRIES[column](plan)])
+    return version
+
+
+async def add_pending_plan(session, user_id: int, column: str, plan: dict, inputs_key: str):
+    """
+    Store a pre-generated plan for the user, replacing an older one (the caller commits)
+    """
+    await session.execute(delete(PendingPlan).where(PendingPlan.user_id == user_id, PendingPlan.column == column))
+    session.add(PendingPlan(user_id=user_id, column=column, plan=plan, inputs_key=inputs_key))
+
+
+async def pending_plans(session, user_id: int, columns) -> list[PendingPlan]:
+    """
+    The user's pre-generated plans for the given columns
+    """
+    return (await session.exec(
+        select(PendingPlan).where(PendingPlan.user_id == user_id, PendingPlan.column.in_(list(columns)))
+    )).all()
+
+
+async def current_plan_version(session, user_id: int, column: str):
+    """
+    (content_hash, created_at) of the user's current plan, or None; no plan JSON is read
+    """
+    plan_table, _ = PLAN_TABLES[column]
+    return (await session.exec(
+        select(plan_table.content_hash, plan_table.created_at)
+        .where(plan_table.user_id == user_id, plan_table.is_current == True)  # noqa: E712
+        .order_by(plan_table.id.desc())
+        .limit(1)
+    )).first()
+
+
+async def plan_history(session, user_id: int, column: str, limit: int = 10, before: Optional[int] = None) -> list[dict]:
+    """
+    The user's plans, newest first: [{"id", "created_at", "is_current", column: plan}, ...]
+    """
+    plan_table, entry_table = PLAN_TABLES[column]
+    statement = select(plan_table).where(plan_table.user_id == user_id)
+    if before is not None:
+        statement = statement.where(plan_table.id < before)
+    versions = (await session.exec(statement.order_by(plan_table.id.desc()).limit(limit))).all()
+    if not versions:
+        return []
+
+    # every version's entries in one query
+    entries = (await session.exec(
+        select(entry_table)
+        .where(entry_table.plan_id.in_([version.id for version in versions]))
+        .order_by(entry_table.plan_id, entry_table.id)
+    )).all()
+    by_plan = {}
+    for entry in entries:
+        by_plan.setdefault(entry.plan_id, []).append(entry)
+
+    return [
+        {
+            "id": version.id,
+            "created_at": version.created_at,
+            "is_current": version.is_current,
+            column: TO_DICT[column](by_plan.get(version.id, [])),
+        }
+        for version in versions
+    ]
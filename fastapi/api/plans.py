@@ -0,0 +1,236 @@
+"""
+Meal / Workout Plan Generation (LLM call + parse + store for one user)
+"""
+import asyncio
+import datetime
+import os
+from dotenv import load_dotenv
+from sqlmodel import select
+from .catalog import PLAN_GENERATOR, catalog_plan, CatalogUnsatisfiable
+from .database import User, user_load_options, utcnow
+from .engine import get_async_session
+from .jobs import job_queue
+from .identity import identity_cache
+from .models import (
+    load_user,
+    meal_plan_inputs,
+    workout_plan_inputs,
+    request_meal_plan_dict,
+    request_exercise_routine_dict,
+)
+from .llm import LLMError
+from .plan_cache import plan_cache, plan_cache_key
+from .plan_store import add_plan_version, current_plan_version, pending_plans
+
+
+load_dotenv()
+
+# pre-generated plans (see pregen.py) older than this aren't promoted
+PENDING_PLAN_MAX_DAYS = float(os.getenv("PENDING_PLAN_MAX_DAYS", "7"))
+
+# User column -> (plan cache kind, prompt inputs)
+PLAN_INPUTS = {"meal_plan": ("meal", meal_plan_inputs), "workout_plan": ("workout", workout_plan_inputs)}
+
+
+class PlanGenerationError(Exception):
+    """
+    Raised when the LLM did not return a usable plan
+    """
+
+
+async def _save_plans(user_id: int, plans: dict):
+    """
+    Store generated plans ({column: plan}) in one transaction: a new version in the plan
+    history tables, and a copy on the user's row that the plan GET routes read
+    """
+    async with get_async_session() as session:
+        statement = select(User).where(User.id == user_id).options(*user_load_options(*plans))
+        user = (await session.exec(statement)).first()
+        if not user:
+            raise PlanGenerationError("User not found")
+        for column, plan in plans.items():
+            await add_plan_version(session, user_id, column, plan)
+            setattr(user, column, plan)
+        session.add(user)
+        await session.commit()
+    identity_cache.invalidate(user_id)
+
+
+async def _fresh_seed(user_id: int, kind: str) -> str:
+    """
+    Catalog seed for a fresh plan: the ISO week and the user's current plan, so
+    asking for something new doesn't rebuild the plan being replaced
+    """
+    async with get_async_session() as session:
+        version = await current_plan_version(session, user_id, f"{kind}_plan")
+    year, week, _ = utcnow().isocalendar()
+    return f"{year}-W{week}:{version.content_hash if version else ''}"
+
+
+async def _cached_plan(kind: str, user_id: int, fresh: bool, get_inputs, request_plan) -> dict:
+    """
+    A plan from the catalog when PLAN_GENERATOR allows it (it's cheap, so never cached),
+    otherwise look the plan up by its prompt inputs or ask the LLM and cache the result.
+    fresh=True seeds the catalog and skips the lookup ("give me something new") but
+    still caches the new LLM plan.
+    """
+    user = await load_user(user_id)
+    if not user:
+        raise PlanGenerationError("User not found")
+    inputs = get_inputs(user)
+
+    if PLAN_GENERATOR != "llm":
+        seed = await _fresh_seed(user_id, kind) if fresh else None
+        try:
+            plan = await catalog_plan(kind, inputs, seed)
+        except CatalogUnsatisfiable as e:
+            raise PlanGenerationError(f"{kind.capitalize()} plan could not be built from the catalog: {e}") from e
+        if plan is not None:
+            print(f"{kind.upper()} PLAN BUILT FROM THE CATALOG")
+            return plan
+
+    key = plan_cache_key(kind, inputs) if plan_cache else None
+    if key and not fresh:
+        cached = await plan_cache.get(key)
+        if cached is not None:
+            print(f"{kind.upper()} PLAN CACHE HIT")
+            return cached
+
+    print(f"GENERATING {kind.upper()} PLAN")
+    try:
+        plan = await request_plan(inputs)
+    except LLMError as e:
+        raise PlanGenerationError(f"{kind.capitalize()} plan request to the LLM failed: {e}") from e
+    print(f"{kind.upper()} PLAN GENERATED")
+
+    # don't cache a response the parser couldn't read anything from
+    if key and plan:
+        await plan_cache.set(key, plan)
+    return plan
+
+
+async def build_meal_plan(user_id: int, fresh: bool = False) -> dict:
+    """
+    Get a meal plan for the user from the catalog, the cache or the LLM (nothing is stored on the user)
+    """
+    return await _cached_plan("meal", user_id, fresh, meal_plan_inputs, request_meal_plan_dict)
+
+
+async def build_workout_plan(user_id: int, fresh: bool = False) -> dict:
+    """
+    Get a workout plan for the user from the catalog, the cache or the LLM (nothing is stored on the user)
+    """
+    return await _cached_plan("workout", user_id, fresh, workout_plan_inputs, request_exercise_routine_dict)
+
+
+async def generate_meal_plan(user_id: int, fresh: bool = False) -> dict:
+    """
+    Generate, parse and store a new meal plan for the user
+    """
+    meal_plan_dict = await build_meal_plan(user_id, fresh)
+
+    # update user's meal plan in the database
+    await _save_plans(user_id, {"meal_plan": meal_plan_dict})
+    return {"meal_plan": meal_plan_dict}
+
+
+async def generate_workout_plan(user_id: int, fresh: bool = False) -> dict:
+    """
+    Generate, parse and store a new workout plan for the user
+    """
+    exercise_plan_dict = await build_workout_plan(user_id, fresh)
+
+    # update user's workout plan in the database
+    await _save_plans(user_id, {"workout_plan": exercise_plan_dict})
+    return {"excercise_plan": exercise_plan_dict}
+
+
+class PromotionStats:
+    def __init__(self):
+        self.promoted = 0  # pre-generated plans used instead of generating one
+        self.stale = 0  # ... not used because preferences changed or they were too old
+
+
+promotion_stats = PromotionStats()
+
+
+def pending_plan_key(column: str, user: User) -> str:
+    """
+    Preferences a pre-generated plan was made from (the plan cache key of its prompt inputs)
+    """
+    kind, get_inputs = PLAN_INPUTS[column]
+    return plan_cache_key(kind, get_inputs(user))
+
+
+async def ready_plans(user_id: int, columns) -> dict:
+    """
+    The user's pre-generated plans that can be promoted ({column: plan}): made from
+    the current preferences and less than PENDING_PLAN_MAX_DAYS old
+    """
+    async with get_async_session() as session:
+        pending = await pending_plans(session, user_id, columns)
+    if not pending:
+        return {}
+    user = await load_user(user_id)
+    if not user:
+        return {}
+
+    cutoff = utcnow() - datetime.timedelta(days=PENDING_PLAN_MAX_DAYS)
+    ready = {}
+    for row in pending:
+        # SQLite gives back naive datetimes
+        created_at = row.created_at if row.created_at.tzinfo else row.created_at.replace(tzinfo=datetime.timezone.utc)
+        if created_at >= cutoff and row.inputs_key == pending_plan_key(row.column, user):
+            ready[row.column] = row.plan
+            promotion_stats.promoted += 1
+        else:
+            promotion_stats.stale += 1
+    return ready
+
+
+async def regenerate_plans(user_id: int, meal: bool = True, workout: bool = True, fresh: bool = False,
+                           pregenerated: bool = False) -> dict:
+    """
+    Generate the requested plans concurrently and store the ones that
+    succeeded in a single transaction. pregenerated=True promotes a ready
+    pre-generated plan instead of generating one. Returns each plan's outcome:
+    {"meal_plan": {"status": "done", "plan": {...}}, "workout_plan": {"status": "failed", "error": "..."}}
+    """
+    columns = [column for column, wanted in (("workout_plan", workout), ("meal_plan", meal)) if wanted]
+    ready = await ready_plans(user_id, columns) if pregenerated else {}
+    if ready:
+        print(f"PROMOTING PRE-GENERATED {', '.join(ready).upper()}")
+
+    builders = {}
+    if workout and "workout_plan" not in ready:
+        builders["workout_plan"] = build_workout_plan(user_id, fresh)
+    if meal and "meal_plan" not in ready:
+        builders["meal_plan"] = build_meal_plan(user_id, fresh)
+
+    # one failed generation doesn't cancel (or throw away) the other
+    results = await asyncio.gather(*builders.values(), return_exceptions=True)
+
+    outcomes = {column: {"status": "done", "plan": plan} for column, plan in ready.items()}
+    plans = dict(ready)
+    for column, result in zip(builders, results):
+        if isinstance(result, Exception):
+            print(f"Error generating {column}: {result}")
+            outcomes[column] = {"status": "failed", "error": str(result)}
+        else:
+            plans[column] = result
+            outcomes[column] = {"status": "done", "plan": result}
+
+    if plans:
+        try:
+            await _save_plans(user_id, plans)
+        except Exception as e:
+            for column in plans:
+                outcomes[column] = {"status": "failed", "error": f"Error saving plan: {e}"}
+
+    return outcomes
+
+
+# plan generation runs on the background job queue
+job_queue.register("meal_plan", generate_meal_plan)
+job_queue.register("workout_plan", generate_workout_plan)
+job_queue.register("weekly_plans", regenerate_plans)
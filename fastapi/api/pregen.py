@@ -0,0 +1,273 @@
+"""
+Off-Peak Plan Pre-Generation: next week's plans generated ahead of time, in batches
+"""
+import asyncio
+import datetime
+import os
+import time
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import exists, func
+from sqlmodel import select
+from .database import PendingPlan, utcnow
+from .engine import get_async_session
+from .models import load_user
+from .plan_store import PLAN_TABLES, add_pending_plan
+from .plans import (
+    build_meal_plan,
+    build_workout_plan,
+    pending_plan_key,
+    promotion_stats,
+    PlanGenerationError,
+    PENDING_PLAN_MAX_DAYS,
+)
+from .providers import LLMUsage, llm_usage
+from . import metrics
+
+
+load_dotenv()
+
+# run the pre-generation loop in the app (turn it on in one process only, or use the CLI from cron)
+PREGEN_ENABLED = os.getenv("PREGEN_ENABLED", "false").lower() == "true"
+# off-peak hours (server local time) as "start-end", end excluded; "22-4" wraps past midnight
+PREGEN_HOURS = os.getenv("PREGEN_HOURS", "2-6")
+# seconds between checks for due plans while the loop runs
+PREGEN_CHECK_INTERVAL = float(os.getenv("PREGEN_CHECK_INTERVAL", "600"))
+# a current plan this old is due for a new week
+PREGEN_PLAN_AGE_DAYS = float(os.getenv("PREGEN_PLAN_AGE_DAYS", "6"))
+# plans per batch, generated at most PREGEN_CONCURRENCY at a time, and at most PREGEN_MAX_PER_RUN per run
+PREGEN_BATCH_SIZE = int(os.getenv("PREGEN_BATCH_SIZE", "20"))
+PREGEN_CONCURRENCY = int(os.getenv("PREGEN_CONCURRENCY", "4"))
+PREGEN_MAX_PER_RUN = int(os.getenv("PREGEN_MAX_PER_RUN", "500"))
+
+BUILDERS = {"meal_plan": build_meal_plan, "workout_plan": build_workout_plan}
+
+
+def off_peak(hours: str = PREGEN_HOURS, now: Optional[datetime.datetime] = None) -> bool:
+    """
+    Whether the current hour is inside the off-peak window
+    """
+    start, end = (int(hour) for hour in hours.split("-"))
+    hour = (now or datetime.datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _due_statement(column: str):
+    """
+    Users whose current plan is older than PREGEN_PLAN_AGE_DAYS and who don't have
+    a pre-generated plan for the column yet: (user_id, current plan created_at)
+    """
+    plan_table, _ = PLAN_TABLES[column]
+    now = utcnow()
+    has_pending = exists().where(
+        PendingPlan.user_id == plan_table.user_id,
+        PendingPlan.column == column,
+        PendingPlan.created_at >= now - datetime.timedelta(days=PENDING_PLAN_MAX_DAYS),
+    )
+    return (
+        select(plan_table.user_id, plan_table.created_at)
+        .where(plan_table.is_current == True)  # noqa: E712
+        .where(plan_table.created_at < now - datetime.timedelta(days=PREGEN_PLAN_AGE_DAYS))
+        .where(~has_pending)
+    )
+
+
+async def due_plans(session, limit: int, skip: set = frozenset()) -> List[Tuple[int, str]]:
+    """
+    Up to limit (user_id, column) pairs due for a pre-generated plan, oldest plans first
+    """
+    due = []
+    for column in PLAN_TABLES:
+        statement = _due_statement(column)
+        rows = (await session.exec(statement.order_by(statement.selected_columns[1]).limit(limit + len(skip)))).all()
+        due.extend((created_at, user_id, column) for user_id, created_at in rows if (user_id, column) not in skip)
+    return [(user_id, column) for _, user_id, column in sorted(due)[:limit]]
+
+
+async def backlog(session) -> int:
+    """
+    Number of plans due for pre-generation
+    """
+    total = 0
+    for column in PLAN_TABLES:
+        total += (await session.exec(select(func.count()).select_from(_due_statement(column).subquery()))).one()
+    return total
+
+
+async def pregenerate(user_id: int, column: str):
+    """
+    Generate a plan for the user's next week and store it as pending
+    """
+    user = await load_user(user_id)
+    if not user:
+        raise PlanGenerationError("User not found")
+    # the preferences the plan is made from, checked again when it is promoted
+    inputs_key = pending_plan_key(column, user)
+    plan = await BUILDERS[column](user_id, fresh=True)
+    if not plan:
+        raise PlanGenerationError("Generated plan is empty")
+    async with get_async_session() as session:
+        await add_pending_plan(session, user_id, column, plan, inputs_key)
+        await session.commit()
+
+
+class PregenStats:
+    def __init__(self):
+        self.runs = 0
+        self.batches = 0
+        self.generated = 0
+        self.failed = 0
+        self.backlog: Optional[int] = None  # due plans after the last batch
+        self.last_batch: Optional[dict] = None
+        self.usage = LLMUsage()  # LLM calls / tokens / cost over all batches
+        self.batch_latency = metrics.LatencyStats()
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": PREGEN_ENABLED,
+            "runs": self.runs,
+            "batches": self.batches,
+            "generated": self.generated,
+            "failed": self.failed,
+            "backlog": self.backlog,
+            "last_batch": self.last_batch,
+            "usage": self.usage.to_dict(),
+            "batch_latency": self.batch_latency.to_dict(),
+            **vars(promotion_stats),
+        }
+
+
+pregen_stats = PregenStats()
+metrics.register("pregen", pregen_stats.to_dict)
+
+
+async def run_batch(items: List[Tuple[int, str]]) -> dict:
+    """
+    Pre-generate plans for (user_id, column) items, at most PREGEN_CONCURRENCY at a time.
+    Returns the batch's throughput and cost.
+    """
+    semaphore = asyncio.Semaphore(PREGEN_CONCURRENCY)
+
+    async def one(user_id: int, column: str):
+        async with semaphore:
+            await pregenerate(user_id, column)
+
+    # LLM calls made by the batch's tasks are counted in usage
+    usage = LLMUsage()
+    token = llm_usage.set(usage)
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(one(*item) for item in items), return_exceptions=True)
+    finally:
+        llm_usage.reset(token)
+    seconds = time.perf_counter() - start
+
+    failed = 0
+    for (user_id, column), result in zip(items, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"Error pre-generating {column} for user {user_id}: {result}")
+    generated = len(items) - failed
+
+    pregen_stats.batches += 1
+    pregen_stats.generated += generated
+    pregen_stats.failed += failed
+    pregen_stats.batch_latency.record(seconds)
+    pregen_stats.usage.merge(usage)
+    batch = {
+        "plans": len(items),
+        "generated": generated,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "plans_per_minute": round(generated / seconds * 60, 1) if seconds else 0.0,
+        **usage.to_dict(),
+    }
+    pregen_stats.last_batch = batch
+    return batch
+
+
+_running: Optional[asyncio.Lock] = None
+
+
+async def run_pregen(limit: int = PREGEN_MAX_PER_RUN, anytime: bool = False) -> dict:
+    """
+    Pre-generate due plans in batches until none are left, limit plans were tried
+    or the off-peak window closes (anytime=True ignores the window)
+    """
+    global _running
+    if _running is None:
+        _running = asyncio.Lock()
+    if _running.locked():
+        return {"skipped": "already running"}
+
+    async with _running:
+        pregen_stats.runs += 1
+        tried: set = set()
+        batches = []
+        while len(tried) < limit and (anytime or off_peak()):
+            async with get_async_session() as session:
+                items = await due_plans(session, min(PREGEN_BATCH_SIZE, limit - len(tried)), skip=tried)
+            if not items:
+                break
+            # a plan that failed stays due, don't retry it in the same run
+            tried.update(items)
+            batch = await run_batch(items)
+            batches.append(batch)
+            async with get_async_session() as session:
+                pregen_stats.backlog = await backlog(session)
+            print(f"PRE-GENERATED {batch['generated']}/{batch['plans']} PLANS IN {batch['seconds']}s, "
+                  f"{pregen_stats.backlog} DUE")
+        if not batches:
+            async with get_async_session() as session:
+                pregen_stats.backlog = await backlog(session)
+        return {
+            "batches": len(batches),
+            "generated": sum(batch["generated"] for batch in batches),
+            "failed": sum(batch["failed"] for batch in batches),
+            "backlog": pregen_stats.backlog,
+        }
+
+
+async def pregen_loop():
+    """
+    Background task (started in the app lifespan when PREGEN_ENABLED): run the
+    pre-generation every PREGEN_CHECK_INTERVAL seconds during off-peak hours
+    """
+    while True:
+        if off_peak():
+            try:
+                await run_pregen()
+            except Exception as e:
+                print(f"Error in plan pre-generation: {e}")
+        await asyncio.sleep(PREGEN_CHECK_INTERVAL)
+
+
+async def main(command: str, limit: int, anytime: bool):
+    from .database import init_db
+    from .llm import close_client
+    from .providers import close_providers
+
+    await asyncio.to_thread(init_db)
+    try:
+        if command == "run":
+            print(await run_pregen(limit, anytime))
+            print(pregen_stats.to_dict())
+        else:
+            async with get_async_session() as session:
+                print(f"{await backlog(session)} plans due, off-peak now: {off_peak()}")
+    finally:
+        await close_client()
+        await close_providers()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-generate next week's plans")
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--limit", type=int, default=PREGEN_MAX_PER_RUN, help="most plans to generate")
+    parser.add_argument("--anytime", action="store_true", help="don't wait for the off-peak hours")
+    args = parser.parse_args()
+    asyncio.run(main(args.command, args.limit, args.anytime))
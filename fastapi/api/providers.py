@@ -0,0 +1,462 @@
+"""
+LLM Provider Router: remote API or local Ollama model per task, with hedging and circuit breaking
+"""
+import abc
+import asyncio
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+from .llm import chat_content, stream_chat_content, LLMError, LLM_TIMEOUT
+from . import metrics
+
+
+load_dotenv()
+
+# local model served by Ollama (only imported / connected when a route uses it)
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", str(LLM_TIMEOUT)))
+
+# providers tried in order for each task: "remote" (DEEPSEEK_URL) and / or "ollama"
+LLM_ROUTES = {
+    "keywords": os.getenv("LLM_ROUTE_KEYWORDS", "remote"),
+    "plans": os.getenv("LLM_ROUTE_PLANS", "remote"),
+}
+
+# start the next provider in the route if the current one hasn't answered (or sent its
+# first token) after this many seconds; the first answer wins. 0 turns hedging off
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "8"))
+
+# a provider is skipped for LLM_BREAKER_COOLDOWN seconds once at least LLM_BREAKER_ERROR_RATE
+# of its last LLM_BREAKER_WINDOW calls failed (and at least LLM_BREAKER_MIN_CALLS were made)
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# price of the remote API in dollars per 1000 tokens (the default model is free; Ollama runs locally)
+LLM_COST_PER_1K_TOKENS = float(os.getenv("LLM_COST_PER_1K_TOKENS", "0"))
+# streamed replies don't report token usage, so tokens are estimated from characters
+CHARS_PER_TOKEN = 4
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. Open: calls are skipped until the cooldown is over.
+    Half-open: one trial call decides whether it closes again or stays open.
+    """
+    def __init__(self, window: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 error_rate: float = LLM_BREAKER_ERROR_RATE, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.results = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be made now (in half-open state, only the first caller gets through)
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record(self, ok: bool):
+        if self.probing:
+            self.probing = False
+            if ok:
+                self.opened_at = None
+                self.results.clear()
+            else:
+                self.opened_at = time.monotonic()
+            return
+
+        self.results.append(ok)
+        failures = self.results.count(False)
+        if len(self.results) >= self.min_calls and failures / len(self.results) >= self.error_rate:
+            self.opened_at = time.monotonic()
+            self.results.clear()
+            self.trips += 1
+
+    def release(self):
+        """
+        The call was cancelled (e.g. it lost a hedge), so it says nothing about the provider
+        """
+        self.probing = False
+
+
+class LLMUsage:
+    """
+    Calls, estimated tokens and cost of the LLM replies made while it is set as llm_usage
+    """
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    def add(self, provider: "Provider", messages: List[Dict[str, Any]], reply_chars: int):
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // CHARS_PER_TOKEN
+        completion_tokens = reply_chars // CHARS_PER_TOKEN
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost += (prompt_tokens + completion_tokens) / 1000 * provider.cost_per_1k_tokens
+
+    def merge(self, other: "LLMUsage"):
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cost += other.cost
+
+    def to_dict(self) -> dict:
+        return {
+            "llm_calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": round(self.cost, 6),
+        }
+
+
+# set to an LLMUsage to count the LLM calls of the current task and the tasks it starts
+# (e.g. one pre-generation batch, see pregen.py)
+llm_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+
+class Provider(abc.ABC):
+    """
+    One LLM backend: call accounting, latency stats and a circuit breaker around
+    _content() (whole reply) and _stream() (reply text as it arrives)
+    """
+    name = ""
+    cost_per_1k_tokens = 0.0
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.latency = metrics.LatencyStats()  # whole replies
+        self.first_token = metrics.LatencyStats()  # streamed replies
+        self.calls = 0
+        self.errors = 0
+
+    @abc.abstractmethod
+    async def _content(self, messages: List[Dict[str, Any]], **options) -> str:
+        """
+        The whole reply text (raises LLMError when the provider fails)
+        """
+
+    @abc.abstractmethod
+    def _stream(self, messages: List[Dict[str, Any]], **options) -> AsyncIterator[str]:
+        """
+        The reply text as it arrives (raises LLMError when the provider fails)
+        """
+
+    async def close(self):
+        pass
+
+    async def content(self, messages: List[Dict[str, Any]], **options) -> str:
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            reply = await self._content(messages, **options)
+        except Exception:
+            # LLMError or anything unexpected: the call failed either way, and recording
+            # it also ends a half-open probe (otherwise the breaker would stay half-open)
+            self.errors += 1
+            self.breaker.record(False)
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        self.latency.record(time.perf_counter() - start)
+        self.breaker.record(True)
+        self._count_usage(messages, len(reply or ""))
+        return reply
+
+    async def stream(self, messages: List[Dict[str, Any]], **options) -> AsyncIterator[str]:
+        self.calls += 1
+        start = time.perf_counter()
+        started = False
+        reply_chars = 0
+        try:
+            async for delta in self._stream(messages, **options):
+                if not started:
+                    self.first_token.record(time.perf_counter() - start)
+                    started = True
+                reply_chars += len(delta)
+                yield delta
+        except Exception:
+            # as in content(): any failure is recorded, so a half-open probe always ends
+            self.errors += 1
+            self.breaker.record(False)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # closed by the caller: fine if the provider had answered, otherwise it lost a hedge
+            if started:
+                self.breaker.record(True)
+                self._count_usage(messages, reply_chars)
+            else:
+                self.breaker.release()
+            raise
+        self.breaker.record(True)
+        self._count_usage(messages, reply_chars)
+
+    def _count_usage(self, messages: List[Dict[str, Any]], reply_chars: int):
+        usage = llm_usage.get()
+        if usage is not None:
+            usage.add(self, messages, reply_chars)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "latency": self.latency.to_dict(),
+            "first_token": self.first_token.to_dict(),
+        }
+
+
+class RemoteProvider(Provider):
+    """
+    The chat completions API at DEEPSEEK_URL (see llm.py)
+    """
+    name = "remote"
+    cost_per_1k_tokens = LLM_COST_PER_1K_TOKENS
+
+    async def _content(self, messages, **options):
+        return await chat_content(messages, **options)
+
+    def _stream(self, messages, **options):
+        return stream_chat_content(messages, **options)
+
+
+class OllamaProvider(Provider):
+    """
+    A local model served by Ollama at OLLAMA_HOST
+    """
+    name = "ollama"
+
+    def __init__(self):
+        super().__init__()
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def client(self):
+        # ollama is only imported when a route actually uses the local model
+        import ollama
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = ollama.AsyncClient(host=OLLAMA_HOST, timeout=OLLAMA_TIMEOUT)
+            self._loop = loop
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+        self._client, self._loop = None, None
+
+    def _chat_args(self, options: dict) -> dict:
+        """
+        Translate chat completions options into Ollama's (the remote model name is ignored)
+        """
+        args = {"model": OLLAMA_MODEL}
+        response_format = options.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            args["format"] = response_format["json_schema"]["schema"]
+        elif response_format.get("type") == "json_object":
+            args["format"] = "json"
+        model_options = {}
+        if "temperature" in options:
+            model_options["temperature"] = options["temperature"]
+        if "max_tokens" in options:
+            model_options["num_predict"] = options["max_tokens"]
+        if model_options:
+            args["options"] = model_options
+        return args
+
+    async def _content(self, messages, **options):
+        import ollama
+        try:
+            response = await self.client().chat(messages=messages, **self._chat_args(options))
+        except ollama.ResponseError as e:
+            raise LLMError(e.error, status_code=e.status_code) from e
+        except (ConnectionError, httpx.HTTPError) as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        return response.message.content or ""
+
+    async def _stream(self, messages, **options):
+        import ollama
+        try:
+            async for chunk in await self.client().chat(messages=messages, stream=True, **self._chat_args(options)):
+                if chunk.message.content:
+                    yield chunk.message.content
+        except ollama.ResponseError as e:
+            raise LLMError(e.error, status_code=e.status_code) from e
+        except (ConnectionError, httpx.HTTPError) as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+
+
+PROVIDERS: Dict[str, Provider] = {provider.name: provider for provider in (RemoteProvider(), OllamaProvider())}
+
+
+def route(task: str) -> List[Provider]:
+    """
+    Providers configured for a task, in order
+    """
+    names = [name.strip() for name in LLM_ROUTES.get(task, "remote").split(",") if name.strip()]
+    unknown = [name for name in names if name not in PROVIDERS]
+    if unknown:
+        raise LLMError(f"Unknown LLM provider(s) for {task}: {', '.join(unknown)}")
+    return [PROVIDERS[name] for name in names]
+
+
+class RouterStats:
+    def __init__(self):
+        self.hedges = 0  # backup requests started because the first was slow
+        self.hedge_wins = 0  # ... that answered first
+        self.fallbacks = 0  # next provider tried because the previous one failed
+        self.skipped = 0  # providers passed over because their breaker was open
+
+    def to_dict(self) -> dict:
+        return {
+            **vars(self),
+            "providers": {name: provider.stats() for name, provider in PROVIDERS.items()},
+        }
+
+
+router_stats = RouterStats()
+metrics.register("llm_providers", router_stats.to_dict)
+
+
+def _next_provider(queue: List[Provider]) -> Optional[Provider]:
+    while queue:
+        provider = queue.pop(0)
+        if provider.breaker.allow():
+            return provider
+        router_stats.skipped += 1
+    return None
+
+
+async def _race(task: str, start_call):
+    """
+    Run start_call(provider) on the task's providers: the next one starts when the current
+    one fails (fallback) or is still running after LLM_HEDGE_AFTER (hedge). Returns
+    (provider, result) of the first success and the calls that are still running.
+    """
+    queue = route(task)
+    running: Dict[asyncio.Task, Provider] = {}
+    errors = []
+
+    hedged = set()
+
+    def start() -> Optional[asyncio.Task]:
+        provider = _next_provider(queue)
+        if provider is None:
+            return None
+        call = asyncio.ensure_future(start_call(provider))
+        running[call] = provider
+        return call
+
+    if not start():
+        raise LLMError(f"No LLM provider available for {task} (circuit open)")
+    try:
+        while running:
+            timeout = LLM_HEDGE_AFTER if queue and LLM_HEDGE_AFTER > 0 else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                call = start()
+                if call:
+                    router_stats.hedges += 1
+                    hedged.add(call)
+                continue
+            for call in done:
+                provider = running.pop(call)
+                try:
+                    result = call.result()
+                except LLMError as e:
+                    errors.append(f"{provider.name}: {e}")
+                    continue
+                if call in hedged:
+                    router_stats.hedge_wins += 1
+                return provider, result, running
+            if not running and queue:
+                if start():
+                    router_stats.fallbacks += 1
+    except BaseException:
+        await _cancel(running)
+        raise
+    raise LLMError("; ".join(errors) or f"No LLM provider available for {task} (circuit open)")
+
+
+async def _cancel(running: Dict[asyncio.Task, Provider]):
+    for call in running:
+        call.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+
+
+async def route_content(task: str, messages: List[Dict[str, Any]], **options) -> str:
+    """
+    Get a reply from the task's providers (see _race)
+    """
+    async def call(provider: Provider):
+        return await provider.content(messages, **options)
+
+    _, reply, losers = await _race(task, call)
+    await _cancel(losers)
+    return reply
+
+
+async def route_stream(task: str, messages: List[Dict[str, Any]], **options) -> AsyncIterator[str]:
+    """
+    Stream a reply from the task's providers; hedging and fallback are decided on the
+    first token, after that the stream stays with the provider that sent it
+    """
+    streams = []
+
+    async def first_delta(provider: Provider):
+        stream = provider.stream(messages, **options)
+        streams.append(stream)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+
+    try:
+        _, (stream, delta), losers = await _race(task, first_delta)
+        await _cancel(losers)
+        for other in streams:
+            if other is not stream:
+                await other.aclose()
+        if delta is not None:
+            yield delta
+            async for delta in stream:
+                yield delta
+    finally:
+        for stream in streams:
+            await stream.aclose()
+
+
+async def close_providers():
+    """
+    Close the local model client (called on app shutdown)
+    """
+    for provider in PROVIDERS.values():
+        await provider.close()
@@ -3,11 +3,12 @@ from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import jwt
 from dotenv import load_dotenv
 import os
 from api.database import User
-from api.deps import db_dependency, bcrpyt_context
+from api.deps import async_db_dependency
+from api.tokens import encode_token
+from api.passwords import hash_password, verify_and_update, HashingOverloaded
 from sqlmodel import select
 from api.database import Gender, ActivityLevel, FitnessGoals
 
@@ -23,6 +24,14 @@ router = APIRouter(
 SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
 ALGORITHM = os.getenv("AUTH_ALGORITHM")
 
+# Load shedding: tell clients to retry when the hashing pool is full
+def hashing_overloaded():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, please try again",
+        headers={"Retry-After": "1"},
+    )
+
 class Config:
     orm_mode: bool = True
 
@@ -33,14 +42,21 @@ class Token(BaseModel):
 
 
 # auth_user searches for a user in our db, filtering by username
-# Verifies password with stored hashed password
-# If authentication is successful, returns User object
-def auth_user(username: str, password: str, db):
-    user = db.exec(select(User).where(User.username == username)).first()
+# Verifies password with stored hashed password (on the hashing pool, off the event loop)
+# Hashes made with an old scheme or cost are replaced with a fresh one
+# If authentication is successful, returns User object (the heavy JSON columns stay deferred, see database.py)
+async def auth_user(username: str, password: str, db):
+    user = (await db.exec(select(User).where(User.username == username))).first()
     if not user:
         return False
-    if not bcrpyt_context.verify(password, user.password):
+    verified, new_hash = await verify_and_update(password, user.password)
+    if not verified:
         return False
+    if new_hash:
+        user.password = new_hash
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
     return user
 
 # Generates a JWT token with the users username, user_id, and an expiration timestamp (10 minutes)
@@ -49,33 +65,38 @@ def create_access_token(username: str, user_id: int, expires_delta: timedelta):
     encrypt = {'sub': username, 'id': user_id}
     token_expires = datetime.now(timezone.utc) + expires_delta
     encrypt.update({'exp': token_expires})
-    return jwt.encode(encrypt, SECRET_KEY, algorithm=ALGORITHM)
+    return encode_token(encrypt)
 
 # This route parses incoming payload and creates an instance of UserRequest
 # It then creates new user entry in our database with the users username and hashed password
 # Returns an error if username is already registered
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-async def create_new_user(db: db_dependency, user: User):
+async def create_new_user(db: async_db_dependency, user: User):
     print("\n")
-    print(f"USER INFO: {user}")
+    print(f"USER INFO: {user.username} <{user.email}>")
     print("\n")
-    existing_user = db.exec(select(User).where(User.username == user.username)).first()
+    existing_user = (await db.exec(select(User).where(User.username == user.username))).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
 
+    try:
+        hashed_password = await hash_password(user.password)
+    except HashingOverloaded:
+        raise hashing_overloaded()
+
     new_user = User(
         username=user.username,
-        password=bcrpyt_context.hash(user.password),
+        password=hashed_password,
         email=user.email,
     )
 
     try:
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         print("\n")
         print("IT WORKED")
         print("\n")
@@ -84,7 +105,7 @@ async def create_new_user(db: db_dependency, user: User):
         print("\n")
         print(f"ERROR INFO: {e}")
         print("\n")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
@@ -94,9 +115,12 @@ async def create_new_user(db: db_dependency, user: User):
 # Generates token if successful using create_access_token
 # Returns token
 @router.post('/token', response_model=Token)
-async def access_token_login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: db_dependency):
-    print(f"Login attempt - Username: {form_data.username}, Password: {form_data.password}")
-    user = auth_user(form_data.username, form_data.password, db)
+async def access_token_login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: async_db_dependency):
+    print(f"Login attempt - Username: {form_data.username}")
+    try:
+        user = await auth_user(form_data.username, form_data.password, db)
+    except HashingOverloaded:
+        raise hashing_overloaded()
     if not user:
         print("Authentication failed for user:", form_data.username)
         raise HTTPException(
@@ -1,22 +1,32 @@
 from datetime import timedelta, datetime, timezone
 from typing import Annotated, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, EmailStr
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import jwt, JWTError
 from dotenv import load_dotenv
+from email.utils import format_datetime, parsedate_to_datetime
+import json
 import os
-from api.database import User, Gender, ExercisePreferences, FitnessGoals, DayOfWeek, ActivityLevel
-from api.deps import db_dependency, bcrpyt_context, user_dependency
+from api.database import User, Gender, ExercisePreferences, FitnessGoals, DayOfWeek, ActivityLevel, user_load_options
+from api.deps import async_db_dependency, get_async_session, user_dependency
+from api.identity import principal_dependency, identity_cache
 from sqlmodel import select
 from api.database import Gender, ActivityLevel, FitnessGoals
-from api.models import create_meal_plan, parse_meal_plan_to_dict, create_exercise_routine, parse_exercise_routine_to_dict
+from api.jobs import job_queue, QueueFull
+from api.plan_store import current_plan_version, plan_hash, plan_history
+import api.plans  # registers the plan generation jobs
 from api.models import (
     extract_keywords_liked_meal,
     extract_keywords_disliked_meal,
     extract_keywords_liked_workout,
-    extract_keywords_disliked_workout
+    extract_keywords_disliked_workout,
+    extract_keywords_batch,
+    append_keywords,
+    KEYWORD_COLUMNS,
 )
+from api.llm import LLMError
 
 
 load_dotenv()
@@ -31,56 +41,74 @@ router = APIRouter(
 SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
 ALGORITHM = os.getenv("AUTH_ALGORITHM")
 
+# plans are per user: browsers may keep a copy but must check the ETag before using it
+PLAN_CACHE_CONTROL = os.getenv("PLAN_CACHE_CONTROL", "private, no-cache")
+
 class Config:
     orm_mode: bool = True
 
 
-async def get_user(db, request):
-    auth_header = request.headers.get("Authorization")
-    print(auth_header)
-    if not auth_header or not auth_header.startswith("Bearer "):
-        print("Invalid or missing token")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing token")
+async def get_user(db, principal: dict, *include: str):
+    """
+    Load the authenticated user's row (routes that only need the id use principal['id']).
+    The heavy JSON columns (plans, liked / disliked lists) are deferred unless named in include.
+    """
+    user = await db.get(User, principal['id'], options=user_load_options(*include))
+    if not user:
+        print("User not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
 
-    token = auth_header.split(" ")[1]
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("id")
-        print(user_id)
+async def get_user_column(db, principal: dict, column: str):
+    """
+    Load a single column of the authenticated user's row (only that column is fetched and decoded)
+    """
+    # the id tells a missing user apart from an empty column
+    row = (await db.exec(select(User.id, getattr(User, column)).where(User.id == principal['id']))).first()
+    if row is None:
+        print("User not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return row[1]
 
-        if user_id is None:
-            print("Invalid token")
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    except JWTError:
-        print("Could not validate credentials")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+def as_list(value) -> list[str]:
+    """
+    "Vegan, Keto" or ["Vegan", "Keto"] -> ["Vegan", "Keto"]
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item.strip() for item in value if item and item.strip()]
 
-    user = db.exec(select(User).where(User.id == int(user_id))).first()
-    if not user:
-        print("User not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    else:
-        print("VALID USER")
-        return user
+
+def submit_job(kind: str, user_id: int, **params) -> dict:
+    """
+    Queue a background job for the user (or get the one already in flight)
+    """
+    try:
+        job = job_queue.submit(kind, user_id, **params)
+    except QueueFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many plan requests, try again shortly")
+    return job.to_dict()
 
 
 @router.post('/preferences', status_code=status.HTTP_201_CREATED)
-async def get_data(db: db_dependency, request: Request):
+async def get_data(db: async_db_dependency, principal: principal_dependency, request: Request):
     print("USER PREFERENCES!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-    user = await get_user(db, request)
+    user = await get_user(db, principal)
     print("USER PREFERENCES!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
     user_data = await request.json()
 
-    #turn inputs into data types of database, some inputs lists, have to turn into comma separated strings
+    #turn inputs into data types of database, diet and allergies can come as a list or a comma separated string
     user.age = int(user_data.get("age")) or user.age #looks for age in Json data, turns into int, else sets to user.age
     user.height_cm = float(user_data.get("height")) or user.height_cm
     user.weight_kg = float(user_data.get("weight")) or user.weight_kg
     user.gender = Gender(user_data.get("gender")) or user.gender
     user.activity_level = ActivityLevel(user_data.get("activityLevel")) or user.activity_level
-    user.diet_preference = user_data.get("dietPreference") or user.diet_preference
-    user.allergies = ",".join(user_data.get("allergyArray", [])) or user.allergies
+    user.diet_preference = as_list(user_data.get("dietPreference")) or user.diet_preference
+    user.allergies = as_list(user_data.get("allergyArray")) or user.allergies
 
 
     user.exercise_preferences = [ExercisePreferences(item) for item in user_data.get("exercisePreference", [])] or user.exercise_preferences
@@ -88,191 +116,247 @@ async def get_data(db: db_dependency, request: Request):
     user.meal_prep_availability = [DayOfWeek(item) for item in user_data.get("mealPrepAvailability", [])] or user.meal_prep_availability
     user.exercise_availability = [DayOfWeek(item) for item in user_data.get("exerciseAvailability", [])] or user.exercise_availability
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    identity_cache.invalidate(user.id)
 
     print("IT WORKS!!!!!!!!!!!!!!!!!!!!")
 
     return {"message": "User preferences updated successfully"}   
 
-@router.post('/meals', status_code=status.HTTP_201_CREATED)
-async def gen_meal_plan(db: db_dependency, request: Request):
-    #need to decode header and get token for user_id if i'm going to store the meal plan data in the db to identify user.
-    user = await get_user(db, request)
-    
-    try:
-        print("GENERATING MEAL PLAN")
-        raw_meal_plan = create_meal_plan(user.id)
-        print("MEAL PLAN GENERATED")
-        meal_plan_dict = parse_meal_plan_to_dict(raw_meal_plan)
-        print(meal_plan_dict)
-
-        # update user's meal plan in the database
-        user.meal_plan = meal_plan_dict
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-        return {"meal_plan": meal_plan_dict}
-
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error generating meal plan: {str(e)}")
+@router.post('/meals', status_code=status.HTTP_202_ACCEPTED)
+async def gen_meal_plan(principal: principal_dependency, fresh: bool = False):
+    # only the user id is needed, so no database query here
+
+    # generation runs in the background, poll /user/jobs/{job_id} for the plan
+    # fresh=true skips the plan cache (or reseeds the catalog) for a different plan
+    return submit_job("meal_plan", principal['id'], fresh=fresh)
     
-@router.post('/workouts', status_code=status.HTTP_201_CREATED)
-async def gen_workout_plan(db: db_dependency, request: Request):
-    #need to decode header and get token for user_id if i'm going to store the exercise plan data in the db to identify user.
-    user = await get_user(db, request)
+@router.post('/workouts', status_code=status.HTTP_202_ACCEPTED)
+async def gen_workout_plan(principal: principal_dependency, fresh: bool = False):
+    # only the user id is needed, so no database query here
 
-    try:
-        print("GENERATING WORKOUT PLAN")
-        raw_exercise_plan = create_exercise_routine(user.id)
-        print("WORKOUT PLAN GENERATED")
-        exercise_plan_dict = parse_exercise_routine_to_dict(raw_exercise_plan)
-        print(exercise_plan_dict)
-        
-        # update user's workout plan in the database
-        user.workout_plan = exercise_plan_dict
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-        return {"excercise_plan": exercise_plan_dict}
-
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error generating workout plan: {str(e)}")
+    # generation runs in the background, poll /user/jobs/{job_id} for the plan
+    # fresh=true skips the plan cache (or reseeds the catalog) for a different plan
+    return submit_job("workout_plan", principal['id'], fresh=fresh)
+
+
+@router.get('/jobs/{job_id}', status_code=status.HTTP_200_OK)
+async def get_job(job_id: str, principal: principal_dependency):
+    """
+    Poll the status (and result once done) of a plan generation job
+    """
+    job = job_queue.get(job_id)
+    if not job or job.user_id != principal['id']:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.to_dict()
 
 @router.post('/keywords/liked-meal', status_code=status.HTTP_200_OK)
-async def liked_meal(db: db_dependency, request: Request):
-    #get user from request header to get user.id, then get request JSON which will hold the text that we pass into the function
-    user = await get_user(db, request)
+async def liked_meal(principal: principal_dependency, request: Request):
+    #get user id from the token, then get request JSON which will hold the text that we pass into the function
     meal_data = await request.json()
 
-    #pass in user.id and user inputted text, function stores info into database for user.
-    extract_keywords_liked_meal(meal_data.get("text"), user.id)
+    #pass in user id and user inputted text, function stores info into database for user.
+    await extract_keywords_liked_meal(meal_data.get("text"), principal['id'])
+    identity_cache.invalidate(principal['id'])
 
     return {"message": "Liked meal keywords extracted and stored"}
 
 @router.post('/keywords/disliked-meal', status_code=status.HTTP_200_OK)
-async def disliked_meal(db: db_dependency, request: Request):
-    #get user from request header to get user.id, then get request JSON which will hold the text that we pass into the function
-    user = await get_user(db, request)
+async def disliked_meal(principal: principal_dependency, request: Request):
+    #get user id from the token, then get request JSON which will hold the text that we pass into the function
     meal_data = await request.json()
 
-    #pass in user.id and user inputted text, function stores info into database for user.
-    extract_keywords_disliked_meal(meal_data.get("text"), user.id)
+    #pass in user id and user inputted text, function stores info into database for user.
+    await extract_keywords_disliked_meal(meal_data.get("text"), principal['id'])
+    identity_cache.invalidate(principal['id'])
 
     return {"message": "Disliked meal keywords extracted and stored"}
 
 @router.post('/keywords/disliked-workout', status_code=status.HTTP_200_OK)
-async def disliked_workout(db: db_dependency, request: Request):
-    #get user from request header to get user.id, then get request JSON which will hold the text that we pass into the function
-    user = await get_user(db, request)
+async def disliked_workout(principal: principal_dependency, request: Request):
+    #get user id from the token, then get request JSON which will hold the text that we pass into the function
     workout_data = await request.json()
 
-    #pass in user.id and user inputted text, function stores info into database for user.
-    extract_keywords_disliked_workout(workout_data.get("text"), user.id)
+    #pass in user id and user inputted text, function stores info into database for user.
+    await extract_keywords_disliked_workout(workout_data.get("text"), principal['id'])
+    identity_cache.invalidate(principal['id'])
 
     return {"message": "Disliked workout keywords extracted and stored"}
 
 @router.post('/keywords/liked-workout', status_code=status.HTTP_200_OK)
-async def liked_workout(db: db_dependency, request: Request):
-    #get user from request header to get user.id, then get request JSON which will hold the text that we pass into the function
-    user = await get_user(db, request)
+async def liked_workout(principal: principal_dependency, request: Request):
+    #get user id from the token, then get request JSON which will hold the text that we pass into the function
     workout_data = await request.json()
 
-    #pass in user.id and user inputted text, function stores info into database for user.
-    extract_keywords_liked_workout(workout_data.get("text"), user.id)
+    #pass in user id and user inputted text, function stores info into database for user.
+    await extract_keywords_liked_workout(workout_data.get("text"), principal['id'])
+    identity_cache.invalidate(principal['id'])
 
     return {"message": "Liked workout keywords extracted and stored"}
 
 
+class KeywordFeedback(BaseModel):
+    liked_meal: Optional[str] = None
+    disliked_meal: Optional[str] = None
+    liked_workout: Optional[str] = None
+    disliked_workout: Optional[str] = None
+
+
+@router.post('/keywords', status_code=status.HTTP_200_OK)
+async def keywords_batch(db: async_db_dependency, principal: principal_dependency, feedback: KeywordFeedback):
+    """
+    Extract keywords from all four feedback texts with one LLM call and
+    store them on the user in one transaction
+    """
+    try:
+        keywords = await extract_keywords_batch(feedback.model_dump())
+    except LLMError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Error extracting keywords: {e}")
+
+    # set-union updates, the stored lists aren't loaded (see append_keywords)
+    added = {
+        category: await append_keywords(db, principal['id'], KEYWORD_COLUMNS[category], category_keywords)
+        for category, category_keywords in keywords.items()
+    }
+    await db.commit()
+    identity_cache.invalidate(principal['id'])
+
+    return {"message": "Keywords extracted and stored", "added": added}
+
+
+def http_date(moment: datetime) -> str:
+    # SQLite hands back naive datetimes, they are stored in UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+
+async def plan_validators(db, principal: dict, request: Request, column: str):
+    """
+    Caching headers for the user's current plan and whether the client's copy is still current
+    (If-None-Match / If-Modified-Since). Only the plan's version row is read, not its JSON.
+    """
+    headers = {"Cache-Control": PLAN_CACHE_CONTROL}
+    version = await current_plan_version(db, principal['id'], column)
+    if version is None or not version.content_hash:
+        return headers, False
+
+    etag = f'"{version.content_hash}"'
+    headers["ETag"] = etag
+    headers["Last-Modified"] = http_date(version.created_at)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # weak comparison, W/ prefixes added by proxies still match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return headers, etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return headers, parsedate_to_datetime(headers["Last-Modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            pass
+    return headers, False
+
+
+def plan_response(column: str, plan, headers: dict) -> JSONResponse:
+    """
+    The plan with its caching headers, the ETag taken from the plan being sent so it
+    always matches the body (a save may have landed since the version row was read)
+    """
+    headers = dict(headers)
+    if plan:
+        headers["ETag"] = f'"{plan_hash(plan)}"'
+    else:
+        headers.pop("ETag", None)
+        headers.pop("Last-Modified", None)
+    return JSONResponse({column: plan}, headers=headers)
+
+
 @router.get("/meal-plan", status_code=status.HTTP_200_OK)
-async def get_user_meal_plan(db: db_dependency, request: Request):
+async def get_user_meal_plan(db: async_db_dependency, principal: principal_dependency, request: Request):
     """
     Retrieves the current user's stored meal plan from the database.
+    Answers 304 when the client's ETag still matches.
     """
     print("HIT GET USER MEAL PLAN")
-    user = await get_user(db, request)
-    if not user:
-        print("User not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    headers, not_modified = await plan_validators(db, principal, request, "meal_plan")
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    meal_plan = await get_user_column(db, principal, "meal_plan")
     
     print("USER MEAL PLAN")
-    print(user.meal_plan)
+    print(meal_plan)
     
-    return {"meal_plan": user.meal_plan}
+    return plan_response("meal_plan", meal_plan, headers)
 
 
 @router.get("/workout-plan", status_code=status.HTTP_200_OK)
-async def get_user_workout_plan(db: db_dependency, request: Request):
+async def get_user_workout_plan(db: async_db_dependency, principal: principal_dependency, request: Request):
     """
     Retrieves the current user's stored workout plan from the database.
+    Answers 304 when the client's ETag still matches.
     """
     print("HIT GET USER WORKOUT PLAN")
-    user = await get_user(db, request)
-    if not user:
-        print("User not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    headers, not_modified = await plan_validators(db, principal, request, "workout_plan")
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    workout_plan = await get_user_column(db, principal, "workout_plan")
     
     print("USER WORKOUT PLAN")
-    print(user.workout_plan)
+    print(workout_plan)
 
-    return {"workout_plan": user.workout_plan}
+    return plan_response("workout_plan", workout_plan, headers)
 
 
-@router.post("/weekly-survey", status_code=status.HTTP_200_OK)
-async def post_weekly_survey(db: db_dependency, request: Request):
+@router.get("/meal-plan/history", status_code=status.HTTP_200_OK)
+async def get_user_meal_plan_history(
+    db: async_db_dependency, principal: principal_dependency,
+    limit: int = Query(10, ge=1, le=100), before: Optional[int] = None,
+):
     """
-    Store user's weekly satisfaction survey response in the database
+    The user's meal plans, newest first. Pass the last id as before= for older ones.
     """
-    # get user from database
-    user = await get_user(db, request)
-    if not user:
-        print("User not found")
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return {"plans": await plan_history(db, principal['id'], "meal_plan", limit, before)}
 
-    # get survey data from request
-    survey_data = (await request.json())["feedbackData"]
 
-    # check if user wants workout plan to be re-generated
-    if survey_data["workout"]["newPlan"] is True:
-        try:
-            print("GENERATING WORKOUT PLAN")
-            raw_exercise_plan = create_exercise_routine(user.id)
-            print("WORKOUT PLAN GENERATED")
-            exercise_plan_dict = parse_exercise_routine_to_dict(raw_exercise_plan)
-            print(exercise_plan_dict)
+@router.get("/workout-plan/history", status_code=status.HTTP_200_OK)
+async def get_user_workout_plan_history(
+    db: async_db_dependency, principal: principal_dependency,
+    limit: int = Query(10, ge=1, le=100), before: Optional[int] = None,
+):
+    """
+    The user's workout plans, newest first. Pass the last id as before= for older ones.
+    """
+    return {"plans": await plan_history(db, principal['id'], "workout_plan", limit, before)}
 
-            # update user's workout plan in the database
-            user.workout_plan = exercise_plan_dict
-            db.add(user)
-            db.commit()
-            db.refresh(user)
 
-        except Exception as e:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error generating workout plan: {str(e)}")
+@router.post("/weekly-survey", status_code=status.HTTP_200_OK)
+async def post_weekly_survey(principal: principal_dependency, request: Request):
+    """
+    Store user's weekly satisfaction survey response in the database
+    """
 
+    # get survey data from request
+    survey_data = (await request.json())["feedbackData"]
 
-    # check if user wants meal plan to be re-generated
-    if survey_data["meals"]["newPlan"] is True:
-        try:
-            print("GENERATING MEAL PLAN")
-            raw_meal_plan = create_meal_plan(user.id)
-            print("MEAL PLAN GENERATED")
-            meal_plan_dict = parse_meal_plan_to_dict(raw_meal_plan)
-            print(meal_plan_dict)
+    # check if user wants workout and/or meal plan to be re-generated
+    new_workout = survey_data["workout"]["newPlan"] is True
+    new_meal = survey_data["meals"]["newPlan"] is True
 
-            # update user's meal plan in the database
-            user.meal_plan = meal_plan_dict
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+    # both plans are generated concurrently in one job, poll /user/jobs/{job_id}
+    # for each plan's outcome. The user asked for something new, so skip the plan cache;
+    # a plan pre-generated off-peak for the new week (see api/pregen.py) is used if ready
+    job = None
+    if new_workout or new_meal:
+        job = submit_job("weekly_plans", principal['id'], meal=new_meal, workout=new_workout, fresh=True, pregenerated=True)
 
-        except Exception as e:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error generating meal plan: {str(e)}")
+    return {"survey_data": survey_data, "job": job}
 
 
-    return {"survey_data": survey_data}
 
 
 
@@ -288,13 +372,67 @@ async def post_weekly_survey(db: db_dependency, request: Request):
 
 
 
+# Columns /all_users can return (never the password hash) and the ones returned by default.
+# The plan / feedback JSON columns are only loaded when asked for with fields=
+USER_FIELDS = [name for name in User.model_fields if name != "password"]
+DEFAULT_USER_FIELDS = [
+    "id", "username", "email", "first_name", "last_name", "age", "gender",
+    "height_cm", "weight_kg", "activity_level", "diet_preference", "allergies",
+]
 
 
-@router.get("/all_users", response_model=list[User], status_code=status.HTTP_200_OK)
-async def get_all_users(db: db_dependency):
+def user_columns(fields: Optional[str]):
+    """
+    Parse fields= ("username,age,meal_plan") into User columns, id is always included
+    """
+    names = DEFAULT_USER_FIELDS if not fields else [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in USER_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(USER_FIELDS)}"
+        )
+    names = ["id"] + [name for name in names if name != "id"]
+    return [getattr(User, name) for name in names]
+
+
+async def stream_users(columns, after: Optional[int], limit: Optional[int]):
+    """
+    Yield users as NDJSON lines, read through a server-side cursor in batches
+    """
+    statement = select(*columns).order_by(User.id)
+    if after is not None:
+        statement = statement.where(User.id > after)
+    if limit is not None:
+        statement = statement.limit(limit)
+    # own session: the request's session may be closed before the response is streamed
+    async with get_async_session() as db:
+        result = await db.stream(statement.execution_options(yield_per=500))
+        async for row in result:
+            yield json.dumps(jsonable_encoder(dict(row._mapping))) + "\n"
+
+
+@router.get("/all_users", status_code=status.HTTP_200_OK)
+async def get_all_users(
+    db: async_db_dependency,
+    after: Optional[int] = Query(None, description="Return users with id greater than this (next_cursor of the previous page)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (default 100)"),
+    fields: Optional[str] = Query(None, description="Comma separated columns to return"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
     """
-    Get all users from the database.
+    Get users from the database a page at a time, ordered by id.
+    format=ndjson streams one user per line (all users after the cursor unless limit is given) for exports.
     """
-    statement = select(User)
-    users = db.exec(statement).all()
-    return users
+    columns = user_columns(fields)
+
+    if format == "ndjson":
+        return StreamingResponse(stream_users(columns, after, limit), media_type="application/x-ndjson")
+
+    limit = limit or 100
+    statement = select(*columns).order_by(User.id).limit(limit)
+    if after is not None:
+        statement = statement.where(User.id > after)
+    users = [dict(row._mapping) for row in (await db.exec(statement)).all()]
+    next_cursor = users[-1]["id"] if len(users) == limit else None
+    return {"users": users, "next_cursor": next_cursor}
@@ -0,0 +1,113 @@
+"""
+JWT Encode / Verify With A Cache Of Verified Claims
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from . import metrics
+
+
+load_dotenv()
+
+SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+ALGORITHM = os.getenv("AUTH_ALGORITHM")
+
+# "jose" (python-jose) or "pyjwt" (PyJWT, lighter and faster to decode)
+JWT_BACKEND = os.getenv("JWT_BACKEND", "jose")
+# how long verified claims are reused (seconds, never past the token's exp) and how many are kept
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "300"))
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
+
+
+class InvalidToken(Exception):
+    """
+    Raised when a token's signature, format or expiry doesn't check out
+    """
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def encode_token(claims: Dict[str, Any], backend: str = JWT_BACKEND) -> str:
+    if backend == "pyjwt":
+        import jwt
+        return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+    from jose import jwt
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token: str, backend: str = JWT_BACKEND) -> Dict[str, Any]:
+    """
+    Verify the signature and expiry and return the claims (no caching)
+    """
+    if backend == "pyjwt":
+        import jwt
+        try:
+            return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError as e:
+            raise InvalidToken(str(e)) from e
+    from jose import jwt, JWTError
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        raise InvalidToken(str(e)) from e
+
+
+class TokenCache:
+    """
+    token digest -> verified claims, least recently used entries are evicted first.
+    An entry expires after ttl seconds or at the token's own exp, whichever comes first.
+    """
+    def __init__(self, ttl: float = JWT_CACHE_TTL, max_entries: int = JWT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[dict]:
+        entry = self.entries.get(digest)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self.entries[digest]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(digest)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, digest: str, claims: dict):
+        expires_at = time.time() + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        self.entries[digest] = (expires_at, claims)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {"backend": JWT_BACKEND, "entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+# process-wide cache of verified tokens
+token_cache = TokenCache()
+metrics.register("token_cache", token_cache.stats)
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    """
+    Return the token's claims, only checking the signature the first time a token is seen
+    """
+    digest = token_digest(token)
+    claims = token_cache.get(digest)
+    if claims is None:
+        claims = decode_token(token)
+        token_cache.set(digest, claims)
+    return claims
@@ -0,0 +1,99 @@
+"""
+Cold-Start Import Benchmark
+
+Imports each module in a fresh interpreter (python -X importtime) several times and
+fails if the median import time is over its budget, so slow or side-effecting imports
+are caught before they slow down worker start-up. Also checks that importing the
+modules doesn't touch the database.
+
+Run from the fastapi folder:
+    python scripts/import_budget.py
+    python scripts/import_budget.py --runs 10 --budget api.main=2000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+# module -> budget in milliseconds (median cumulative import time). Measured medians:
+# api.engine ~550 ms, api.database ~700 ms (sqlalchemy / sqlmodel, no fastapi),
+# api.main ~1150 ms (fastapi is ~550 ms of it); budgets leave ~50% headroom for
+# slower machines, so going over means a real regression (a new eager import)
+DEFAULT_BUDGETS = {
+    "api.engine": 850,
+    "api.database": 1050,
+    "api.main": 1800,
+}
+
+FASTAPI_DIR = Path(__file__).resolve().parent.parent
+
+
+def import_times(module: str, env: dict) -> dict:
+    """
+    Import module in a new interpreter, return {module: (self_us, cumulative_us)} from -X importtime
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=FASTAPI_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time benchmark with a cold-start budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS",
+                        help="override or add a budget, e.g. api.main=1200")
+    parser.add_argument("--top", type=int, default=8, help="slowest modules to list per import")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in args.budget:
+        module, ms = item.split("=")
+        budgets[module] = float(ms)
+
+    # point the app at a database file that doesn't exist: importing must not create it
+    scratch = tempfile.mkdtemp()
+    db_file = Path(scratch) / "import_check.db"
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(FASTAPI_DIR), os.environ.get("PYTHONPATH")])),
+        "SQL_ALCHEMY_DATABASE_URL": f"sqlite:///{db_file}",
+    }
+
+    failed = False
+    for module, budget in budgets.items():
+        runs = [import_times(module, env) for _ in range(args.runs)]
+        median_ms = statistics.median(run[module][1] for run in runs) / 1000
+        over = median_ms > budget
+        failed |= over
+        print(f"{module}: {median_ms:.0f} ms median over {args.runs} runs (budget {budget:.0f} ms) "
+              f"{'OVER BUDGET' if over else 'ok'}")
+
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        for name, (self_us, cumulative_us) in slowest:
+            print(f"    {self_us / 1000:7.1f} ms self  {cumulative_us / 1000:7.1f} ms total  {name}")
+
+    if db_file.exists():
+        print(f"importing created {db_file}: module import must not touch the database")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Catalog meal plans: diet preferences and allergies are hard constraints
+"""
+import pytest
+from api.catalog import (
+    Catalog,
+    CatalogUnsatisfiable,
+    MEALS,
+    allergens_in,
+    dish_row,
+    generate_meal_plan,
+    generate_workout_plan,
+    seed_rows,
+)
+from api.plan_output import DAYS
+
+
+@pytest.fixture(scope="module")
+def catalog() -> Catalog:
+    return Catalog(*seed_rows())
+
+
+def planned_dishes(catalog: Catalog, inputs: dict, seed: str = None) -> list:
+    plan = generate_meal_plan(catalog, inputs, seed)
+    assert list(plan) == DAYS
+    assert all(list(meals) == MEALS for meals in plan.values())
+    by_name = {dish.name: dish for dish in catalog.dishes}
+    return [by_name[name] for meals in plan.values() for name in meals.values()]
+
+
+@pytest.mark.parametrize("name, allergens", [
+    ("Peanut butter toast", ["nuts", "gluten"]),
+    ("Almond milk smoothie", ["nuts"]),  # not dairy
+    ("Eggplant parmesan", ["dairy"]),  # not eggs
+    ("Zucchini noodles with pesto", ["nuts", "dairy"]),  # not gluten
+    ("Grilled chicken salad", []),
+])
+def test_allergens_in_dish_names(name, allergens):
+    assert allergens_in(name) == allergens
+
+
+def test_dish_diet_tags():
+    assert "vegan" in dish_row("Hummus wrap", "lunch").tags
+    assert "vegan" not in dish_row("Eggplant parmesan", "dinner").tags
+    assert "vegetarian" in dish_row("Eggplant parmesan", "dinner").tags
+    assert {"meat", "keto"} <= set(dish_row("Grilled chicken salad", "lunch").tags)
+    assert "vegetarian" not in dish_row("Grilled chicken salad", "lunch").tags
+
+
+@pytest.mark.parametrize("diet, tag", [("Vegan", "vegan"), ("vegetarian", "vegetarian"), ("Keto", "keto"), ("pescatarian", "pescatarian")])
+def test_diet_preference(catalog, diet, tag):
+    assert all(tag in dish.tags for dish in planned_dishes(catalog, {"diet_preference": [diet]}))
+
+
+@pytest.mark.parametrize("diet, allergen", [("gluten free", "gluten"), ("Dairy-Free", "dairy")])
+def test_free_from_diets(catalog, diet, allergen):
+    assert all(allergen not in dish.allergens for dish in planned_dishes(catalog, {"diet_preference": [diet]}))
+
+
+def test_allergies(catalog):
+    dishes = planned_dishes(catalog, {"allergies": ["Nuts", "peanuts", "soy", "Eggs"]})
+    assert all(not {"nuts", "soy", "eggs"} & dish.allergens for dish in dishes)
+
+
+def test_diet_and_allergies_together(catalog):
+    dishes = planned_dishes(catalog, {"diet_preference": ["Vegan"], "allergies": ["Nuts", "soy"]})
+    assert all("vegan" in dish.tags and not {"nuts", "soy"} & dish.allergens for dish in dishes)
+
+
+def test_unknown_allergy_leaves_out_dishes_that_name_it(catalog):
+    assert any("avocado" in dish.name.lower() for dish in planned_dishes(catalog, {}))
+    dishes = planned_dishes(catalog, {"allergies": ["avocado"]})
+    assert all("avocado" not in dish.name.lower() for dish in dishes)
+
+
+def test_disliked_meals_are_avoided(catalog):
+    assert all("salmon" not in dish.name.lower() for dish in planned_dishes(catalog, {"disliked_meals": ["salmon"]}))
+
+
+def test_unsatisfiable_constraints(catalog):
+    with pytest.raises(CatalogUnsatisfiable):
+        generate_meal_plan(catalog, {"diet_preference": ["vegan", "carnivore"]})
+
+
+def test_seed_gives_a_different_plan(catalog):
+    inputs = {"fitness_goals": ["Gain Muscle"], "exercise_availability": ["Monday", "Thursday"]}
+    for generate in (generate_meal_plan, generate_workout_plan):
+        plan = generate(catalog, inputs)
+        assert generate(catalog, inputs) == plan
+        assert generate(catalog, inputs, "2026-W42:abc") == generate(catalog, inputs, "2026-W42:abc")
+        assert generate(catalog, inputs, "2026-W42:abc") != plan
+        assert generate(catalog, inputs, "2026-W43:abc") != generate(catalog, inputs, "2026-W42:abc")
+
+
+def test_seed_keeps_the_constraints(catalog):
+    inputs = {"diet_preference": ["Vegan"], "allergies": ["Nuts"], "disliked_meals": ["hummus"]}
+    for seed in ("a", "b", "c"):
+        dishes = planned_dishes(catalog, inputs, seed)
+        assert all("vegan" in dish.tags and "nuts" not in dish.allergens for dish in dishes)
+        assert all("hummus" not in dish.name.lower() for dish in dishes)
@@ -0,0 +1,58 @@
+"""
+Chat window budget: long messages are clipped and old turns make room for the next message
+"""
+import asyncio
+from api import chat
+from api.chat import ChatSession, ChatSessionStore, clip_message, compact
+
+
+def session_with(*turns) -> ChatSession:
+    session = ChatSession()
+    for message, reply in turns:
+        session.add_turn(message, reply)
+    return session
+
+
+def test_clip_message(monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_MESSAGE_MAX_TOKENS", 10)
+    assert clip_message("short") == "short"
+    assert clip_message("x" * 100) == "x" * 40
+
+
+def test_overflow_makes_room_for_the_message(monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_TOKEN_BUDGET", 100)
+    session = session_with(("a" * 100, "b" * 100), ("c" * 40, "d" * 40))
+    assert session.overflow() == []
+    assert session.overflow("e" * 200) == session.messages[:2]
+    # the last turn is always kept
+    assert session.overflow("e" * 1000) == session.messages[:2]
+
+
+def test_context_leaves_out_turns_that_dont_fit(monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_TOKEN_BUDGET", 100)
+    session = session_with(("a" * 100, "b" * 100), ("c" * 40, "d" * 40))
+    session.summary = "earlier"
+    context = session.context("e" * 200)
+    assert [m["content"] for m in context[2:]] == ["c" * 40, "d" * 40, "e" * 200]
+    assert "earlier" in context[1]["content"]
+    assert len(session.context("hi")) == 2 + 4 + 1
+
+
+def test_compact_summarizes_before_the_message_is_sent(monkeypatch):
+    async def summarize(summary, messages):
+        return f"{summary}+{len(messages)}"
+
+    monkeypatch.setattr(chat, "CHAT_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(chat, "summarize", summarize)
+    session = session_with(("a" * 100, "b" * 100), ("c" * 40, "d" * 40))
+    asyncio.run(compact(session, "e" * 200))
+    assert session.summary == "+2"
+    assert [m["content"] for m in session.messages] == ["c" * 40, "d" * 40]
+
+
+def test_clear_starts_a_new_session():
+    store = ChatSessionStore()
+    session = store.get(1)
+    session.add_turn("hi", "hello")
+    store.clear(1)
+    assert store.get(1) is not session and store.get(1).messages == []
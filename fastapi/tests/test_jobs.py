@@ -0,0 +1,236 @@
+"""
+Background job queue: dedupe, per-user ordering, back-pressure, history and shutdown
+"""
+import asyncio
+import pytest
+from fastapi import HTTPException
+from api.jobs import JobQueue, JobStatus, QueueFull, job_key
+from api.routers import user as user_routes
+
+
+class Recorder:
+    """
+    Job handler that logs when each job starts / ends and can be held until released
+    """
+    def __init__(self):
+        self.log = []
+        self.gates = {}
+
+    def hold(self, name: str) -> asyncio.Event:
+        self.gates[name] = asyncio.Event()
+        return self.gates[name]
+
+    async def __call__(self, user_id: int, name: str = "", fail: bool = False, **params):
+        self.log.append(("start", name))
+        if name in self.gates:
+            await self.gates[name].wait()
+        else:
+            await asyncio.sleep(0.01)
+        self.log.append(("end", name))
+        if fail:
+            raise ValueError(f"{name} failed")
+        return {"name": name, "user_id": user_id}
+
+
+def queue_with(recorder: Recorder, **options) -> JobQueue:
+    queue = JobQueue(**{"workers": 4, "max_queued": 10, "history": 100, **options})
+    queue.register("meal_plan", recorder)
+    queue.register("weekly_plans", recorder)
+    return queue
+
+
+async def settle(*jobs, timeout: float = 2):
+    async def wait():
+        while any(job.active for job in jobs):
+            await asyncio.sleep(0.005)
+    await asyncio.wait_for(wait(), timeout)
+
+
+def test_job_key_is_canonical():
+    assert job_key("meal_plan", 1, {"a": 1, "b": [2, 3]}) == job_key("meal_plan", 1, {"b": [2, 3], "a": 1})
+    assert job_key("meal_plan", 1, {"fresh": True}) != job_key("meal_plan", 1, {"fresh": False})
+    assert job_key("meal_plan", 1, {}) != job_key("meal_plan", 2, {})
+
+
+def test_duplicate_submit_returns_the_job_in_flight():
+    async def main():
+        recorder = Recorder()
+        queue = queue_with(recorder)
+        first = queue.submit("meal_plan", 1, name="a", fresh=False)
+        assert queue.submit("meal_plan", 1, fresh=False, name="a") is first
+        # different params are a different request
+        fresh = queue.submit("meal_plan", 1, name="a", fresh=True)
+        assert fresh is not first
+        await settle(first, fresh)
+        assert first.status == fresh.status == JobStatus.DONE
+        assert first.result == {"name": "a", "user_id": 1}
+        # finished jobs don't block a new one
+        assert queue.submit("meal_plan", 1, name="a", fresh=False) is not first
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_a_users_jobs_run_one_at_a_time_in_order():
+    async def main():
+        recorder = Recorder()
+        queue = queue_with(recorder)
+        meal = queue.submit("meal_plan", 1, name="meal")
+        weekly = queue.submit("weekly_plans", 1, name="weekly")
+        other_user = queue.submit("meal_plan", 2, name="other")
+        await settle(meal, weekly, other_user)
+        log = recorder.log
+        assert log.index(("end", "meal")) < log.index(("start", "weekly"))
+        # other users don't wait
+        assert log.index(("start", "other")) < log.index(("end", "meal"))
+        assert queue.user_jobs == {} and queue.active == {}
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_a_failed_job_starts_the_users_next_one():
+    async def main():
+        recorder = Recorder()
+        queue = queue_with(recorder)
+        failing = queue.submit("meal_plan", 1, name="bad", fail=True)
+        after = queue.submit("weekly_plans", 1, name="next")
+        await settle(failing, after)
+        assert failing.status == JobStatus.FAILED and failing.error == "bad failed"
+        assert after.status == JobStatus.DONE
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_waiting_jobs_dont_hold_workers():
+    async def main():
+        recorder = Recorder()
+        gate = recorder.hold("first")
+        queue = queue_with(recorder, workers=1)
+        first = queue.submit("meal_plan", 1, name="first")
+        queued = [queue.submit("meal_plan", 1, name=f"wait{i}") for i in range(3)]
+        await asyncio.sleep(0.05)
+        assert recorder.log == [("start", "first")]
+        assert queue.queued() == 3
+        gate.set()
+        await settle(first, *queued)
+        assert [name for event, name in recorder.log if event == "start"] == ["first", "wait0", "wait1", "wait2"]
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_full_queue_raises():
+    async def main():
+        recorder = Recorder()
+        gate = recorder.hold("busy")
+        queue = queue_with(recorder, workers=1, max_queued=2)
+        busy = queue.submit("meal_plan", 1, name="busy")
+        await asyncio.sleep(0.01)  # running, no longer queued
+        queue.submit("meal_plan", 2, name="a")
+        queue.submit("meal_plan", 3, name="b")
+        with pytest.raises(QueueFull):
+            queue.submit("meal_plan", 4, name="c")
+        # jobs waiting behind the same user count as queued too
+        with pytest.raises(QueueFull):
+            queue.submit("weekly_plans", 1, name="d")
+        # a duplicate is still answered
+        assert queue.submit("meal_plan", 1, name="busy") is busy
+        gate.set()
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_submit_job_answers_503_when_the_queue_is_full(monkeypatch):
+    async def main():
+        recorder = Recorder()
+        recorder.hold("busy")
+        queue = queue_with(recorder, workers=1, max_queued=1)
+        monkeypatch.setattr(user_routes, "job_queue", queue)
+        user_routes.submit_job("meal_plan", 1, name="busy")
+        await asyncio.sleep(0.01)
+        job = user_routes.submit_job("meal_plan", 2, name="waiting")
+        assert job["status"] == "pending" and job["kind"] == "meal_plan"
+        with pytest.raises(HTTPException) as error:
+            user_routes.submit_job("meal_plan", 3, name="other")
+        assert error.value.status_code == 503
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_unknown_kind():
+    async def main():
+        with pytest.raises(ValueError):
+            JobQueue().submit("nope", 1)
+
+    asyncio.run(main())
+
+
+def test_history_keeps_the_newest_finished_jobs():
+    async def main():
+        recorder = Recorder()
+        queue = queue_with(recorder, history=3)
+        jobs = []
+        for i in range(5):
+            jobs.append(queue.submit("meal_plan", i, name=f"job{i}"))
+            await settle(jobs[-1])
+        assert list(queue.jobs) == [job.id for job in jobs[-3:]]
+        assert queue.get(jobs[0].id) is None
+        assert queue.get(jobs[-1].id) is jobs[-1]
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_history_never_drops_active_jobs():
+    async def main():
+        recorder = Recorder()
+        gates = [recorder.hold(f"job{i}") for i in range(3)]
+        queue = queue_with(recorder, history=1)
+        jobs = [queue.submit("meal_plan", i, name=f"job{i}") for i in range(3)]
+        assert all(queue.get(job.id) is job for job in jobs)
+        for gate in gates:
+            gate.set()
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_stop_cancels_the_running_job():
+    async def main():
+        recorder = Recorder()
+        recorder.hold("stuck")
+        queue = queue_with(recorder)
+        job = queue.submit("meal_plan", 1, name="stuck")
+        await asyncio.sleep(0.01)
+        await queue.stop()
+        assert job.status == JobStatus.FAILED and job.error == "Cancelled"
+        assert queue._tasks == [] and queue._loop is None
+
+    asyncio.run(main())
+
+
+def test_jobs_from_a_stopped_loop_are_failed_on_the_next_one():
+    recorder = Recorder()
+    queue = queue_with(recorder, workers=1)
+
+    async def first_loop():
+        recorder.hold("busy")
+        queue.submit("meal_plan", 1, name="busy")
+        return queue.submit("meal_plan", 1, name="stranded")
+
+    stranded = asyncio.run(first_loop())
+
+    async def second_loop():
+        # the stranded job would otherwise block dedupe and the user's queue forever
+        job = queue.submit("meal_plan", 1, name="stranded")
+        await settle(job)
+        await queue.stop()
+        return job
+
+    job = asyncio.run(second_loop())
+    assert stranded.status == JobStatus.FAILED and stranded.error == "Worker restarted"
+    assert job is not stranded and job.status == JobStatus.DONE
@@ -0,0 +1,53 @@
+"""
+Local keyword extraction: negation, sentiment cues and the category's polarity
+"""
+import pytest
+from api.lexicon import extract_keywords
+
+
+@pytest.mark.parametrize("category, text, keywords", [
+    # no cue: keywords take the category's polarity
+    ("liked_meal", "chicken and rice", ["chicken", "rice"]),
+    ("disliked_meal", "chicken and rice", ["chicken", "rice"]),
+    # a cue sets the polarity, before or after the keyword
+    ("liked_meal", "I loved the salmon", ["salmon"]),
+    ("liked_meal", "the salmon was great", ["salmon"]),
+    ("disliked_meal", "the salmon was great", []),
+    ("disliked_meal", "the salmon was awful", ["salmon"]),
+    # a negation flips the cue
+    ("liked_meal", "I didn't like the salmon", []),
+    ("disliked_meal", "I didn't like the salmon", ["salmon"]),
+    ("liked_meal", "the salmon was not bad", ["salmon"]),
+    # and flips the category's polarity when there is no cue
+    ("liked_meal", "no salmon", []),
+    # idioms
+    ("disliked_meal", "I can't stand broccoli", ["broccoli"]),
+    ("liked_meal", "I don't mind broccoli", ["broccoli"]),
+    ("disliked_meal", "not a fan of pasta", ["pasta"]),
+    ("liked_meal", "not a fan of pasta", []),
+])
+def test_meal_polarity(category, text, keywords):
+    assert extract_keywords(category, text).keywords == keywords
+
+
+def test_clauses_have_their_own_polarity():
+    text = "I enjoyed running, hated squats"
+    assert extract_keywords("liked_workout", text).keywords == ["running"]
+    assert extract_keywords("disliked_workout", text).keywords == ["squats"]
+
+
+def test_negation_ends_with_the_clause():
+    text = "I loved the curry but not the tofu"
+    assert extract_keywords("liked_meal", text).keywords == ["curry"]
+
+
+def test_keywords_are_kept_once_in_text_order():
+    text = "rice, more rice and then chicken"
+    assert extract_keywords("liked_meal", text).keywords == ["rice", "chicken"]
+
+
+def test_confidence_is_the_share_of_matched_words():
+    assert extract_keywords("liked_meal", "salmon").confidence == 1.0
+    partial = extract_keywords("liked_meal", "salmon with some weird sauce thing")
+    assert 0 < partial.confidence < 1
+    assert extract_keywords("liked_meal", "the weather was great").confidence == 0.0
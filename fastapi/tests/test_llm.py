@@ -0,0 +1,130 @@
+"""
+Shared LLM client against a stub chat completions server: replies, SSE parsing,
+timeouts and connection reuse
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from api import llm
+from api.llm import LLMError
+
+
+def sse(*payloads) -> bytes:
+    return "".join(f"data: {payload}\n\n" for payload in payloads).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse can be seen
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, body, self.client_address))
+        if self.path == "/slow":
+            time.sleep(1)
+        if self.path == "/error":
+            self.reply(429, b'{"error": {"message": "rate limited"}}')
+        elif body.get("stream"):
+            delta = lambda text: json.dumps({"choices": [{"delta": {"content": text}}]})
+            self.reply(200, b": keep-alive\n\n" + sse(delta("Hel"), "not json", delta("lo"), "[DONE]", delta("ignored")),
+                       "text/event-stream")
+        else:
+            self.reply(200, json.dumps({"choices": [{"message": {"content": "Hello"}}]}).encode())
+
+    def reply(self, status: int, data: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(llm, "DEEPSEEK_URL", f"{base}/v1/chat/completions")
+    server.base = base
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await llm.close_client()
+    return asyncio.run(main())
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+def test_chat_content(stub):
+    messages = [{"role": "user", "content": "hi"}]
+    assert run(llm.chat_content(messages, temperature=0.2)) == "Hello"
+    path, body, _ = stub.requests[0]
+    assert path == "/v1/chat/completions"
+    assert body == {"model": llm.LLM_MODEL, "messages": messages, "temperature": 0.2}
+
+
+def test_error_response(stub, monkeypatch):
+    monkeypatch.setattr(llm, "DEEPSEEK_URL", f"{stub.base}/error")
+    with pytest.raises(LLMError) as error:
+        run(llm.chat_content([]))
+    assert error.value.status_code == 429
+    assert error.value.detail == {"message": "rate limited"}
+
+
+def test_stream_parses_server_sent_events(stub):
+    # comments and unparseable events are skipped, nothing after [DONE] is read
+    assert run(collect(llm.stream_chat_content([]))) == ["Hel", "lo"]
+    assert stub.requests[0][1]["stream"] is True
+
+
+def test_stream_error_response(stub, monkeypatch):
+    monkeypatch.setattr(llm, "DEEPSEEK_URL", f"{stub.base}/error")
+    with pytest.raises(LLMError) as error:
+        run(collect(llm.stream_chat_content([])))
+    assert error.value.status_code == 429
+
+
+def test_timeout_becomes_llm_error(stub, monkeypatch):
+    monkeypatch.setattr(llm, "DEEPSEEK_URL", f"{stub.base}/slow")
+    with pytest.raises(LLMError, match="Timeout") as error:
+        run(llm.chat_content([], timeout=0.2))
+    assert error.value.status_code is None
+    with pytest.raises(LLMError, match="Timeout"):
+        run(collect(llm.stream_chat_content([], timeout=0.2)))
+
+
+def test_client_is_reused_on_the_same_loop(stub):
+    async def calls():
+        client = llm.get_client()
+        replies = [await llm.chat_content([]) for _ in range(3)]
+        return client, llm.get_client(), replies
+
+    first, second, replies = run(calls())
+    assert first is second
+    assert replies == ["Hello"] * 3
+    # one keep-alive connection served every request
+    assert len({address for _, _, address in stub.requests}) == 1
+
+
+def test_new_loop_gets_a_new_client(stub):
+    async def client():
+        return llm.get_client()
+
+    assert asyncio.run(client()) is not asyncio.run(client())
+    asyncio.run(llm.close_client())
@@ -0,0 +1,107 @@
+"""
+PlanValidator: streamed plan JSON checked against the plan schemas as it arrives
+"""
+import asyncio
+import json
+import pytest
+from api import plan_output
+from api.plan_output import DAYS, MEAL_PLAN_SCHEMA, WORKOUT_PLAN_SCHEMA, MalformedPlan, PlanValidator
+
+
+MEAL_PLAN = {day: {"breakfast": "oats", "lunch": "chicken salad", "dinner": "salmon with rice"} for day in DAYS}
+WORKOUT_PLAN = {"Monday": [{"sets": 3, "reps": 12, "exercise": "squats"}], "Friday": [{"sets": 4, "reps": 8, "exercise": "push-ups"}]}
+
+
+def stream(schema: dict, text: str, chunk: int = 7) -> PlanValidator:
+    validator = PlanValidator(schema)
+    for i in range(0, len(text), chunk):
+        validator.feed(text[i:i + chunk])
+    return validator
+
+
+def test_valid_meal_plan_in_chunks():
+    assert stream(MEAL_PLAN_SCHEMA, json.dumps(MEAL_PLAN)).finish() == MEAL_PLAN
+
+
+def test_valid_workout_plan_in_chunks():
+    assert stream(WORKOUT_PLAN_SCHEMA, json.dumps(WORKOUT_PLAN, indent=2), chunk=1).finish() == WORKOUT_PLAN
+
+
+def test_code_fence_is_skipped():
+    text = "```json\n" + json.dumps(WORKOUT_PLAN) + "\n```"
+    assert stream(WORKOUT_PLAN_SCHEMA, text).finish() == WORKOUT_PLAN
+
+
+def test_prose_before_the_object_fails():
+    with pytest.raises(MalformedPlan, match="not a JSON object"):
+        stream(WORKOUT_PLAN_SCHEMA, "Here is your plan: " + json.dumps(WORKOUT_PLAN))
+
+
+def test_unexpected_key_fails_before_the_rest_arrives():
+    validator = PlanValidator(MEAL_PLAN_SCHEMA)
+    with pytest.raises(MalformedPlan, match="unexpected key 'Funday'"):
+        validator.feed('{"Funday": ')
+    assert not validator.done
+
+
+def test_missing_day_fails_when_the_object_closes():
+    plan = dict(MEAL_PLAN)
+    del plan["Sunday"]
+    with pytest.raises(MalformedPlan, match=r"\$: missing Sunday"):
+        stream(MEAL_PLAN_SCHEMA, json.dumps(plan))
+
+
+def test_missing_meal_names_its_path():
+    plan = {**MEAL_PLAN, "Tuesday": {"breakfast": "oats", "lunch": "soup"}}
+    with pytest.raises(MalformedPlan, match=r"\$\.Tuesday: missing dinner"):
+        stream(MEAL_PLAN_SCHEMA, json.dumps(plan))
+
+
+def test_empty_meal_fails():
+    plan = {**MEAL_PLAN, "Monday": {"breakfast": "  ", "lunch": "soup", "dinner": "stew"}}
+    with pytest.raises(MalformedPlan, match=r"\$\.Monday\.breakfast: empty string"):
+        stream(MEAL_PLAN_SCHEMA, json.dumps(plan))
+
+
+@pytest.mark.parametrize("item, message", [
+    ({"sets": "3", "reps": 12, "exercise": "squats"}, "expected integer"),
+    ({"sets": 3.5, "reps": 12, "exercise": "squats"}, "expected integer"),
+    ({"sets": 3, "reps": 0, "exercise": "squats"}, "below 1"),
+    ({"sets": 3, "reps": 12, "exercise": ["squats"]}, "expected string"),
+])
+def test_bad_exercise_values(item, message):
+    with pytest.raises(MalformedPlan, match=message):
+        stream(WORKOUT_PLAN_SCHEMA, json.dumps({"Monday": [item]}))
+
+
+def test_empty_day_fails():
+    with pytest.raises(MalformedPlan, match=r"\$\.Monday: is empty"):
+        stream(WORKOUT_PLAN_SCHEMA, '{"Monday": []}')
+
+
+def test_duplicate_key_fails():
+    with pytest.raises(MalformedPlan, match="duplicate key 'Monday'"):
+        stream(WORKOUT_PLAN_SCHEMA, '{"Monday": [{"sets": 1, "reps": 1, "exercise": "a"}], "Monday": ')
+
+
+def test_truncated_response_fails_on_finish():
+    validator = stream(MEAL_PLAN_SCHEMA, json.dumps(MEAL_PLAN)[:-20])
+    with pytest.raises(MalformedPlan, match="ended before"):
+        validator.finish()
+
+
+def test_text_after_the_object_is_ignored():
+    assert stream(WORKOUT_PLAN_SCHEMA, json.dumps(WORKOUT_PLAN) + "\n```\nEnjoy!").finish() == WORKOUT_PLAN
+
+
+def test_stream_is_closed_once_the_plan_is_complete(monkeypatch):
+    read = []
+
+    async def route_stream(route, messages, **options):
+        for delta in (json.dumps(WORKOUT_PLAN), "\n```\n", "Enjoy!"):
+            read.append(delta)
+            yield delta
+
+    monkeypatch.setattr(plan_output, "route_stream", route_stream)
+    assert asyncio.run(plan_output.request_structured_plan("workout", "plan please")) == WORKOUT_PLAN
+    assert read == [json.dumps(WORKOUT_PLAN)]
@@ -0,0 +1,145 @@
+"""
+Circuit breaker transitions, on their own and around Provider.content / stream
+"""
+import asyncio
+import pytest
+from api import providers
+from api.llm import LLMError
+from api.providers import CircuitBreaker, Provider
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(providers.time, "monotonic", clock)
+    return clock
+
+
+def tripped(clock: Clock) -> CircuitBreaker:
+    breaker = CircuitBreaker(window=4, min_calls=2, error_rate=0.5, cooldown=30)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_closed_until_the_error_rate_is_reached(clock):
+    breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, cooldown=30)
+    for ok in (True, False, True):
+        breaker.record(ok)
+        assert breaker.state == "closed" and breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert breaker.trips == 1
+    assert not breaker.allow()
+
+
+def test_half_open_after_the_cooldown_lets_one_probe_through(clock):
+    breaker = tripped(clock)
+    clock.now += 29
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now += 1
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only the first caller probes
+
+
+def test_successful_probe_closes(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and not breaker.probing
+    # the old failures are forgotten
+    breaker.record(False)
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_opens_for_another_cooldown(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.probing
+    assert breaker.trips == 1  # a failed probe isn't a new trip
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_released_probe_lets_the_next_caller_probe(clock):
+    breaker = tripped(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+class FakeProvider(Provider):
+    name = "fake"
+
+    def __init__(self, error: Exception = None):
+        super().__init__()
+        self.error = error
+
+    async def _content(self, messages, **options):
+        if self.error:
+            raise self.error
+        return "reply"
+
+    async def _stream(self, messages, **options):
+        if self.error:
+            raise self.error
+        yield "re"
+        yield "ply"
+
+
+def probing_provider(clock: Clock, error: Exception = None) -> FakeProvider:
+    provider = FakeProvider(error)
+    provider.breaker = tripped(clock)
+    clock.now += 30
+    assert provider.breaker.allow()
+    return provider
+
+
+async def collect(provider: Provider) -> str:
+    return "".join([delta async for delta in provider.stream([])])
+
+
+@pytest.mark.parametrize("error", [LLMError("down"), KeyError("bug")])
+def test_failed_content_probe_reopens(clock, error):
+    provider = probing_provider(clock, error)
+    with pytest.raises(type(error)):
+        asyncio.run(provider.content([]))
+    assert provider.breaker.state == "open" and not provider.breaker.probing
+    assert provider.errors == 1
+
+
+@pytest.mark.parametrize("error", [LLMError("down"), KeyError("bug")])
+def test_failed_stream_probe_reopens(clock, error):
+    provider = probing_provider(clock, error)
+    with pytest.raises(type(error)):
+        asyncio.run(collect(provider))
+    assert provider.breaker.state == "open" and not provider.breaker.probing
+
+
+def test_successful_probes_close(clock):
+    provider = probing_provider(clock)
+    assert asyncio.run(provider.content([])) == "reply"
+    assert provider.breaker.state == "closed"
+
+    provider = probing_provider(clock)
+    assert asyncio.run(collect(provider)) == "reply"
+    assert provider.breaker.state == "closed"
+
+
+def test_provider_hooks_are_abstract():
+    with pytest.raises(TypeError):
+        Provider()